@@ -1,150 +1,205 @@
 import asyncio
+import sys
+from datetime import datetime, timezone
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, ReplaceOne
 
-"""Run this script ONLY ONCE"""
+"""Run this script ONLY ONCE
+Use `python init_db.py migrate` to convert the old single-document collections."""
 
 MONGODB_URL = "mongodb://127.0.0.1:12345/"
 MONGODB_DBNAME = "vtbili"
 
-
-async def initialize_vtbili():
-    # Initialize Connection
-    print("+- Initializing MongoDB Connection")
-    dbclient = AsyncIOMotorClient(MONGODB_URL)
-    dbconn = dbclient[MONGODB_DBNAME]
-    print("+- Connection established!")
-
-    print("|= Initializing Hololive VTubers Data")
-    print("|--> Hololive")
-    holo_coll = dbconn["hololive_data"]
-    result = await holo_coll.insert_one(
-        {"live": [], "upcoming": [], "channels": []}
+# Every stream and channel is its own document, keyed by "<source>:<id>"
+STREAMS_COLL = "streams_data"
+CHANNELS_COLL = "channels_data"
+ENDED_IDS_COLL = "ended_ids"
+ENDED_IDS_TTL = 30 * 24 * 60 * 60  # In seconds, keep it the same as the one in server/main.py
+IGNORED_COLL = "ignored_streams"
+IGNORED_STREAMS_TTL = 6 * 60 * 60  # In seconds, keep it the same as the one in server/main.py
+
+# Old single-document collections, grouped by their layout.
+BILI_SOURCES = ["hololive_data", "nijisanji_data", "otherbili_data"]
+LIVE_SOURCES = ["twitch_data", "twitcasting_data"]
+YT_LIVE_SOURCES = ["nijitube_live", "yt_other_livedata"]
+ENDED_IDS_SOURCES = ["nijitube_ended_ids", "yt_other_ended_ids"]
+IGNORED_SOURCES = ["hololive_ignored", "nijisanji_ignored"]
+CHANNELS_SOURCES = ["nijitube_channels", "yt_other_channels", "twitch_channels", "twitcasting_channels"]
+
+
+def as_document(source: str, data: dict, extras: dict = None) -> dict:
+    document = dict(data)
+    if extras:
+        document.update(extras)
+    document["source"] = source
+    document["_id"] = f"{source}:{data['id']}"
+    return document
+
+
+async def create_indexes(dbconn):
+    print("|= Creating indexes")
+    print("|--> Streams Data")
+    await dbconn[STREAMS_COLL].create_indexes(
+        [
+            IndexModel([("source", ASCENDING), ("status", ASCENDING), ("startTime", ASCENDING)]),
+            IndexModel(
+                [
+                    ("platform", ASCENDING),
+                    ("group", ASCENDING),
+                    ("status", ASCENDING),
+                    ("startTime", ASCENDING),
+                ]
+            ),
+            IndexModel([("source", ASCENDING), ("channel", ASCENDING)]),
+        ]
     )
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
     print("|-- $ Success")
-
-    print("|--> Hololive Ignored Data")
-    holo_ignore_coll = dbconn["hololive_ignored"]
-    result = await holo_ignore_coll.insert_one({"data": []})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
-
-    print("|= Initializing Nijisanji VTubers Data")
-    print("|--> Nijisanji (BiliBili)")
-    niji_coll = dbconn["nijisanji_data"]
-    result = await niji_coll.insert_one(
-        {"live": [], "upcoming": [], "channels": []}
+    print("|--> Channels Data")
+    await dbconn[CHANNELS_COLL].create_indexes(
+        [
+            IndexModel([("source", ASCENDING), ("nsort", ASCENDING)]),
+            IndexModel([("platform", ASCENDING), ("group", ASCENDING)]),
+        ]
     )
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
     print("|-- $ Success")
-
-    print("|--> Nijisanji Ignored Data")
-    niji_ignore_coll = dbconn["nijisanji_ignored"]
-    result = await niji_ignore_coll.insert_one({"data": []})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
-
-    print("|--> NijiTube Ended IDs [YT]")
-    nijitubeend_coll = dbconn["nijitube_ended_ids"]
-    result = await nijitubeend_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
-
-    print("|--> NijiTube Live Data [YT]")
-    nijitubelive_coll = dbconn["nijitube_live"]
-    result = await nijitubelive_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
-
-    print("|--> NijiTube Channels Data [YT]")
-    nijitubechan_coll = dbconn["nijitube_channels"]
-    result = await nijitubechan_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
+    print("|--> Ended IDs [YT]")
+    await dbconn[ENDED_IDS_COLL].create_indexes(
+        [
+            IndexModel([("endedAt", ASCENDING)], name="endedAt_ttl", expireAfterSeconds=ENDED_IDS_TTL),
+            IndexModel([("source", ASCENDING), ("channel", ASCENDING)]),
+        ]
+    )
     print("|-- $ Success")
-
-    print("|= Initializing Other VTubers Data")
-    print("|--> Other VTubers (BiliBili)")
-    other_coll = dbconn["otherbili_data"]
-    result = await other_coll.insert_one({"upcoming": [], "channels": []})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
+    print("|--> Ignored Streams [Bili]")
+    await dbconn[IGNORED_COLL].create_indexes(
+        [
+            IndexModel(
+                [("lastSeen", ASCENDING)], name="lastSeen_ttl", expireAfterSeconds=IGNORED_STREAMS_TTL
+            ),
+            IndexModel([("source", ASCENDING)]),
+        ]
+    )
     print("|-- $ Success")
 
-    print("|--> Ended IDs [YT]")
-    ytend_coll = dbconn["yt_other_ended_ids"]
-    result = await ytend_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
 
-    print("|--> Live Data [YT]")
-    ytlive_coll = dbconn["yt_other_livedata"]
-    result = await ytlive_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
+async def initialize_vtbili():
+    # Initialize Connection
+    print("+- Initializing MongoDB Connection")
+    dbclient = AsyncIOMotorClient(MONGODB_URL)
+    dbconn = dbclient[MONGODB_DBNAME]
+    print("+- Connection established!")
 
-    print("|--> Channels Data [YT]")
-    ytchan_coll = dbconn["yt_other_channels"]
-    result = await ytchan_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
+    await create_indexes(dbconn)
 
-    print("|= Initializing Twitcasting/Twitch Data")
-    print("|--> Twitch Live Data")
-    twitch_coll = dbconn["twitch_data"]
-    result = await twitch_coll.insert_one({"live": []})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
+    print("+- All database are initialized, exiting...")
 
-    print("|--> Twitch Channels Data")
-    twitchchan_coll = dbconn["twitch_channels"]
-    result = await twitchchan_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
 
-    print("|--> Twitcasting Live Data")
-    twcast_coll = dbconn["twitcasting_data"]
-    result = await twcast_coll.insert_one({"live": []})
+async def write_documents(coll, documents: list) -> bool:
+    if not documents:
+        print("|-- $ Nothing to migrate")
+        return True
+    requests = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents]
+    result = await coll.bulk_write(requests, ordered=False)
     if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
+        print("|-- ** Failed to migrate, please retry again later **")
+        return False
+    print(f"|-- $ Migrated {len(documents)} documents")
+    return True
 
-    print("|--> Twitcasting Channels Data")
-    twcastchan_coll = dbconn["twitcasting_channels"]
-    result = await twcastchan_coll.insert_one({})
-    if not result.acknowledged:
-        print("|-- ** Failed to insert, please retry again later **")
-        return 1
-    print("|-- $ Success")
 
-    print("+- All database are initialized, exiting...")
+async def migrate_vtbili():
+    # Initialize Connection
+    print("+- Initializing MongoDB Connection")
+    dbclient = AsyncIOMotorClient(MONGODB_URL)
+    dbconn = dbclient[MONGODB_DBNAME]
+    print("+- Connection established!")
 
+    await create_indexes(dbconn)
+
+    streams_coll = dbconn[STREAMS_COLL]
+    channels_coll = dbconn[CHANNELS_COLL]
+    print("|= Migrating Streams Data")
+    for source in BILI_SOURCES + LIVE_SOURCES + YT_LIVE_SOURCES:
+        print(f"|--> {source}")
+        old_data = await dbconn[source].find_one({}, {"_id": 0})
+        if not old_data:
+            print("|-- $ Nothing to migrate")
+            continue
+        documents = []
+        if source in YT_LIVE_SOURCES:
+            for channel, streams in old_data.items():
+                documents.extend(as_document(source, stream, {"channel": channel}) for stream in streams)
+        else:
+            for status in ("live", "upcoming"):
+                streams = old_data.get(status, [])
+                documents.extend(as_document(source, stream, {"status": status}) for stream in streams)
+        if not await write_documents(streams_coll, documents):
+            return 1
+
+    print("|= Migrating Channels Data")
+    for source in BILI_SOURCES + CHANNELS_SOURCES:
+        print(f"|--> {source}")
+        old_data = await dbconn[source].find_one({}, {"_id": 0})
+        if not old_data:
+            print("|-- $ Nothing to migrate")
+            continue
+        if source in BILI_SOURCES:
+            # The old layout kept the channels already sorted.
+            channels = [dict(channel, nsort=n) for n, channel in enumerate(old_data.get("channels", []))]
+        else:
+            channels = list(old_data.values())
+        documents = [as_document(source, channel) for channel in channels]
+        if not await write_documents(channels_coll, documents):
+            return 1
+
+    print("|= Migrating Ended IDs Data")
+    ended_at = datetime.now(tz=timezone.utc)
+    for source in ENDED_IDS_SOURCES:
+        print(f"|--> {source}")
+        old_data = await dbconn[source].find_one({}, {"_id": 0})
+        if not old_data:
+            print("|-- $ Nothing to migrate")
+            continue
+        documents = []
+        for channel, video_ids in old_data.items():
+            for video_id in set(video_ids):
+                documents.append(
+                    {
+                        "_id": f"{source}:{video_id}",
+                        "id": video_id,
+                        "channel": channel,
+                        "source": source,
+                        "endedAt": ended_at,
+                    }
+                )
+        if not await write_documents(dbconn[ENDED_IDS_COLL], documents):
+            return 1
+
+    print("|= Migrating Ignored Streams Data")
+    last_seen = datetime.now(tz=timezone.utc)
+    for source in IGNORED_SOURCES:
+        print(f"|--> {source}")
+        old_data = await dbconn[source].find_one({}, {"_id": 0})
+        if not old_data:
+            print("|-- $ Nothing to migrate")
+            continue
+        documents = [
+            {"_id": f"{source}:{stream_id}", "id": stream_id, "source": source, "lastSeen": last_seen}
+            for stream_id in set(old_data.get("data", []))
+        ]
+        if not await write_documents(dbconn[IGNORED_COLL], documents):
+            return 1
+
+    print("+- Migration finished, the old collections can be dropped now, exiting...")
+
+
+if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+    main_func = migrate_vtbili
+else:
+    main_func = initialize_vtbili
 
 loop = asyncio.get_event_loop()
-loop.run_until_complete(initialize_vtbili())
+exit_code = loop.run_until_complete(main_func())
 loop.close()
+sys.exit(exit_code)
@@ -1,16 +1,9 @@
 # flake8: noqa
 
-from .bili_heartbeat import holo_heartbeat, niji_heartbeat
+from .bili_calendar import bili_calendar_main
+from .bili_heartbeat import bili_live_heartbeat
 from .channels_bili import update_channels_stats
-from .hololive import hololive_main
-from .nijisanji import nijisanji_main
-from .others import others_main
+from .runner import JobRunner
 from .twitcasting import twitcasting_channels, twitcasting_heartbeat
 from .twitch import twitch_channels, twitch_heartbeat
-from .youtube_others import (
-    youtube_channels,
-    youtube_live_heartbeat,
-    youtube_video_feeds,
-)
-from .nijitube_channels import nijitube_channels_data
-from .nijitube_live import nijitube_live_heartbeat, nijitube_video_feeds
+from .youtube import youtube_channels, youtube_live_heartbeat, youtube_video_feeds
@@ -0,0 +1,237 @@
+import asyncio
+import calendar
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import aiofiles
+import aiohttp
+import ujson
+
+from utils import UpstreamClient, VTBiliDatabase
+
+vtlog = logging.getLogger("jobs.bili_calendar")
+
+CALENDAR_API = "https://api.live.bilibili.com/xlive/web-ucenter/v2/calendar/GetProgramList"
+CALENDAR_MAX_UIDS = 50  # UIDs per request, keep the URL short
+CALENDAR_CONCURRENCY = 4
+CALENDAR_PREFETCH_DAYS = 3  # Also fetch next month calendar when this close to the end of the month
+
+HOLO_BILI_UIDS = [
+    "389056211",
+    "286179206",
+    "20813493",
+    "366690056",
+    "9034870",
+    "389856447",
+    "336731767",
+    "339567211",
+    "389857131",
+    "375504219",
+    "389858027",
+    "389858754",
+    "389857640",
+    "389859190",
+    "332704117",
+    "389862071",
+    "412135222",
+    "412135619",
+    "454737600",
+    "454733056",
+    "454955503",
+    "443305053",
+    "443300418",
+    "491474048",
+    "491474049",
+    "491474050",
+    "491474051",
+    "491474052",
+    "427061218",
+    "354411419",
+    "456368455",
+    "511613156",
+    "511613155",
+    "511613157",
+    "456232604",
+    "551114700",
+    "350631685",
+    "551114698",
+    "647375261",
+]
+
+NIJI_BILI_UIDS = [
+    "434565011",
+    "434563934",
+    "434563422",
+    "436596837",
+    "436596839",
+    "403921378",
+    "477780496",
+    "441666968",
+    "441666967",
+    "511613154",
+    "403928672",
+    "436596836",
+    "403927583",
+    "410455162",
+    "458154141",
+    "434564604",
+    "403930401",
+    "477780497",
+    "458154144",
+    "436596840",
+    "458154140",
+    "458154139",
+    "477780499",
+    "436596838",
+    "458154143",
+    "458154142",
+    "436596841",
+    "477780498",
+    "488976342",
+    "421267475",
+    "420249427",
+    "434334701",
+    "434341786",
+    "434401868",
+    "455916618",
+    "455965041",
+    "472845978",
+    "472821519",
+    "472877684",
+    "477317922",
+    "477342747",
+    "477306079",
+    "480675481",
+    "480680646",
+    "480745939",
+    "474369808",
+    "319810877",
+    "490331391",
+    "56748733",
+    "370688671",
+    "370689338",
+    "370687372",
+    "370687588",
+    "370689210",
+    "392505232",
+    "471308347",
+    "36795838",
+    "98181",
+    "1750561",
+    "322210278",
+    "474113504",
+    "282994",
+]
+
+
+async def fetch_calendar_batch(
+    UpstreamConn: UpstreamClient, semaphore: asyncio.Semaphore, year_month: str, uids: List[str]
+) -> Tuple[Optional[dict], str, List[str]]:
+    api_params = {"type": 3, "year_month": year_month, "ruids": ",".join(uids)}
+    async with semaphore:
+        try:
+            resp = await UpstreamConn.get(CALENDAR_API, params=api_params)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            vtlog.error(f"|--! Failed to fetch {year_month} calendar for {len(uids)} UIDs: {e!r}")
+            return None, year_month, uids
+    if not resp.ok or not isinstance(resp.data, dict) or not isinstance(resp.data.get("data"), dict):
+        vtlog.error(f"|--! Failed to fetch {year_month} calendar for {len(uids)} UIDs, status {resp.status}")
+        return None, year_month, uids
+    return resp.data["data"], year_month, uids
+
+
+def parse_programs(calendar_data: dict, from_day: int, current_utc: float) -> Iterator[dict]:
+    programs_info = calendar_data.get("program_infos") or {}
+    users_info = calendar_data.get("user_infos") or {}
+    for date, date_programs in programs_info.items():
+        if int(date) < from_day:
+            continue
+        for program in date_programs["program_list"]:
+            if current_utc >= program["start_time"]:
+                continue
+            ch_name = users_info.get(str(program["ruid"]), {}).get("uname")
+            yield {
+                "id": f"bili{program['subscription_id']}_{program['program_id']}",
+                "room_id": program["room_id"],
+                "title": program["title"],
+                "startTime": program["start_time"],
+                "channel": str(program["ruid"]),
+                "channel_name": ch_name,
+                "platform": "bilibili",
+            }
+
+
+def calendar_months(current_dt: datetime) -> Dict[str, int]:
+    """Return the months to fetch and the first day to parse on each of them
+
+    Near the end of the month, the next month calendar is also fetched so
+    the programs of its first days show up before the month change.
+    """
+    months = {current_dt.strftime("%Y-%m"): current_dt.day}
+    days_in_month = calendar.monthrange(current_dt.year, current_dt.month)[1]
+    if days_in_month - current_dt.day < CALENDAR_PREFETCH_DAYS:
+        next_month = current_dt.replace(day=1) + timedelta(days=days_in_month)
+        months[next_month.strftime("%Y-%m")] = 1
+    return months
+
+
+async def bili_calendar_main(DatabaseConn: VTBiliDatabase, UpstreamConn: UpstreamClient, dataset_path: str):
+    if not UpstreamConn.is_available(CALENDAR_API):
+        vtlog.warning("BiliBili API is unavailable, keeping the last data and skipping run.")
+        return
+    async with aiofiles.open(dataset_path, "r", encoding="utf-8") as fp:
+        channels_dataset = ujson.loads(await fp.read())
+
+    groups = {
+        "hololive_data": HOLO_BILI_UIDS,
+        "nijisanji_data": NIJI_BILI_UIDS,
+        "otherbili_data": [str(chan["uid"]) for chan in channels_dataset],
+    }
+    uid_groups: Dict[str, set] = {}
+    for source, uids in groups.items():
+        for uid in uids:
+            uid_groups.setdefault(uid, set()).add(source)
+    all_uids = list(uid_groups)
+    uids_batches = [all_uids[i:i + CALENDAR_MAX_UIDS] for i in range(0, len(all_uids), CALENDAR_MAX_UIDS)]
+
+    current_dt = datetime.now(timezone(timedelta(hours=8)))  # Use GMT+8.
+    months = calendar_months(current_dt)
+    vtlog.info(
+        f"Fetching bili calendar ({', '.join(months)}) for {len(all_uids)} UIDs "
+        f"in {len(uids_batches)} batches..."
+    )
+    semaphore = asyncio.Semaphore(CALENDAR_CONCURRENCY)
+    calendar_tasks = [
+        fetch_calendar_batch(UpstreamConn, semaphore, year_month, uids)
+        for year_month in months
+        for uids in uids_batches
+    ]
+
+    current_utc = datetime.now(tz=timezone.utc).timestamp()
+    programs_data: Dict[str, dict] = {source: {} for source in groups}
+    failed_groups = set()
+    for task in asyncio.as_completed(calendar_tasks):
+        calendar_data, year_month, uids = await task
+        if calendar_data is None:
+            # Don't wipe the upcoming programs of a group we couldn't fetch.
+            for uid in uids:
+                failed_groups.update(uid_groups[uid])
+            continue
+        for program in parse_programs(calendar_data, months[year_month], current_utc):
+            for source in uid_groups.get(program["channel"], ()):
+                programs_data[source][program["id"]] = program
+
+    for source, programs in programs_data.items():
+        if source in failed_groups:
+            vtlog.warning(f"Skipping {source} update since some of its calendar failed to be fetched.")
+            continue
+        calendar_data = sorted(programs.values(), key=lambda x: x["startTime"])
+        vtlog.info(f"Updating {source} with {len(calendar_data)} upcoming programs...")
+        try:
+            await asyncio.wait_for(
+                DatabaseConn.replace_streams(source, calendar_data, {"status": "upcoming"}), 15.0
+            )
+        except asyncio.TimeoutError:
+            DatabaseConn.raise_error()
+            vtlog.error(f"Failed to update {source} upcoming data, timeout by 15s...")
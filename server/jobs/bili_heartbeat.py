@@ -1,52 +1,156 @@
 import asyncio
 import logging
 from datetime import datetime, timezone
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
 
 import aiohttp
 
-from utils import Jetri, VTBiliDatabase
+from utils import Jetri, RetryPolicy, UpstreamClient, VTBiliDatabase
 
-CHROME_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"  # noqa: E501
 vtlog = logging.getLogger("jobs.bili_heartbeat")
 
+ROOM_STATUS_API = "https://api.live.bilibili.com/room/v1/Room/get_status_info_by_uids"
+ROOM_INFO_API = "https://api.live.bilibili.com/room/v1/Room/get_info"
+ROOM_STATUS_MAX_UIDS = 50
+ROOM_STATUS_CONCURRENCY = 2
+ROOM_INFO_CONCURRENCY = 5  # Fallback per-room requests
+# A failed room is missing from /live until the next run, those calls are retried and hedged.
+# The status endpoint is a read-only POST, safe to retry.
+ROOM_STATUS_RETRY = RetryPolicy("bili_room_status", attempts=3, base_delay=1, max_delay=8, hedge=True)
+ROOM_INFO_RETRY = RetryPolicy("bili_room_info", attempts=3, base_delay=1, max_delay=8, hedge=True)
 
-async def fetch_room_hls(session: aiohttp.ClientSession, room_id: str) -> Tuple[dict, str]:
+
+async def fetch_room_hls(UpstreamConn: UpstreamClient, room_id: str) -> Tuple[dict, str]:
     parameter = {
         "cid": room_id,
         "quality": 4,
         "platform": "h5",
         "otype": "json",
     }
-    async with session.get("https://api.live.bilibili.com/room/v1/Room/playUrl", params=parameter) as res:
-        try:
-            items_data = await res.json()
-        except ValueError:
-            return {}, room_id
-        if res.status != 200:
-            return {}, room_id
+    res = await UpstreamConn.get("https://api.live.bilibili.com/room/v1/Room/playUrl", params=parameter)
+    items_data = res.data
+    if items_data is None or res.status != 200:
+        return {}, room_id
     if "data" not in items_data:
         return {}, room_id
     return items_data["data"], room_id
 
 
-async def fetch_room(session: aiohttp.ClientSession, room_id: str) -> Tuple[dict, str]:
+def parse_live_time(live_time) -> int:
+    """Parse the room `live_time`, an unix timestamp or a GMT+8 datetime string"""
+    if isinstance(live_time, str):
+        live_time = datetime.strptime(live_time + " +0800", "%Y-%m-%d %H:%M:%S %z").timestamp()
+    return int(round(live_time)) - (8 * 60 * 60)  # Set to UTC
+
+
+async def fetch_rooms_status(
+    UpstreamConn: UpstreamClient, semaphore: asyncio.Semaphore, uids: List[str]
+) -> Tuple[Optional[dict], List[str]]:
+    async with semaphore:
+        try:
+            res = await UpstreamConn.post(
+                ROOM_STATUS_API, json={"uids": [int(uid) for uid in uids]}, retry=ROOM_STATUS_RETRY
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            vtlog.warning(f"|--! Failed fetching status of {len(uids)} rooms: {e!r}")
+            return None, uids
+    items_data = res.data
+    if not res.ok or not isinstance(items_data, dict) or items_data.get("code") != 0:
+        vtlog.warning(f"|--! Failed fetching status of {len(uids)} rooms, status {res.status}")
+        return None, uids
+    # An empty result is returned as a list.
+    return items_data.get("data") or {}, uids
+
+
+async def fetch_room(
+    UpstreamConn: UpstreamClient, semaphore: asyncio.Semaphore, room_id: str
+) -> Tuple[dict, str]:
     parameter = {"room_id": room_id}
-    async with session.get("https://api.live.bilibili.com/room/v1/Room/get_info", params=parameter) as res:
+    async with semaphore:
         try:
-            items_data = await res.json()
-        except ValueError:
-            return {}, room_id
-        if res.status != 200:
+            res = await UpstreamConn.get(ROOM_INFO_API, params=parameter, retry=ROOM_INFO_RETRY)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            vtlog.warning(f"|--! Failed fetching Room ID: {room_id}: {e!r}")
             return {}, room_id
+    items_data = res.data
+    if items_data is None or res.status != 200 or not isinstance(items_data.get("data"), dict):
+        return {}, room_id
     return items_data["data"], room_id
 
 
-async def holo_heartbeat(DatabaseConn: VTBiliDatabase, JetriConn: Jetri, room_dataset: dict):
-    session = aiohttp.ClientSession(headers={"User-Agent": CHROME_UA})
+async def poll_rooms_status(UpstreamConn: UpstreamClient, rooms: Dict[str, str]) -> Dict[str, dict]:
+    """Fetch the status of every rooms, in as few requests as possible
+
+    The rooms are first checked in batches with the multi-UID status
+    endpoint, the rooms of a failed batch are then checked with the
+    per-room endpoint with a bounded concurrency. `live_time` is only
+    parsed for the rooms that are live.
+
+    :param rooms: A dict of room ID to the streamer UID
+    :type rooms: Dict[str, str]
+    :return: A dict of room ID to room status, rooms that failed are missing
+    :rtype: Dict[str, dict]
+    """
+    uids_rooms = {str(uid): str(room_id) for room_id, uid in rooms.items()}
+    all_uids = list(uids_rooms)
+    uids_batches = [
+        all_uids[i:i + ROOM_STATUS_MAX_UIDS] for i in range(0, len(all_uids), ROOM_STATUS_MAX_UIDS)
+    ]
+    vtlog.info(f"Checking status of {len(all_uids)} rooms in {len(uids_batches)} requests...")
+    semaphore = asyncio.Semaphore(ROOM_STATUS_CONCURRENCY)
+    rooms_status = {}
+    missing_rooms = []
+    status_tasks = [fetch_rooms_status(UpstreamConn, semaphore, uids) for uids in uids_batches]
+    for task in asyncio.as_completed(status_tasks):
+        status_data, uids = await task
+        if status_data is None:
+            missing_rooms.extend(uids_rooms[uid] for uid in uids)
+            continue
+        for uid, room_data in status_data.items():
+            room_id = uids_rooms.get(str(uid))
+            if room_id is None:
+                continue
+            live = room_data["live_status"] == 1
+            rooms_status[room_id] = {
+                "live": live,
+                "uid": str(room_data["uid"]),
+                "title": room_data["title"],
+                "thumbnail": room_data["cover_from_user"],
+                "viewers": room_data["online"],
+                "startTime": parse_live_time(room_data["live_time"]) if live else None,
+            }
+        # The rooms left out of the response are checked one by one.
+        returned_uids = {str(uid) for uid in status_data}
+        missing_rooms.extend(uids_rooms[uid] for uid in uids if uid not in returned_uids)
+
+    if not missing_rooms:
+        return rooms_status
+    vtlog.warning(f"Falling back to per-room requests for {len(missing_rooms)} rooms...")
+    semaphore = asyncio.Semaphore(ROOM_INFO_CONCURRENCY)
+    for task in asyncio.as_completed([fetch_room(UpstreamConn, semaphore, room) for room in missing_rooms]):
+        room_data, room_id = await task
+        if not room_data:
+            vtlog.warn(f"|--! Failed fetching Room ID: {room_id} skipping")
+            continue
+        live = room_data["live_status"] == 1
+        rooms_status[room_id] = {
+            "live": live,
+            "uid": str(room_data["uid"]),
+            "title": room_data["title"],
+            "thumbnail": room_data["user_cover"],
+            "viewers": room_data["online"],
+            "startTime": parse_live_time(room_data["live_time"]) if live else None,
+        }
+    return rooms_status
+
 
+async def holo_live_channels(JetriConn: Jetri) -> Optional[List[str]]:
     vtlog.info("Fetching local youtube data...")
-    holo_lives, holo_upcome = await JetriConn.fetch_lives()
+    try:
+        holo_lives, holo_upcome = await JetriConn.fetch_lives()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        vtlog.error(f"Failed to fetch youtube data from Jetri: {e!r}")
+        return None
 
     vtlog.info("Collecting live channels on youtube...")
     collect_live_channels = []
@@ -62,95 +166,16 @@ async def holo_heartbeat(DatabaseConn: VTBiliDatabase, JetriConn: Jetri, room_da
             if ch_id not in collect_live_channels:
                 vtlog.debug(f"|--> Adding: {ch_id}")
                 collect_live_channels.append(ch_id)
+    return collect_live_channels
 
-    holo_data: dict = room_dataset["holo"]
-    vtlog.info("Fetching ignored room data from database...")
-    # await DatabaseConn.fetch_data("hololive_ignored")
-    is_db_fetched = False
-    try:
-        db_holo_ignored: dict = await asyncio.wait_for(DatabaseConn.fetch_data("hololive_ignored"), 15.0)
-        is_db_fetched = True
-    except asyncio.TimeoutError:
-        await DatabaseConn.release()
-        DatabaseConn.raise_error()
-        vtlog.error("Failed to fetch Hololive Ignored database, using blank data.")
-        db_holo_ignored = {"data": []}
-    holo_ignored: list = db_holo_ignored["data"]
-
-    vtlog.info("Creating tasks to check room status...")
-    room_to_fetch = [fetch_room(session, room) for room in holo_data.keys()]
-    vtlog.info("Firing API requests!")
-    final_results = []
-    for froom in asyncio.as_completed(room_to_fetch):
-        room_data, room_id = await froom
-        vtlog.debug(f"|-- Checking heartbeat for: {room_id}")
-        if not room_data:
-            vtlog.warn(f"|--! Failed fetching Room ID: {room_id} skipping")
-            continue
-        if room_data["live_status"] != 1:
-            continue
-        thumbnail = room_data["user_cover"]
-        viewers = room_data["online"]
-        start_time = int(
-            round(datetime.strptime(room_data["live_time"] + " +0800", "%Y-%m-%d %H:%M:%S %z").timestamp())
-        ) - (
-            8 * 60 * 60
-        )  # Set to UTC
-        gen_id = f"bili{room_id}_{start_time}"
-        if gen_id in holo_ignored:
-            vtlog.warn(f"Ignoring {room_id} since it's an Ignored restream...")
-            continue
-        if str(room_id) in holo_data:
-            holo_map = holo_data[str(room_id)]
-            if "id" in holo_map and holo_map["id"] in collect_live_channels:
-                vtlog.warn(f"Ignoring {room_id} since it's a YouTube restream...")
-                if gen_id not in holo_ignored:
-                    holo_ignored.append(gen_id)
-                continue
-        vtlog.info(f"Adding room_id: {room_id}")
-        dd = {
-            "id": gen_id,
-            "room_id": int(room_id),
-            "title": room_data["title"],
-            "startTime": start_time,
-            "channel": str(room_data["uid"]),
-            "channel_name": holo_data[str(room_id)]["name"],
-            "thumbnail": thumbnail,
-            "viewers": viewers,
-            "platform": "bilibili",
-        }
-        final_results.append(dd)
-
-    if final_results:
-        final_results.sort(key=lambda x: x["startTime"])
-
-    vtlog.info("Updating database...")
-    upd_data = {"live": final_results}
-    upd_data2 = {"data": holo_ignored}
-    try:
-        await asyncio.wait_for(DatabaseConn.update_data("hololive_data", upd_data), 15.0)
-    except asyncio.TimeoutError:
-        await DatabaseConn.release()
-        DatabaseConn.raise_error()
-        vtlog.error("Failed to update Hololive Heartbeat data, timeout by 15s...")
-    if is_db_fetched:
-        try:
-            await asyncio.wait_for(DatabaseConn.update_data("hololive_ignored", upd_data2), 15.0)
-        except asyncio.TimeoutError:
-            await DatabaseConn.release()
-            DatabaseConn.raise_error()
-            vtlog.error("Failed to update Hololive ignored database, timeout by 15s...")
-    await session.close()
-
-
-async def niji_heartbeat(DatabaseConn: VTBiliDatabase, VTNijiConn: VTBiliDatabase, room_dataset: dict):
-    session = aiohttp.ClientSession(headers={"User-Agent": CHROME_UA})
 
+async def niji_live_channels(DatabaseConn: VTBiliDatabase) -> List[str]:
     vtlog.info("Fetching currently live/upcoming data from VTNiji Database...")
     collect_live_channels: list = []
     try:
-        niji_yt_puredata = await asyncio.wait_for(VTNijiConn.fetch_data("nijitube_live"), 15.0)
-        del niji_yt_puredata["_id"]
+        niji_yt_puredata = await asyncio.wait_for(
+            DatabaseConn.fetch_streams_by_channel("nijitube_live"), 15.0
+        )
         for channel_id, channel_data in niji_yt_puredata.items():
             for vtu in channel_data:
                 current_time = datetime.now(tz=timezone.utc).timestamp() - 300
@@ -162,83 +187,122 @@ async def niji_heartbeat(DatabaseConn: VTBiliDatabase, VTNijiConn: VTBiliDatabas
                         if channel_id not in collect_live_channels:
                             collect_live_channels.append(channel_id)
     except asyncio.TimeoutError:
-        await DatabaseConn.release()
         DatabaseConn.raise_error()
         vtlog.error("Failed to fetch live/upcoming data from VTNiji Database, timeout by 15s...")
-    niji_data: dict = room_dataset["niji"]
-    vtlog.info("Fetching ignored room data from database...")
-    is_db_fetched = False
-    try:
-        db_niji_ignored: dict = await asyncio.wait_for(DatabaseConn.fetch_data("nijisanji_ignored"), 15.0)
-        is_db_fetched = True
-    except asyncio.TimeoutError:
-        await DatabaseConn.release()
-        DatabaseConn.raise_error()
-        vtlog.error("Failed to fetch Nijisanji Ignored database, using blank data.")
-        db_niji_ignored = {"data": []}
-    niji_ignored: list = db_niji_ignored["data"]
+    return collect_live_channels
+
 
-    vtlog.info("Creating tasks to check room status...")
-    room_to_fetch = [fetch_room(session, room) for room in niji_data.keys()]
-    vtlog.info("Firing API requests!")
+async def update_group_heartbeat(
+    DatabaseConn: VTBiliDatabase,
+    group_name: str,
+    source: str,
+    ignored_source: str,
+    group_data: dict,
+    rooms_status: Dict[str, dict],
+    collect_live_channels: List[str],
+):
     final_results = []
-    for froom in asyncio.as_completed(room_to_fetch):
-        room_data, room_id = await froom
+    # Every restream seen live on this run, known or not.
+    ignored_ids = set()
+    failed_rooms = set()
+    for room_id, group_map in group_data.items():
+        room_data = rooms_status.get(room_id)
         vtlog.debug(f"|-- Checking heartbeat for: {room_id}")
-        if not room_data:
-            vtlog.warn(f"|--! Failed fetching Room ID: {room_id} skipping")
+        if room_data is None:
+            failed_rooms.add(int(room_id))
             continue
-        if room_data["live_status"] != 1:
+        if not room_data["live"]:
             continue
-        thumbnail = room_data["user_cover"]
-        viewers = room_data["online"]
-        start_time = int(
-            round(datetime.strptime(room_data["live_time"] + " +0800", "%Y-%m-%d %H:%M:%S %z").timestamp())
-        ) - (
-            8 * 60 * 60
-        )  # Set to UTC.
+        start_time = room_data["startTime"]
         gen_id = f"bili{room_id}_{start_time}"
-        if gen_id in niji_ignored:
+        if DatabaseConn.is_ignored(ignored_source, gen_id):
             vtlog.warn(f"Ignoring {room_id} since it's an Ignored restream...")
+            ignored_ids.add(gen_id)
             continue
-        if str(room_id) in niji_data:
-            niji_map = niji_data[str(room_id)]
-            if "id" in niji_map and niji_map["id"] in collect_live_channels:
-                vtlog.warn(f"Ignoring {room_id} since it's a YouTube restream...")
-                if gen_id not in niji_ignored:
-                    niji_ignored.append(gen_id)
-                continue
-        # hls_list, _ = await fetch_room_hls(session, str(room_id))
+        if "id" in group_map and group_map["id"] in collect_live_channels:
+            vtlog.warn(f"Ignoring {room_id} since it's a YouTube restream...")
+            ignored_ids.add(gen_id)
+            continue
+        vtlog.info(f"Adding room_id: {room_id}")
         dd = {
             "id": gen_id,
             "room_id": int(room_id),
             "title": room_data["title"],
             "startTime": start_time,
-            "channel": str(room_data["uid"]),
-            "channel_name": niji_data[str(room_id)]["name"],
-            "thumbnail": thumbnail,
-            "viewers": viewers,
+            "channel": room_data["uid"],
+            "channel_name": group_map["name"],
+            "thumbnail": room_data["thumbnail"],
+            "viewers": room_data["viewers"],
             "platform": "bilibili",
         }
         final_results.append(dd)
 
+    if failed_rooms:
+        # Keep the last known streams of the rooms that failed every attempts.
+        vtlog.warning(f"Keeping the last {group_name} data of {len(failed_rooms)} failed rooms...")
+        try:
+            last_streams = await asyncio.wait_for(
+                DatabaseConn.fetch_streams(source, {"status": "live"}), 15.0
+            )
+        except asyncio.TimeoutError:
+            DatabaseConn.raise_error()
+            vtlog.error(f"Failed to fetch {group_name} live data, timeout by 15s, skipping update...")
+            return
+        final_results.extend(stream for stream in last_streams if stream.get("room_id") in failed_rooms)
+
     if final_results:
         final_results.sort(key=lambda x: x["startTime"])
 
-    vtlog.info("Updating database...")
-    upd_data = {"live": final_results}
-    upd_data2 = {"data": niji_ignored}
+    vtlog.info(f"Updating {group_name} database...")
     try:
-        await asyncio.wait_for(DatabaseConn.update_data("nijisanji_data", upd_data), 15.0)
+        await asyncio.wait_for(DatabaseConn.replace_streams(source, final_results, {"status": "live"}), 15.0)
     except asyncio.TimeoutError:
-        await DatabaseConn.release()
         DatabaseConn.raise_error()
-        vtlog.error("Failed to update Nijisanji Heartbeat data, timeout by 15s...")
-    if is_db_fetched:
-        try:
-            await asyncio.wait_for(DatabaseConn.update_data("nijisanji_ignored", upd_data2), 15.0)
-        except asyncio.TimeoutError:
-            await DatabaseConn.release()
-            DatabaseConn.raise_error()
-            vtlog.error("Failed to update Nijisanji ignored database, timeout by 15s...")
-    await session.close()
+        vtlog.error(f"Failed to update {group_name} Heartbeat data, timeout by 15s...")
+    try:
+        await asyncio.wait_for(DatabaseConn.mark_ignored_ids(ignored_source, ignored_ids), 15.0)
+    except asyncio.TimeoutError:
+        DatabaseConn.raise_error()
+        vtlog.error(f"Failed to update {group_name} ignored streams, timeout by 15s...")
+
+
+async def bili_live_heartbeat(
+    DatabaseConn: VTBiliDatabase, JetriConn: Jetri, UpstreamConn: UpstreamClient, room_dataset: dict
+):
+    if not UpstreamConn.is_available(ROOM_STATUS_API):
+        vtlog.warning("BiliBili API is unavailable, keeping the last data and skipping run.")
+        return
+    holo_data: dict = room_dataset["holo"]
+    niji_data: dict = room_dataset["niji"]
+    rooms = {room_id: room_map["bili_uid"] for room_id, room_map in {**holo_data, **niji_data}.items()}
+    holo_channels, niji_channels, rooms_status = await asyncio.gather(
+        holo_live_channels(JetriConn),
+        niji_live_channels(DatabaseConn),
+        poll_rooms_status(UpstreamConn, rooms),
+    )
+    if not UpstreamConn.is_available(ROOM_STATUS_API):
+        # Went down during the run, the rooms that failed would be seen as offline.
+        vtlog.warning("BiliBili API became unavailable, keeping the last data.")
+        return
+    if holo_channels is None:
+        # Without the YouTube lives, restreams can't be told apart.
+        vtlog.error("Skipping Hololive heartbeat update.")
+    else:
+        await update_group_heartbeat(
+            DatabaseConn,
+            "Hololive",
+            "hololive_data",
+            "hololive_ignored",
+            holo_data,
+            rooms_status,
+            holo_channels,
+        )
+    await update_group_heartbeat(
+        DatabaseConn,
+        "Nijisanji",
+        "nijisanji_data",
+        "nijisanji_ignored",
+        niji_data,
+        rooms_status,
+        niji_channels,
+    )
@@ -3,24 +3,19 @@ import logging
 
 import aiofiles
 import aiohttp
-from utils import VTBiliDatabase
+from utils import UpstreamClient, VTBiliDatabase
 
 import ujson
 
 vtlog = logging.getLogger("jobs.channels_bili")
 
+VTBS_INFO_API = "https://api.vtbs.moe/v1/info"
 
-async def requests_data(url):
-    head = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"  # noqa: E501
-    }
-    vtlog.debug("\tOpening new session...")
-    async with aiohttp.ClientSession(headers=head) as session:
-        vtlog.debug("\tRequesting URL...")
-        async with session.get(url) as resp:
-            vtlog.debug("\tGetting results...")
-            json_results = await resp.json()
-    return json_results
+
+async def requests_data(UpstreamConn: UpstreamClient, url):
+    vtlog.debug("\tRequesting URL...")
+    resp = await UpstreamConn.get(url)
+    return resp.data
 
 
 async def find_channel_info(item_list, channel_data):
@@ -33,10 +28,17 @@ async def find_channel_info(item_list, channel_data):
     return cd, channel_data["id"], channel_data["num"]
 
 
-async def main_process_loop(channels_uids):
+async def main_process_loop(UpstreamConn: UpstreamClient, channels_uids):
     final_dds_data = {}
     vtlog.info("Requsting to vtbs api...")
-    vtbs_api_data = await requests_data("https://api.vtbs.moe/v1/info")
+    try:
+        vtbs_api_data = await requests_data(UpstreamConn, VTBS_INFO_API)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        vtlog.error(f"Failed to fetch vtbs api: {e!r}")
+        return None
+    if not isinstance(vtbs_api_data, list):
+        vtlog.error("Failed to fetch vtbs api, got an invalid response.")
+        return None
 
     hololivers = []
     nijisanji_vlivers = []
@@ -103,9 +105,6 @@ async def main_process_loop(channels_uids):
     hololivers.sort(key=lambda x: x["nsort"])
     nijisanji_vlivers.sort(key=lambda x: x["nsort"])
     other_vlivers.sort(key=lambda x: x["nsort"])
-    hololivers = [{x: d[x] for x in d if x not in {"nsort"}} for d in hololivers]
-    nijisanji_vlivers = [{x: d[x] for x in d if x not in {"nsort"}} for d in nijisanji_vlivers]
-    other_vlivers = [{x: d[x] for x in d if x not in {"nsort"}} for d in other_vlivers]
     final_dds_data["hololive"] = hololivers
     final_dds_data["nijisanji"] = nijisanji_vlivers
     final_dds_data["other"] = other_vlivers
@@ -113,7 +112,12 @@ async def main_process_loop(channels_uids):
     return final_dds_data
 
 
-async def update_channels_stats(DatabaseConn: VTBiliDatabase, dataset_set: list):
+async def update_channels_stats(
+    DatabaseConn: VTBiliDatabase, UpstreamConn: UpstreamClient, dataset_set: list
+):
+    if not UpstreamConn.is_available(VTBS_INFO_API):
+        vtlog.warning("vtbs.moe is unavailable, keeping the last data and skipping run.")
+        return
     vtlog.info("Collecting channel UUIDs")
     channels_uids = []
     for chan in dataset_set:
@@ -125,31 +129,31 @@ async def update_channels_stats(DatabaseConn: VTBiliDatabase, dataset_set: list)
             channels_uids.append({"id": dd["id"], "uid": dd["uid"], "num": nn})
 
     vtlog.info("Processing...")
-    final_data = await main_process_loop(channels_uids)
+    final_data = await main_process_loop(UpstreamConn, channels_uids)
+    if final_data is None:
+        vtlog.error("Skipping channels update, keeping the last data.")
+        return
     vtlog.info("Updating DB data for Hololive...")
     try:
         await asyncio.wait_for(
-            DatabaseConn.update_data("hololive_data", {"channels": final_data["hololive"]}), 15.0
+            DatabaseConn.replace_channels("hololive_data", final_data["hololive"]), 15.0
         )
     except asyncio.TimeoutError:
-        await DatabaseConn.release()
         DatabaseConn.raise_error()
         vtlog.error("Failed to update Hololive channels data, timeout by 15s...")
     vtlog.info("Updating DB data for Nijisanji...")
     try:
         await asyncio.wait_for(
-            DatabaseConn.update_data("nijisanji_data", {"channels": final_data["nijisanji"]}), 15.0
+            DatabaseConn.replace_channels("nijisanji_data", final_data["nijisanji"]), 15.0
         )
     except asyncio.TimeoutError:
-        await DatabaseConn.release()
         DatabaseConn.raise_error()
         vtlog.error("Failed to update Nijisanji channels data, timeout by 15s...")
     vtlog.info("Updating DB data for Others...")
     try:
         await asyncio.wait_for(
-            DatabaseConn.update_data("otherbili_data", {"channels": final_data["other"]}), 15.0
+            DatabaseConn.replace_channels("otherbili_data", final_data["other"]), 15.0
         )
     except asyncio.TimeoutError:
-        await DatabaseConn.release()
         DatabaseConn.raise_error()
         vtlog.error("Failed to update Others channels data, timeout by 15s...")
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from utils import job_deadline
+
+vtlog = logging.getLogger("jobs.runner")
+
+
+class JobRun:
+    """A single finished (or skipped) job run"""
+
+    __slots__ = ("name", "started", "finished", "duration", "outcome", "error")
+
+    def __init__(
+        self, name: str, started: float, finished: float, outcome: str, error: Optional[str] = None
+    ):
+        self.name = name
+        self.started = started
+        self.finished = finished
+        self.duration = finished - started
+        self.outcome = outcome
+        self.error = error
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "started": self.started,
+            "finished": self.finished,
+            "duration": self.duration,
+            "outcome": self.outcome,
+            "error": self.error,
+        }
+
+
+class JobRunner:
+    """Wrap every scheduler jobs with a hard deadline and skip-if-running semantics
+
+    Each job is registered to the scheduler with coalescing on, the runner
+    then skips a run if the previous one is still going, and make sure a
+    run that goes over its deadline get cancelled instead of overlapping
+    with the next one.
+    Every run is recorded so the scheduler capacity can be measured.
+    """
+
+    OUTCOMES = ("success", "error", "timeout", "skipped", "cancelled")
+
+    def __init__(self, scheduler: AsyncIOScheduler, deadline_ratio: float = 0.9, history_size: int = 100):
+        """Initialize the job runner
+
+        :param scheduler: The scheduler that will trigger the jobs
+        :type scheduler: AsyncIOScheduler
+        :param deadline_ratio: Default deadline in ratio of the job interval, defaults to 0.9
+        :type deadline_ratio: float, optional
+        :param history_size: Total runs kept for each job, defaults to 100
+        :type history_size: int, optional
+        """
+        self._scheduler = scheduler
+        self._deadline_ratio = deadline_ratio
+        self._history_size = history_size
+        self._jobs: Dict[str, dict] = {}
+        self._running: set = set()
+        self._history: Dict[str, deque] = {}
+
+    def add_job(
+        self,
+        func: Callable,
+        kwargs: Optional[dict] = None,
+        minutes: float = 1,
+        deadline: Optional[float] = None,
+        name: Optional[str] = None,
+        first_run: bool = True,
+    ) -> str:
+        """Register an interval job to the scheduler
+
+        :param func: The job coroutine function
+        :type func: Callable
+        :param kwargs: Keyword arguments passed to the job, defaults to None
+        :type kwargs: Optional[dict], optional
+        :param minutes: Job interval in minutes, defaults to 1
+        :type minutes: float, optional
+        :param deadline: Hard deadline in seconds, defaults to the interval times the deadline ratio
+        :type deadline: Optional[float], optional
+        :param name: Job name, defaults to the function name
+        :type name: Optional[str], optional
+        :param first_run: Include the job on `first_run()`, defaults to True
+        :type first_run: bool, optional
+        :return: The registered job name
+        :rtype: str
+        """
+        if name is None:
+            name = func.__name__
+        if name in self._jobs:
+            raise ValueError(f"Job {name} is already registered.")
+        interval = minutes * 60
+        if deadline is None:
+            deadline = interval * self._deadline_ratio
+        self._jobs[name] = {
+            "func": func,
+            "kwargs": kwargs or {},
+            "interval": interval,
+            "deadline": deadline,
+            "first_run": first_run,
+        }
+        self._history[name] = deque(maxlen=self._history_size)
+        self._scheduler.add_job(
+            self.run,
+            "interval",
+            args=[name],
+            id=name,
+            name=name,
+            minutes=minutes,
+            coalesce=True,
+            # Let an overlapping run reach `run()`, so it's skipped and recorded by the runner.
+            max_instances=2,
+            misfire_grace_time=int(interval),
+        )
+        return name
+
+    def is_running(self, name: str) -> bool:
+        return name in self._running
+
+    def _record(self, name: str, started: float, finished: float, outcome: str, error: str = None):
+        job_run = JobRun(name, started, finished, outcome, error)
+        self._history[name].append(job_run)
+        if outcome == "success":
+            vtlog.info(f"{name} finished in {job_run.duration:.2f}s")
+        elif outcome == "skipped":
+            vtlog.warning(f"{name} is still running, skipping this run.")
+        else:
+            vtlog.error(f"{name} {outcome} after {job_run.duration:.2f}s{': ' + error if error else ''}")
+
+    async def run(self, name: str):
+        """Run a registered job, skipping it if the previous run is still going."""
+        job = self._jobs[name]
+        if name in self._running:
+            now = time.time()
+            self._record(name, now, now, "skipped")
+            return
+        self._running.add(name)
+        started = time.time()
+        perf_start = time.perf_counter()
+        outcome = "success"
+        error = None
+        # Let the upstream retries know when the run get cancelled.
+        deadline_token = job_deadline.set(asyncio.get_event_loop().time() + job["deadline"])
+        try:
+            await asyncio.wait_for(job["func"](**job["kwargs"]), job["deadline"])
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            error = f"deadline of {job['deadline']}s exceeded, cancelled"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception as e:
+            outcome = "error"
+            error = f"{type(e).__name__}: {e}"
+            vtlog.exception(f"Unhandled exception on {name}")
+        finally:
+            job_deadline.reset(deadline_token)
+            self._running.discard(name)
+            self._record(name, started, started + (time.perf_counter() - perf_start), outcome, error)
+
+    async def first_run(self):
+        """Run every jobs that are marked for the first run at once."""
+        first_jobs = [name for name, job in self._jobs.items() if job["first_run"]]
+        await asyncio.gather(*[self.run(name) for name in first_jobs])
+
+    def history(self, name: str) -> list:
+        return [job_run.as_dict() for job_run in self._history.get(name, [])]
+
+    def stats(self) -> Dict[str, dict]:
+        """Summarize the recorded runs for every jobs
+
+        `utilization` is the average duration divided by the interval,
+        anything close to 1.0 means the job barely fit in its interval.
+        """
+        results = {}
+        for name, job in self._jobs.items():
+            job_runs = self._history[name]
+            outcomes = {outcome: 0 for outcome in self.OUTCOMES}
+            durations = []
+            for job_run in job_runs:
+                outcomes[job_run.outcome] += 1
+                if job_run.outcome != "skipped":
+                    durations.append(job_run.duration)
+            avg_duration = sum(durations) / len(durations) if durations else 0.0
+            results[name] = {
+                "runs": len(job_runs),
+                "outcomes": outcomes,
+                "average": avg_duration,
+                "max": max(durations) if durations else 0.0,
+                "interval": job["interval"],
+                "deadline": job["deadline"],
+                "utilization": avg_duration / job["interval"] if job["interval"] else 0.0,
+                "running": name in self._running,
+            }
+        return results
+
+    async def report(self):
+        """Log the summarized stats, meant to be scheduled periodically."""
+        for name, stats in self.stats().items():
+            if not stats["runs"]:
+                continue
+            outcomes = ", ".join(f"{key}: {val}" for key, val in stats["outcomes"].items() if val)
+            vtlog.info(
+                f"{name}: {stats['runs']} runs ({outcomes}), avg {stats['average']:.2f}s, "
+                f"max {stats['max']:.2f}s, utilization {stats['utilization'] * 100:.1f}%"
+            )
@@ -1,51 +1,92 @@
 import asyncio
+import functools
 import logging
 from datetime import datetime, timezone
-from typing import Tuple, Union
+from typing import Optional
 from urllib.parse import unquote
 
-import aiohttp
+from utils import RetryPolicy, TwitcastingPoller, UpstreamClient, VTBiliDatabase
 
-from utils import VTBiliDatabase
-
-CHROME_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"  # noqa: E501
 vtlog = logging.getLogger("jobs.twitcasting")
 
-
-async def check_status(
-    session: aiohttp.ClientSession, param: dict, channel: str
-) -> Tuple[Union[str, None], str]:
-    async with session.get("https://twitcasting.tv/streamchecker.php", params=param) as res:
-        text_results: Union[str, None] = await res.text()
-        if res.status != 200:
-            return None, channel
-    return text_results, channel
-
-
-async def get_user_data(session: aiohttp.ClientSession, channel: str) -> Tuple[Union[dict, None], str]:
-    uri = f"https://frontendapi.twitcasting.tv/users/{channel}?detail=true"
-    async with session.get(uri) as resp:
-        json_res: dict = await resp.json()
-        if resp.status != 200:
-            return None, channel
-    return json_res, channel
-
-
-async def twitcasting_channels(DatabaseConn: VTBiliDatabase, twitcast_data: list):
-    sessions = aiohttp.ClientSession(headers={"User-Agent": CHROME_UA})
-
+STATUS_API = "https://twitcasting.tv/streamchecker.php"
+USER_API = "https://frontendapi.twitcasting.tv/users/"
+# A failed status check keeps the channel last state, but a stream start or end is missed until the next run.
+STATUS_RETRY = RetryPolicy("twitcasting_status", attempts=2, base_delay=1, max_delay=4, hedge=True)
+USER_RETRY = RetryPolicy("twitcasting_user", attempts=3, base_delay=2, max_delay=30)
+
+
+async def check_status(UpstreamConn: UpstreamClient, channel: str) -> Optional[str]:
+    param = {"u": channel, "v": 999}
+    res = await UpstreamConn.get(STATUS_API, params=param, as_json=False, retry=STATUS_RETRY)
+    if res.status != 200:
+        return None
+    return res.data
+
+
+async def get_user_data(UpstreamConn: UpstreamClient, channel: str) -> Optional[dict]:
+    uri = f"{USER_API}{channel}?detail=true"
+    resp = await UpstreamConn.get(uri, retry=USER_RETRY)
+    if resp.status != 200:
+        return None
+    return resp.data
+
+
+def parse_status(status_text: str, channel: str, current_time: float) -> Optional[dict]:
+    """Parse the tab-separated streamchecker result into a live stream, None if not live"""
+    tw_list = status_text.split("\t")
+
+    tw_sid = tw_list[0]
+    if not tw_sid or tw_sid == "7" or len(tw_list) < 8:
+        return None
+
+    tw_time_passed = int(tw_list[6])
+    tw_max_viewers = int(tw_list[5])
+    tw_current_viewers = int(tw_list[3])
+
+    tw_title = unquote(tw_list[7]).strip()
+
+    if tw_title == "":
+        tw_title = f"Radio Live #{tw_sid}"
+
+    return {
+        "id": tw_sid,
+        "title": tw_title,
+        "startTime": int(round(current_time - tw_time_passed)),
+        "channel": channel,
+        "viewers": tw_current_viewers,
+        "peakViewers": tw_max_viewers,
+        "platform": "twitcasting",
+    }
+
+
+async def twitcasting_channels(
+    DatabaseConn: VTBiliDatabase,
+    UpstreamConn: UpstreamClient,
+    twitcast_data: list,
+    twcast_poller: TwitcastingPoller,
+):
+    if not UpstreamConn.is_available(USER_API):
+        vtlog.warning("Twitcasting API is unavailable, keeping the last data and skipping run.")
+        return
     vtlog.info("Collecting IDs...")
     twitcast_id = [twit["id"] for twit in twitcast_data]
 
-    vtlog.info("Creating tasks...")
-    twitcast_tasks = [get_user_data(sessions, uid) for uid in twitcast_id]
-
-    vtlog.info("Running all tasks...")
-    for twit_task in asyncio.as_completed(twitcast_tasks):
-        twit_res, channel = await twit_task
-        vtlog.info(f"|-- Checking {channel} data...")
+    vtlog.info(f"Fetching {len(twitcast_id)} channels...")
+    users_data = await twcast_poller.poll(functools.partial(get_user_data, UpstreamConn), twitcast_id)
+    stats = twcast_poller.run_stats()
+    vtlog.info(
+        f"Fetched {stats['requests']} channels, {stats['failed']} failed, latency avg "
+        f"{stats['latency_avg']:.2f}s max {stats['latency_max']:.2f}s"
+    )
+
+    channels_data = {}
+    failed_channels = []
+    for channel, twit_res in users_data.items():
+        vtlog.debug(f"|-- Checking {channel} data...")
         if not twit_res or "user" not in twit_res:
             vtlog.error(f"|--! Failed to fetch info for {channel}, skipping...")
+            failed_channels.append(channel)
             continue
 
         udata = twit_res["user"]
@@ -68,77 +109,85 @@ async def twitcasting_channels(DatabaseConn: VTBiliDatabase, twitcast_data: list
             "platform": "twitcasting",
         }
 
-        vtlog.info(f"Updating channels database for {channel}...")
-        try:
-            await asyncio.wait_for(DatabaseConn.update_data("twitcasting_channels", {channel: data}), 15.0)
-        except asyncio.TimeoutError:
-            await DatabaseConn.release()
-            DatabaseConn.raise_error()
-            vtlog.error("Failed to update twitcasting channels data, timeout by 15s...")
-
-    await sessions.close()
-
+        channels_data[channel] = data
 
-async def twitcasting_heartbeat(DatabaseConn: VTBiliDatabase, twitcast_data: list):
-    sessions = aiohttp.ClientSession(headers={"User-Agent": CHROME_UA})
+    if failed_channels:
+        vtlog.warn(f"Failed to fetch {len(failed_channels)} channels: {', '.join(failed_channels)}")
+    if not channels_data:
+        vtlog.warn("No channels data to update, bailing!")
+        return
 
+    vtlog.info(f"Updating channels database for {len(channels_data)} channels...")
+    try:
+        await asyncio.wait_for(
+            DatabaseConn.upsert_channels("twitcasting_channels", list(channels_data.values())), 15.0
+        )
+    except asyncio.TimeoutError:
+        DatabaseConn.raise_error()
+        vtlog.error("Failed to update twitcasting channels data, timeout by 15s...")
+
+
+async def twitcasting_heartbeat(
+    DatabaseConn: VTBiliDatabase,
+    UpstreamConn: UpstreamClient,
+    twitcast_data: list,
+    twcast_poller: TwitcastingPoller,
+):
+    if not UpstreamConn.is_available(STATUS_API):
+        vtlog.warning("Twitcasting is unavailable, keeping the last data and skipping run.")
+        return
     vtlog.info("Collecting IDs...")
     twitcast_id = [twit["id"] for twit in twitcast_data]
 
-    vtlog.info("Creating tasks...")
-    twitcast_tasks = [check_status(sessions, {"u": uid, "v": 999}, uid) for uid in twitcast_id]
+    vtlog.info(f"Checking {len(twitcast_id)} channels heartbeat...")
+    status_data = await twcast_poller.poll(functools.partial(check_status, UpstreamConn), twitcast_id)
 
-    tmri = lambda t: int(round(t))  # noqa: E731
-
-    twitcasting_live_data = []
     current_time = datetime.now(tz=timezone.utc).timestamp()
-    vtlog.info("Running all tasks...")
-    for twit_task in asyncio.as_completed(twitcast_tasks):
-        twit_res, channel = await twit_task
-        vtlog.info(f"|-- Checking {channel} heartbeat")
+    updated_streams = []
+    has_ended = False
+    for channel, twit_res in status_data.items():
+        vtlog.debug(f"|-- Checking {channel} heartbeat")
         if not twit_res:
+            # Keep the last known state, a failed check doesn't mean it ended.
             vtlog.error(f"|--! Failed to fetch info for {channel}, skipping...")
             continue
-
-        tw_list = twit_res.split("\t")
-
-        tw_sid = tw_list[0]
-        if not tw_sid:
-            continue
-        if tw_sid == "7":
+        try:
+            stream = parse_status(twit_res, channel, current_time)
+        except ValueError:
+            vtlog.error(f"|--! Malformed status for {channel}, skipping...")
             continue
-
-        tw_time_passed = int(tw_list[6])
-        tw_max_viewers = int(tw_list[5])
-        tw_current_viewers = int(tw_list[3])
-
-        tw_title = unquote(tw_list[7]).strip()
-
-        if tw_title == "":
-            tw_title = f"Radio Live #{tw_sid}"
-
-        tw_start_time = tmri(current_time - tw_time_passed)
-
-        dataset = {
-            "id": tw_sid,
-            "title": tw_title,
-            "startTime": tw_start_time,
-            "channel": channel,
-            "viewers": tw_current_viewers,
-            "peakViewers": tw_max_viewers,
-            "platform": "twitcasting",
-        }
-        twitcasting_live_data.append(dataset)
-
-    if twitcasting_live_data:
-        twitcasting_live_data.sort(key=lambda x: x["startTime"])
-
-    vtlog.info("Updating database...")
-    upd_data = {"live": twitcasting_live_data}
+        update = twcast_poller.update_stream(channel, stream)
+        if update in ("ended", "replaced"):
+            vtlog.info(f"|--> {channel} stream {update}")
+            has_ended = True
+        elif update is not None:
+            vtlog.debug(f"|--> {channel} stream {update}")
+            updated_streams.append(stream)
+
+    stats = twcast_poller.run_stats()
+    vtlog.info(
+        f"Checked {stats['requests']} channels, {stats['failed']} failed, {stats['new']} new, "
+        f"{stats['changed']} changed, {stats['ended']} ended, latency avg {stats['latency_avg']:.2f}s "
+        f"max {stats['latency_max']:.2f}s"
+    )
+
+    if twcast_poller.synced and not has_ended:
+        if not updated_streams:
+            vtlog.info("No changes, skipping database update.")
+            return
+        vtlog.info(f"Updating {len(updated_streams)} streams on database...")
+        database_task = DatabaseConn.upsert_streams("twitcasting_data", updated_streams, {"status": "live"})
+    else:
+        # First run or ended streams, the database need to be replaced as a whole.
+        vtlog.info("Updating database...")
+        database_task = DatabaseConn.replace_streams(
+            "twitcasting_data", twcast_poller.live_streams(), {"status": "live"}
+        )
     try:
-        await asyncio.wait_for(DatabaseConn.update_data("twitcasting_data", upd_data), 15.0)
+        updated = await asyncio.wait_for(database_task, 15.0)
     except asyncio.TimeoutError:
-        await DatabaseConn.release()
         DatabaseConn.raise_error()
         vtlog.error("Failed to update twitcasting live data, timeout by 15s...")
-    await sessions.close()
+        updated = False
+    # Resend everything on the next run if the write got lost.
+    twcast_poller.mark_synced(updated)
@@ -7,22 +7,21 @@ from utils import TwitchHelix, VTBiliDatabase
 vtlog = logging.getLogger("jobs.twitch")
 
 
-async def find_channel_id(user_id: str, dataset: list):
-    for data in dataset:
-        if data["user_id"] == user_id:
-            return data["id"]
-
-
 async def twitch_channels(DatabaseConn: VTBiliDatabase, TwitchConn: TwitchHelix, twitch_dataset: list):
     twitch_usernames = [user["id"] for user in twitch_dataset]
     vtlog.info("Fetching Twitch API...")
     twitch_results = await TwitchConn.fetch_channels(twitch_usernames)
 
+    vtlog.info(f"Fetching followers for {len(twitch_results)} channels...")
+    followers_total = await TwitchConn.fetch_followers_total([result["id"] for result in twitch_results])
+
     vtlog.info("Parsing results...")
+    channels_data = {}
     for result in twitch_results:
-        vtlog.info(f"|-- Parsing: {result['login']}")
-        vtlog.info(f"|-- Fetching followers: {result['login']}")
-        followers_data = await TwitchConn.fetch_followers(result["id"])
+        vtlog.debug(f"|-- Parsing: {result['login']}")
+        if followers_total.get(result["id"]) is None:
+            # Keep the stored data instead of losing the follower count.
+            continue
 
         chan_id = result["login"]
 
@@ -32,28 +31,56 @@ async def twitch_channels(DatabaseConn: VTBiliDatabase, TwitchConn: TwitchHelix,
             "name": result["display_name"],
             "description": result["description"],
             "thumbnail": result["profile_image_url"],
-            "followerCount": followers_data["total"],
+            "followerCount": followers_total[result["id"]],
             "viewCount": result["view_count"],
             "platform": "twitch",
         }
 
-        vtlog.info(f"Updating channels database for {chan_id}...")
-        try:
-            await asyncio.wait_for(DatabaseConn.update_data("twitch_channels", {chan_id: data}), 15.0)
-        except asyncio.TimeoutError:
-            await DatabaseConn.release()
-            DatabaseConn.raise_error()
-            vtlog.error("Failed to update twitch channels data, timeout by 15s...")
+        channels_data[chan_id] = data
+
+    missing_channels = [user for user in twitch_usernames if user not in channels_data]
+    if missing_channels:
+        vtlog.warn(f"Failed to fetch {len(missing_channels)} channels: {', '.join(missing_channels)}")
+    if not channels_data:
+        vtlog.warn("No channels data to update, bailing!")
+        return
+
+    vtlog.info(f"Updating channels database for {len(channels_data)} channels...")
+    try:
+        await asyncio.wait_for(
+            DatabaseConn.upsert_channels("twitch_channels", list(channels_data.values())), 15.0
+        )
+    except asyncio.TimeoutError:
+        DatabaseConn.raise_error()
+        vtlog.error("Failed to update twitch channels data, timeout by 15s...")
 
 
 async def twitch_heartbeat(DatabaseConn: VTBiliDatabase, TwitchConn: TwitchHelix, twitch_dataset: list):
     twitch_usernames = [user["id"] for user in twitch_dataset]
+    # Logins that couldn't be resolved are only retried by `twitch_channels`.
+    unknown_usernames = [
+        user
+        for user in twitch_usernames
+        if TwitchConn.user_id_of(user) is None and not TwitchConn.is_unresolved(user)
+    ]
+    if unknown_usernames:
+        vtlog.info(f"Resolving user ID of {len(unknown_usernames)} channels...")
+        await TwitchConn.fetch_channels(unknown_usernames)
+    # Query by user ID, anything that still can't be resolved is queried by login.
+    twitch_user_ids = []
+    login_usernames = []
+    for username in twitch_usernames:
+        user_id = TwitchConn.user_id_of(username)
+        if user_id is None:
+            login_usernames.append(username)
+        else:
+            twitch_user_ids.append(user_id)
     vtlog.info("Fetching Twitch API...")
-    twitch_results = await TwitchConn.fetch_live_data(twitch_usernames)
+    twitch_results = await TwitchConn.fetch_live_data(login_usernames, twitch_user_ids)
 
     if not twitch_results:
         vtlog.warn("No one is live right now, bailing...")
-        await DatabaseConn.update_data("twitch_data", {"live": []})
+        await DatabaseConn.replace_streams("twitch_data", [], {"status": "live"})
         return 1
 
     vtlog.info("Parsing results...")
@@ -64,7 +91,7 @@ async def twitch_heartbeat(DatabaseConn: VTBiliDatabase, TwitchConn: TwitchHelix
             continue
         start_time = result["started_at"]
 
-        login_name = await find_channel_id(result["user_id"], twitch_dataset)
+        login_name = TwitchConn.login_of(result["user_id"]) or result["user_login"]
         vtlog.info(f"|= Processing: {login_name}")
 
         thumbnail = result["thumbnail_url"]
@@ -91,11 +118,11 @@ async def twitch_heartbeat(DatabaseConn: VTBiliDatabase, TwitchConn: TwitchHelix
     if lives_data:
         lives_data.sort(key=lambda x: x["startTime"])
 
-    upd_data = {"live": lives_data}
     vtlog.info("Updating database...")
     try:
-        await asyncio.wait_for(DatabaseConn.update_data("twitch_data", upd_data), 15.0)
+        await asyncio.wait_for(
+            DatabaseConn.replace_streams("twitch_data", lives_data, {"status": "live"}), 15.0
+        )
     except asyncio.TimeoutError:
-        await DatabaseConn.release()
         DatabaseConn.raise_error()
         vtlog.error("Failed to update twitch live data, timeout by 15s...")
@@ -0,0 +1,653 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from utils import (
+    HeartbeatScheduler,
+    RetryPolicy,
+    RotatingAPIKey,
+    UpstreamClient,
+    VTBiliDatabase,
+    YouTubeFeedPoller,
+    current_time,
+    datetime_yt_parse,
+)
+
+vtlog = logging.getLogger("jobs.youtube")
+
+YOUTUBE_API = "https://www.googleapis.com/youtube/v3/"
+MAX_VIDEOS_PER_CALL = 50
+MAX_CHANNELS_PER_CALL = 50
+HEARTBEAT_CONCURRENCY = 4
+CHANNELS_CONCURRENCY = 4
+# Heartbeat chunks are hedged when slow, a failed chunk leaves its streams stale for a whole interval.
+HEARTBEAT_RETRY = RetryPolicy("youtube_heartbeat", attempts=3, base_delay=1, max_delay=8, hedge=True)
+VIDEOS_RETRY = RetryPolicy("youtube_videos", attempts=3, base_delay=2, max_delay=16)
+CHANNELS_RETRY = RetryPolicy("youtube_channels", attempts=3, base_delay=2, max_delay=16)
+
+# Every YouTube job runs over a list of channel sets, a channel set is a dict with:
+# name: used for logging, source: the streams source, ended_source: the ended IDs source,
+# channels_source: the channels source, channels: a list of channel with id, name and group.
+
+
+def index_channel_sets(channel_sets: List[dict]) -> Dict[str, Tuple[dict, dict]]:
+    """Map every channel ID to its channel set and channel, the first set wins"""
+    channels_index = {}
+    for channel_set in channel_sets:
+        for channel in channel_set["channels"]:
+            if channel["id"] in channels_index:
+                vtlog.warning(f"{channel['id']} is on more than one channel set, using the first one.")
+                continue
+            channels_index[channel["id"]] = (channel_set, channel)
+    return channels_index
+
+
+async def fetch_sets_streams(
+    DatabaseConn: VTBiliDatabase, channel_sets: List[dict]
+) -> Tuple[Optional[Dict[str, List[dict]]], Dict[str, dict]]:
+    """Fetch the streams of every channel sets, grouped by channel
+
+    :return: A dict of channel ID to its streams (None if the database timed out),
+             and a dict of channel ID to the channel set its streams are stored on
+    :rtype: Tuple[Optional[Dict[str, List[dict]]], Dict[str, dict]]
+    """
+    try:
+        sets_streams = await asyncio.wait_for(
+            asyncio.gather(
+                *[
+                    DatabaseConn.fetch_streams_by_channel(channel_set["source"])
+                    for channel_set in channel_sets
+                ]
+            ),
+            15.0,
+        )
+    except asyncio.TimeoutError:
+        DatabaseConn.raise_error()
+        return None, {}
+    youtube_lives_data: Dict[str, List[dict]] = {}
+    channels_set: Dict[str, dict] = {}
+    for channel_set, set_streams in zip(channel_sets, sets_streams):
+        for channel in channel_set["channels"]:
+            channels_set.setdefault(channel["id"], channel_set)
+        # Channels removed from the dataset keep being tracked until their streams are gone.
+        for channel_id, streams in set_streams.items():
+            youtube_lives_data.setdefault(channel_id, []).extend(streams)
+            channels_set.setdefault(channel_id, channel_set)
+    return youtube_lives_data, channels_set
+
+
+async def insert_sets_ended_ids(
+    DatabaseConn: VTBiliDatabase, channels_set: Dict[str, dict], ended_video_ids: Dict[str, set]
+):
+    """Store the newly ended video IDs, routed to the ended IDs source of their channel set"""
+    sets_ended_ids: Dict[str, dict] = {}
+    for channel_id, video_ids in ended_video_ids.items():
+        if channel_id not in channels_set:
+            continue
+        ended_source = channels_set[channel_id]["ended_source"]
+        sets_ended_ids.setdefault(ended_source, {})[channel_id] = video_ids
+    for ended_source, set_ended_ids in sets_ended_ids.items():
+        try:
+            await asyncio.wait_for(DatabaseConn.insert_ended_ids(ended_source, set_ended_ids), 15.0)
+        except asyncio.TimeoutError:
+            DatabaseConn.raise_error()
+            vtlog.error(f"Failed to update ended video ids ({ended_source}), timeout by 15s...")
+
+
+async def check_for_doubles(dataset: list):
+    repaired_data = []
+    parsed_ids = []
+    for data in dataset:
+        if data["id"] not in parsed_ids:
+            parsed_ids.append(data["id"])
+            repaired_data.append(data)
+    del parsed_ids
+    return repaired_data
+
+
+async def fetch_xmls(
+    UpstreamConn: UpstreamClient, feed_poller: YouTubeFeedPoller, channel: dict
+) -> Tuple[List[str], dict]:
+    video_ids = await feed_poller.fetch(UpstreamConn, channel["id"])
+    return video_ids, channel
+
+
+async def fetch_apis(
+    UpstreamConn: UpstreamClient,
+    yt_api_key: RotatingAPIKey,
+    endpoint: str,
+    param: dict,
+    retry: Optional[RetryPolicy] = None,
+) -> dict:
+    items_data = None
+    # Retry with another key only if the used one got quarantined, a request error is returned as is.
+    for _ in range(len(yt_api_key)):
+        api_key = yt_api_key.get(f"{endpoint}.list")
+        res = await UpstreamConn.get(
+            f"{YOUTUBE_API}{endpoint}", params={**param, "key": api_key}, retry=retry
+        )
+        items_data = res.data
+        if not yt_api_key.report(api_key, res.status, items_data) or not yt_api_key.has_available_key:
+            break
+    if items_data is None:
+        items_data = {}
+    return items_data
+
+
+def batch_channel_videos(channel_videos: List[Tuple[str, str, list]]) -> List[List[Tuple[str, str, list]]]:
+    """Pack every channels new videos into batches of at most 50 IDs (the API maximum)
+    without splitting a channel between two batches, a feed only has 15 entries."""
+    batches = []
+    batch, batch_size = [], 0
+    for chan, aff, videos in channel_videos:
+        if batch and batch_size + len(videos) > MAX_VIDEOS_PER_CALL:
+            batches.append(batch)
+            batch, batch_size = [], 0
+        batch.append((chan, aff, videos))
+        batch_size += len(videos)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def fetch_videos_batch(
+    UpstreamConn: UpstreamClient, yt_api_key: RotatingAPIKey, batch: List[Tuple[str, str, list]]
+) -> Tuple[dict, List[Tuple[str, str, list]]]:
+    param = {
+        "part": "snippet,liveStreamingDetails",
+        "id": ",".join(video for _, _, videos in batch for video in videos),
+    }
+    try:
+        items_data = await fetch_apis(UpstreamConn, yt_api_key, "videos", param, VIDEOS_RETRY)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Still unseen on the next run, they'll be fetched then.
+        vtlog.warning(f"|--! Videos request failed: {e!r}")
+        return {}, batch
+    return items_data, batch
+
+
+async def fetch_heartbeat_chunk(
+    UpstreamConn: UpstreamClient,
+    yt_api_key: RotatingAPIKey,
+    semaphore: asyncio.Semaphore,
+    chunk_list: list,
+    chunk_n: int,
+) -> Tuple[Optional[list], list, int]:
+    param = {
+        "part": "snippet,liveStreamingDetails",
+        "id": ",".join(chunk_list),
+    }
+    async with semaphore:
+        try:
+            items_data = await fetch_apis(UpstreamConn, yt_api_key, "videos", param, HEARTBEAT_RETRY)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            vtlog.warning(f"|--! Chunk {chunk_n} heartbeat request failed: {e!r}")
+            return None, chunk_list, chunk_n
+    if "items" not in items_data:
+        vtlog.warning(f"|--! Chunk {chunk_n} heartbeat returned an error")
+        return None, chunk_list, chunk_n
+    return items_data["items"], chunk_list, chunk_n
+
+
+async def youtube_video_feeds(
+    DatabaseConn: VTBiliDatabase,
+    UpstreamConn: UpstreamClient,
+    channel_sets: List[dict],
+    yt_api_key: RotatingAPIKey,
+    feed_poller: YouTubeFeedPoller,
+):
+    vtlog.info("Fetching saved live data...")
+    youtube_lives_data, channels_set = await fetch_sets_streams(DatabaseConn, channel_sets)
+    if youtube_lives_data is None:
+        vtlog.error("Failed to fetch youtube live database, skipping run.")
+        return
+
+    fetched_video_ids = {}
+    for channel, channel_data in youtube_lives_data.items():
+        fetched_video_ids[channel] = {video["id"] for video in channel_data}
+    # Only the newly ended IDs are written back.
+    ended_video_ids: dict = {}
+
+    vtlog.info("Creating job task for xml files.")
+    # Channels with live or upcoming streams are always polled, the others only when due.
+    channels_index = index_channel_sets(channel_sets)
+    xmls_to_fetch = [
+        fetch_xmls(UpstreamConn, feed_poller, chan)
+        for _, chan in channels_index.values()
+        if feed_poller.is_due(chan["id"], bool(youtube_lives_data.get(chan["id"])))
+    ]
+    collected_videos_ids = {}
+    vtlog.info("Firing xml fetching!")
+    for xmls in asyncio.as_completed(xmls_to_fetch):
+        feed_video_ids, chan = await xmls
+
+        fetched_videos = fetched_video_ids.get(chan["id"], set())
+
+        vtlog.info(f"|=> Processing XMLs: {chan['name']}")
+        video_ids = []
+        for ids_ in feed_video_ids:
+            if ids_ not in fetched_videos:
+                video_ids.append(ids_)
+
+        collected_videos_ids[chan["id"]] = video_ids
+
+    feed_stats = feed_poller.run_stats()
+    vtlog.info(
+        f"Collected! Feeds: {feed_stats['fetched']} fetched ({feed_stats['bytes']} bytes), "
+        f"{feed_stats['not_modified'] + feed_stats['identical']} unchanged, {feed_stats['parsed']} parsed, "
+        f"{feed_stats['failed']} failed, {feed_stats['skipped']} not due; "
+        f"{feed_stats['discovered']} new entries, latency avg {feed_stats['latency_avg']:.0f}s "
+        f"max {feed_stats['latency_max']}s"
+    )
+    vtlog.info("Filtering already ended video IDs...")
+    sets_collected_ids: Dict[str, list] = {}
+    for chan_id, videos in collected_videos_ids.items():
+        ended_source = channels_set[chan_id]["ended_source"]
+        sets_collected_ids.setdefault(ended_source, []).extend(videos)
+    try:
+        sets_unseen_ids = await asyncio.wait_for(
+            asyncio.gather(
+                *[
+                    DatabaseConn.filter_unseen_ids(ended_source, collected_ids)
+                    for ended_source, collected_ids in sets_collected_ids.items()
+                ]
+            ),
+            15.0,
+        )
+    except asyncio.TimeoutError:
+        DatabaseConn.raise_error()
+        vtlog.warning("Failed to fetch youtube ended id database, skipping run.")
+        return
+    unseen_video_ids = set().union(*sets_unseen_ids)
+
+    vtlog.info("Now creating tasks for a non-fetched Video IDs to the API.")
+    channel_videos = []
+    for chan, videos in collected_videos_ids.items():
+        videos = [video for video in videos if video in unseen_video_ids]
+        if not videos:
+            vtlog.debug(f"Skipping: {chan} since there's no video to fetch.")
+            continue
+        vtlog.info(f"|-- Processing: {chan}")
+        channel_videos.append((chan, channels_index[chan][1]["group"], videos))
+    # Every channel sets share the same batches.
+    video_batches = batch_channel_videos(channel_videos)
+    vtlog.info(f"Batched {len(channel_videos)} channels into {len(video_batches)} API calls.")
+    if video_batches and not UpstreamConn.is_available(YOUTUBE_API):
+        # Still unseen on the next run, they'll be fetched then.
+        vtlog.warning("YouTube API is unavailable, skipping the new videos for now.")
+        return
+    video_to_fetch = [fetch_videos_batch(UpstreamConn, yt_api_key, batch) for batch in video_batches]
+
+    if not video_to_fetch:
+        vtlog.warn("|== No video to fetch, bailing!")
+        return 0
+
+    vtlog.info("Firing API fetching!")
+    time_past_limit = current_time() - (6 * 60 * 60)
+    for task in asyncio.as_completed(video_to_fetch):
+        video_results, batch = await task
+        if "items" not in video_results:
+            vtlog.error(f"|=! Failed to fetch videos data for: {', '.join(ch_id for ch_id, _, _ in batch)}")
+            continue
+        batch_items = {res_item["id"]: res_item for res_item in video_results["items"]}
+        for ch_id, ch_group, videos in batch:
+            if ch_id not in youtube_lives_data:
+                youtube_lives_data[ch_id] = []
+            if ch_id not in ended_video_ids:
+                ended_video_ids[ch_id] = set()
+            vtlog.info(f"|== Parsing videos data for: {ch_id}")
+            youtube_videos_data = youtube_lives_data[ch_id]
+            for res_item in (batch_items[video] for video in videos if video in batch_items):
+                video_id = res_item["id"]
+                if "liveStreamingDetails" not in res_item:
+                    # Assume normal video
+                    ended_video_ids[ch_id].add(video_id)
+                    continue
+                snippets = res_item["snippet"]
+                livedetails = res_item["liveStreamingDetails"]
+                if not livedetails:
+                    # Assume normal video
+                    ended_video_ids[ch_id].add(video_id)
+                    continue
+                broadcast_cnt = snippets["liveBroadcastContent"]
+                if not broadcast_cnt:
+                    broadcast_cnt = "unknown"
+                if broadcast_cnt not in ("live", "upcoming"):
+                    broadcast_cnt = "unknown"
+
+                title = snippets["title"]
+                start_time = 0
+                if "scheduledStartTime" in livedetails:
+                    start_time = datetime_yt_parse(livedetails["scheduledStartTime"])
+                if "actualStartTime" in livedetails:
+                    start_time = datetime_yt_parse(livedetails["actualStartTime"])
+                thumbs = f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg"
+
+                dd_hell = {
+                    "id": video_id,
+                    "title": title,
+                    "status": broadcast_cnt,
+                    "startTime": start_time,
+                    "endTime": None,
+                    "group": ch_group,
+                    "thumbnail": thumbs,
+                    "platform": "youtube",
+                }
+                if "actualEndTime" in livedetails:
+                    dd_hell["endTime"] = datetime_yt_parse(livedetails["actualEndTime"])
+                    dd_hell["status"] = "past"
+
+                if dd_hell["status"] == "past" and time_past_limit >= dd_hell["endTime"]:
+                    vtlog.warning(f"Removing: {video_id} since it's way past the time limit.")
+                    ended_video_ids[ch_id].add(video_id)
+                    continue
+
+                vtlog.info("Adding: {}".format(video_id))
+                youtube_videos_data.append(dd_hell)
+
+            youtube_lives_data[ch_id] = youtube_videos_data
+            source = channels_set[ch_id]["source"]
+            vtlog.info(f"|== Updating database ({source}: {ch_id})...")
+            try:
+                await asyncio.wait_for(
+                    DatabaseConn.replace_streams(source, youtube_videos_data, {"channel": ch_id}),
+                    15.0,
+                )
+            except asyncio.TimeoutError:
+                DatabaseConn.raise_error()
+                vtlog.error(f"Failed to update live data for {ch_id}, timeout by 15s...")
+
+    await insert_sets_ended_ids(DatabaseConn, channels_set, ended_video_ids)
+
+
+async def youtube_live_heartbeat(
+    DatabaseConn: VTBiliDatabase,
+    UpstreamConn: UpstreamClient,
+    channel_sets: List[dict],
+    yt_api_key: RotatingAPIKey,
+    hb_scheduler: HeartbeatScheduler,
+):
+    if not UpstreamConn.is_available(YOUTUBE_API):
+        vtlog.warning("YouTube API is unavailable, keeping the last data and skipping run.")
+        return
+
+    vtlog.info("Fetching live data...")
+    youtube_lives_data, channels_set = await fetch_sets_streams(DatabaseConn, channel_sets)
+    if youtube_lives_data is None:
+        vtlog.error("Failed to fetch youtube live database, skipping run.")
+        return
+    channels_index = index_channel_sets(channel_sets)
+    channels_group = {chan_id: chan["group"] for chan_id, (_, chan) in channels_index.items()}
+    # Only the newly ended IDs are written back.
+    ended_video_ids: dict = {}
+
+    tracked_videos = {}
+    videos_set = {}
+    for cid, data in youtube_lives_data.items():
+        for vd in data:
+            if vd["status"] == "unknown":
+                continue
+            tracked_videos[vd["id"]] = vd
+            videos_set[vd["id"]] = cid
+
+    if not tracked_videos:
+        vtlog.warn("No live/upcoming videos, bailing!")
+        return 0
+
+    # Only check the streams that are due, far-future upcoming streams are checked rarely.
+    hb_scheduler.sync(tracked_videos)
+    videos_list = hb_scheduler.due()
+    if not videos_list:
+        vtlog.info(f"No heartbeat due for the {len(tracked_videos)} tracked videos, bailing!")
+        return 0
+
+    chunked_videos_list = [
+        videos_list[i:i + MAX_VIDEOS_PER_CALL] for i in range(0, len(videos_list), MAX_VIDEOS_PER_CALL)
+    ]
+    vtlog.info(
+        f"Checking heartbeat for {len(videos_list)} of {len(tracked_videos)} videos "
+        f"in {len(chunked_videos_list)} chunks"
+    )
+    semaphore = asyncio.Semaphore(HEARTBEAT_CONCURRENCY)
+    chunk_tasks = [
+        fetch_heartbeat_chunk(UpstreamConn, yt_api_key, semaphore, chunk_list, chunk_n)
+        for chunk_n, chunk_list in enumerate(chunked_videos_list, 1)
+    ]
+
+    parsed_ids = {}
+    failed_ids = set()
+    # Written once per channel after every chunks are parsed.
+    updated_channels = set()
+    time_past_limit = current_time() - (6 * 60 * 60)
+    for chunk_task in asyncio.as_completed(chunk_tasks):
+        chunk_items, chunk_list, chunk_n = await chunk_task
+        if chunk_items is None:
+            # Don't let a failed request mark its videos as privated.
+            vtlog.error(f"|--! Failed to fetch heartbeat for chunk {chunk_n}, skipping its videos.")
+            failed_ids.update(chunk_list)
+            continue
+        vtlog.info(f"Parsing results of chunk {chunk_n}...")
+        for res_item in chunk_items:
+            video_id = res_item["id"]
+            vtlog.info(f"|-- Checking {video_id} heartbeat...")
+            snippets = res_item["snippet"]
+            channel_id = videos_set.get(video_id, snippets["channelId"])
+            if channel_id not in ended_video_ids:
+                ended_video_ids[channel_id] = set()
+            if "liveStreamingDetails" not in res_item:
+                continue
+            livedetails = res_item["liveStreamingDetails"]
+            status_live = "upcoming"
+            start_time = 0
+            end_time = 0
+            if "scheduledStartTime" in livedetails:
+                start_time = datetime_yt_parse(livedetails["scheduledStartTime"])
+            if "actualStartTime" in livedetails:
+                status_live = "live"
+                start_time = datetime_yt_parse(livedetails["actualStartTime"])
+            if "actualEndTime" in livedetails:
+                status_live = "past"
+                end_time = datetime_yt_parse(livedetails["actualEndTime"])
+            view_count = None
+            if "concurrentViewers" in livedetails:
+                view_count = livedetails["concurrentViewers"]
+                try:
+                    view_count = int(view_count)
+                except ValueError:
+                    pass
+            thumbs = f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg"
+            vtlog.info(f"|--> Update status for {video_id}: {status_live}")
+            new_streams_data = []
+            for data_streams in youtube_lives_data[channel_id]:
+                if "group" not in data_streams:
+                    data_streams["group"] = channels_group.get(channel_id)
+                if data_streams["id"] == video_id:
+                    append_data = {
+                        "id": data_streams["id"],
+                        "title": snippets["title"],
+                        "status": status_live,
+                        "startTime": start_time,
+                        "endTime": None,
+                        "group": data_streams["group"],
+                        "thumbnail": thumbs,
+                        "platform": "youtube",
+                    }
+                    if view_count is not None:
+                        append_data["viewers"] = view_count
+                    if status_live == "past":
+                        append_data["endTime"] = end_time
+                    if status_live == "past" and time_past_limit >= end_time:
+                        vtlog.warning(f"Removing: {video_id} since it's way past the time limit.")
+                        ended_video_ids[channel_id].add(video_id)
+                        hb_scheduler.discard(video_id)
+                        continue
+                    hb_scheduler.schedule(video_id, append_data)
+                    new_streams_data.append(append_data)
+                else:
+                    if data_streams["status"] == "past":
+                        if time_past_limit >= data_streams["endTime"]:
+                            past_id = data_streams["id"]
+                            vtlog.warning(f"Removing: {past_id} since it's way past the time limit.")
+                            ended_video_ids[channel_id].add(past_id)
+                            hb_scheduler.discard(past_id)
+                            continue
+                    new_streams_data.append(data_streams)
+            new_streams_data = await check_for_doubles(new_streams_data)
+            youtube_lives_data[channel_id] = new_streams_data
+            updated_channels.add(channel_id)
+            parsed_ids[video_id] = channel_id
+
+    # Filter this if the video is privated.
+    for video in videos_list:
+        if video not in parsed_ids and video not in failed_ids:
+            chan_id = videos_set[video]
+            channel_data = youtube_lives_data[chan_id]
+            new_channel_data = []
+            for ch_vid in channel_data:
+                if ch_vid["id"] != video:
+                    new_channel_data.append(ch_vid)
+                else:
+                    if chan_id not in ended_video_ids:
+                        ended_video_ids[chan_id] = set()
+                    ended_video_ids[chan_id].add(ch_vid["id"])
+            hb_scheduler.discard(video)
+            youtube_lives_data[chan_id] = new_channel_data
+            updated_channels.add(chan_id)
+
+    for channel_id in updated_channels:
+        source = channels_set[channel_id]["source"]
+        vtlog.info(f"|-- Updating heartbeat for channel {channel_id} ({source})...")
+        try:
+            await asyncio.wait_for(
+                DatabaseConn.replace_streams(source, youtube_lives_data[channel_id], {"channel": channel_id}),
+                15.0,
+            )
+        except asyncio.TimeoutError:
+            DatabaseConn.raise_error()
+            vtlog.error(f"|--! Failed to update heartbeat for channel {channel_id}, timeout by 15s...")
+
+    await insert_sets_ended_ids(DatabaseConn, channels_set, ended_video_ids)
+
+
+async def fetch_channels_batch(
+    UpstreamConn: UpstreamClient,
+    yt_api_key: RotatingAPIKey,
+    semaphore: asyncio.Semaphore,
+    batch: List[dict],
+) -> Tuple[Optional[list], List[dict]]:
+    param = {
+        "part": "snippet,statistics",
+        "id": ",".join(channel["id"] for channel in batch),
+    }
+    async with semaphore:
+        try:
+            items_data = await fetch_apis(UpstreamConn, yt_api_key, "channels", param, CHANNELS_RETRY)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            vtlog.warning(f"|--! Channels request failed: {e!r}")
+            return None, batch
+    if "items" not in items_data:
+        return None, batch
+    return items_data["items"], batch
+
+
+async def youtube_channels(
+    DatabaseConn: VTBiliDatabase,
+    UpstreamConn: UpstreamClient,
+    channel_sets: List[dict],
+    yt_api_key: RotatingAPIKey,
+):
+    if not UpstreamConn.is_available(YOUTUBE_API):
+        vtlog.warning("YouTube API is unavailable, keeping the last data and skipping run.")
+        return
+
+    vtlog.info("Creating task for channels data.")
+    channels_index = index_channel_sets(channel_sets)
+    channels_list = [channel for _, channel in channels_index.values()]
+    channels_batches = [
+        channels_list[i:i + MAX_CHANNELS_PER_CALL]
+        for i in range(0, len(channels_list), MAX_CHANNELS_PER_CALL)
+    ]
+    semaphore = asyncio.Semaphore(CHANNELS_CONCURRENCY)
+    channels_tasks = [
+        fetch_channels_batch(UpstreamConn, yt_api_key, semaphore, batch) for batch in channels_batches
+    ]
+
+    vtlog.info(f"Running {len(channels_tasks)} tasks for {len(channels_list)} channels...")
+    sets_channels_data: Dict[str, dict] = {}
+    failed_channels = []
+    for chan_task in asyncio.as_completed(channels_tasks):
+        batch_items, batch = await chan_task
+        if batch_items is None:
+            vtlog.warn(f"|--! Failed to fetch: {', '.join(channel['name'] for channel in batch)}")
+            failed_channels.extend(channel["name"] for channel in batch)
+            continue
+        batch_items = {chan_data["id"]: chan_data for chan_data in batch_items if chan_data}
+
+        for channel in batch:
+            vtlog.debug(f"|--> Processing: {channel['name']}")
+            if channel["id"] not in batch_items:
+                vtlog.warn(f"|--! Empty data on {channel['name']}")
+                failed_channels.append(channel["name"])
+                continue
+            chan_data = batch_items[channel["id"]]
+
+            chan_snip = chan_data["snippet"]
+            chan_stats = chan_data["statistics"]
+
+            ch_id = chan_data["id"]
+            title = chan_snip["title"]
+            desc = chan_snip["description"]
+            pubat = chan_snip["publishedAt"]
+
+            thumbs_data = chan_snip["thumbnails"]
+            if "high" in thumbs_data:
+                thumbs = thumbs_data["high"]["url"]
+            elif "medium" in thumbs_data:
+                thumbs = thumbs_data["medium"]["url"]
+            else:
+                thumbs = thumbs_data["default"]["url"]
+
+            subscount = chan_stats["subscriberCount"]
+            viewcount = chan_stats["viewCount"]
+            vidcount = chan_stats["videoCount"]
+
+            try:
+                subscount = int(subscount)
+                viewcount = int(viewcount)
+                vidcount = int(vidcount)
+            except ValueError:
+                pass
+
+            data = {
+                "id": ch_id,
+                "name": title,
+                "description": desc,
+                "publishedAt": pubat,
+                "thumbnail": thumbs,
+                "group": channel["group"],
+                "subscriberCount": subscount,
+                "viewCount": viewcount,
+                "videoCount": vidcount,
+                "platform": "youtube",
+            }
+
+            channels_source = channels_index[ch_id][0]["channels_source"]
+            sets_channels_data.setdefault(channels_source, {})[ch_id] = data
+
+    if failed_channels:
+        vtlog.warn(f"Failed to fetch {len(failed_channels)} channels: {', '.join(failed_channels)}")
+    if not sets_channels_data:
+        vtlog.warn("No channels data to update, bailing!")
+        return
+
+    for channels_source, channels_data in sets_channels_data.items():
+        vtlog.info(f"Updating {channels_source} database for {len(channels_data)} channels...")
+        try:
+            await asyncio.wait_for(
+                DatabaseConn.upsert_channels(channels_source, list(channels_data.values())), 15.0
+            )
+        except asyncio.TimeoutError:
+            DatabaseConn.raise_error()
+            vtlog.error(f"Failed to update {channels_source} data, timeout by 15s...")
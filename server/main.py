@@ -4,8 +4,9 @@ import logging
 import os
 import sys
 
-if not sys.version_info.major == 3 and sys.version_info.minor >= 6:
-    print("Python 3.6 or higher are required to run this app.")
+# contextvars (job deadlines in utils.retry) and datetime.fromisoformat (utils.ytfeed) are needed.
+if sys.version_info < (3, 7):
+    print("Python 3.7 or higher are required to run this app.")
     print("You are using Python {}.{}".format(sys.version_info.major, sys.version_info.minor))
     sys.exit(1)
 
@@ -18,11 +19,9 @@ except ImportError:
 try:
     import ujson
     from jobs import (
-        holo_heartbeat,
-        hololive_main,
-        niji_heartbeat,
-        nijisanji_main,
-        others_main,
+        JobRunner,
+        bili_calendar_main,
+        bili_live_heartbeat,
         twitcasting_channels,
         twitcasting_heartbeat,
         twitch_channels,
@@ -31,11 +30,17 @@ try:
         youtube_channels,
         youtube_live_heartbeat,
         youtube_video_feeds,
-        nijitube_channels_data,
-        nijitube_live_heartbeat,
-        nijitube_video_feeds,
     )
-    from utils import Jetri, RotatingAPIKey, TwitchHelix, VTBiliDatabase
+    from utils import (
+        HeartbeatScheduler,
+        Jetri,
+        RotatingAPIKey,
+        TwitcastingPoller,
+        TwitchHelix,
+        UpstreamClient,
+        VTBiliDatabase,
+        YouTubeFeedPoller,
+    )
 except ImportError as ie:
     print("Missing one or more requirements!")
     traced = str(ie)
@@ -47,18 +52,53 @@ BASE_FOLDER_PATH = "./"  # Modify this
 
 MONGODB_URI = "mongodb://127.0.0.1:12345"  # Modify this
 MONGODB_DBNAME = "vtbili"  # Modify this
+MONGODB_POOL_SIZE = 100  # Motor connection pool size
+MONGODB_SOURCE_CONCURRENCY = 25  # Max concurrent operations per source
+ENDED_IDS_TTL = 30 * 24 * 60 * 60  # In seconds, how long ended YouTube video IDs are remembered
+IGNORED_STREAMS_TTL = 6 * 60 * 60  # In seconds, how long an ignored restream is kept after it ended
+SEEN_FILTER_CAPACITY = 500000  # Expected total ended YouTube video IDs
+SEEN_FILTER_ERROR_RATE = 0.001  # Wanted false positive rate, false positives are confirmed to MongoDB
 
 # Modify this
 # You can add more and more API keys if you want.
 YT_API_KEYS = [
     "",
 ]
-# Used to rotate between multiple YT API Keys (If you have multiple API keys)
-API_KEY_ROTATION_RATE = 60  # In minutes
+# Estimated daily quota units of each YT API Keys, the least used key is picked on every call
+YT_API_DAILY_QUOTA = 10000
+
+# [Upstream HTTP Client]
+UPSTREAM_MAX_CONNECTIONS = 100  # Total open connections
+UPSTREAM_MAX_CONNECTIONS_PER_HOST = 10  # Open connections per upstream host
+UPSTREAM_DNS_CACHE_TTL = 300  # In seconds
+UPSTREAM_KEEPALIVE = 60  # In seconds, should be longer than the shortest interval
+UPSTREAM_TIMEOUT = 30  # In seconds
+# Per-host circuit breaker, a host failing too much is not called until the cooldown is over.
+UPSTREAM_BREAKER = {
+    "window": 60,  # In seconds, rolling window of request outcomes
+    "min_requests": 10,  # Requests needed on the window before opening
+    "error_rate": 0.5,  # Failure rate that opens the circuit
+    "slow_call": 15,  # In seconds, slower requests count as failures
+    "cooldown": 30,  # In seconds, doubled after each failed probe
+    "max_cooldown": 5 * 60,  # In seconds
+}
+# Token buckets shared by every jobs, keyed by host or host + path prefix.
+# rate: sustained requests per second, burst: requests sent at once.
+# A request takes a token from its host bucket and from its endpoint bucket.
+UPSTREAM_RATE_LIMITS = {
+    "api.live.bilibili.com": {"rate": 10, "burst": 20},
+    "api.live.bilibili.com/room/v1/Room/get_info": {"rate": 5, "burst": 10},
+    "api.vtbs.moe": {"rate": 1, "burst": 2},
+    "twitcasting.tv/streamchecker.php": {"rate": 2, "burst": 4},
+    "frontendapi.twitcasting.tv": {"rate": 1, "burst": 4},
+    "www.googleapis.com": {"rate": 10, "burst": 20},
+}
 
 # [Twitch (OPTIONAL)]
 TWITCH_CLIENT_ID = ""  # Modify this
 TWITCH_CLIENT_SECRET = ""  # Modify this
+TWITCH_TOKEN_CACHE = ".twitch_token.json"  # Relative to BASE_FOLDER_PATH, keeps the token between restarts
+TWITCH_CONCURRENCY = 5  # Concurrent Helix requests
 
 # [Interval Config]
 INTERVAL_BILI_CHANNELS = 6 * 60  # In minutes
@@ -68,23 +108,84 @@ INTERVAL_BILI_LIVE = 2  # In minutes
 INTERVAL_YT_CHANNELS = 6 * 60  # In minutes
 INTERVAL_YT_FEED = 2  # In minutes
 INTERVAL_YT_LIVE = 1  # In minutes
+# Each channel feed is polled between those two intervals depending on its upload cadence.
+# Channels that published in the last few hours or have live/upcoming streams use the minimum.
+INTERVAL_YT_FEED_MIN = INTERVAL_YT_FEED  # In minutes
+INTERVAL_YT_FEED_MAX = 30  # In minutes
+# Upcoming streams are checked more often as their start time approach, never less than this.
+INTERVAL_YT_UPCOMING_MAX = 60  # In minutes
 
 INTERVAL_TWITCASTING_CHANNELS = 6 * 60  # In minutes
 INTERVAL_TWITCASTING_LIVE = 1  # In minutes
+# Twitcasting requests are spread over this part of the interval instead of being sent at once.
+TWITCASTING_SPREAD_RATIO = 0.5
+TWITCASTING_CHANNELS_SPREAD = 5  # In minutes
+TWITCASTING_CONCURRENCY = 4  # Concurrent Twitcasting requests
 
 INTERVAL_TWITCH_LIVE = 1  # In minutes
 INTERVAL_TWITCH_CHANNELS = 6 * 60  # In minutes
 
+# [Job Runner Config]
+# Hard deadline for every job run, in percent of their own interval.
+# A run that goes over it get cancelled so it never overlap with the next one.
+JOB_DEADLINE_RATIO = 0.9
+INTERVAL_JOB_REPORT = 10  # In minutes
+
 SKIP_CHANNELS_FIRST_RUN = True
 SKIP_EVERY_FIRST_RUN = False
 
 
 async def check_error_rate(database_conn: VTBiliDatabase):
+    lock_stats = database_conn.lock_wait_stats(reset=True)
+    for source, stats in lock_stats.items():
+        logging.getLogger("main").debug(
+            f"Lock wait on {source}: {stats['count']} ops, "
+            f"avg {stats['average'] * 1000:.2f}ms, max {stats['max'] * 1000:.2f}ms"
+        )
+    for source, stats in database_conn.seen_filter_stats().items():
+        logging.getLogger("main").debug(
+            f"Seen filter {source}: {stats['count']} IDs, {stats['memory']} bytes, "
+            f"{stats['maybe']} confirmed to database ({stats['false_positives']} false positives)"
+        )
     # Reset connection if error rate higher than 5
     if database_conn._error_rate >= 5:
         await database_conn.reset_connection()
 
 
+async def report_api_usage(yt_api_key: RotatingAPIKey):
+    for api_key, usage in yt_api_key.usage().items():
+        calls = ", ".join(f"{call_type}: {count}" for call_type, count in usage["calls"].items())
+        quarantined = f", quarantined ({usage['reason']})" if usage["quarantined_until"] else ""
+        logging.getLogger("main").info(
+            f"API key {api_key}: {usage['units']}/{usage['quota']} units ({calls or 'no calls'}), "
+            f"{usage['errors']} errors{quarantined}"
+        )
+
+
+async def report_upstream_health(upstream_conn: UpstreamClient):
+    for host, stats in upstream_conn.breaker_stats().items():
+        logging.getLogger("main").info(
+            f"Upstream {host}: {stats['state']}, {stats['success']} ok, {stats['failed']} failed, "
+            f"{stats['refused']} refused, opened {stats['opened']} times "
+            f"(window error rate {stats['error_rate']:.0%}, latency avg {stats['latency_avg']:.2f}s)"
+        )
+    for name, stats in upstream_conn.retry_stats().items():
+        hedge_delay = f"{stats['hedge_delay']:.2f}s" if stats["hedge_delay"] is not None else "not yet"
+        logging.getLogger("main").info(
+            f"Retries {name}: {stats['calls']} calls, {stats['retries']} retries, "
+            f"{stats['recovered']} recovered, {stats['gave_up']} gave up ({stats['deadline']} by deadline), "
+            f"{stats['hedged']} hedged ({stats['hedge_won']} won, hedge after {hedge_delay})"
+        )
+    for key, stats in upstream_conn.rate_limit_stats().items():
+        if not stats["acquired"]:
+            continue
+        logging.getLogger("main").info(
+            f"Rate limit {key}: {stats['acquired']} requests, {stats['waited']} waited "
+            f"(avg {stats['wait_avg']:.2f}s, max {stats['wait_max']:.2f}s), "
+            f"queue depth {stats['queue_depth']} (max {stats['queue_max']})"
+        )
+
+
 if __name__ == "__main__":
     logfiles = os.path.join(BASE_FOLDER_PATH, "vtbili_server.log")
     logging.basicConfig(
@@ -104,16 +205,41 @@ if __name__ == "__main__":
 
     vtlog.info("Opening new loop!")
     loop_de_loop = asyncio.get_event_loop()
-    jetri_co = Jetri(loop_de_loop)
+    upstream_co = UpstreamClient(
+        loop_de_loop,
+        UPSTREAM_MAX_CONNECTIONS,
+        UPSTREAM_MAX_CONNECTIONS_PER_HOST,
+        UPSTREAM_DNS_CACHE_TTL,
+        UPSTREAM_KEEPALIVE,
+        UPSTREAM_TIMEOUT,
+        UPSTREAM_BREAKER,
+        UPSTREAM_RATE_LIMITS,
+    )
+    jetri_co = Jetri(upstream_co)
     vtlog.info(f"Connecting to VTBili database using: {MONGODB_URI} ({MONGODB_DBNAME})")
-    vtbili_db = VTBiliDatabase(MONGODB_URI, MONGODB_DBNAME)
+    vtbili_db = VTBiliDatabase(
+        MONGODB_URI, MONGODB_DBNAME, MONGODB_POOL_SIZE, MONGODB_SOURCE_CONCURRENCY
+    )
+    loop_de_loop.run_until_complete(vtbili_db.ensure_ended_ids_index(ENDED_IDS_TTL))
+    for ended_source in ("nijitube_ended_ids", "yt_other_ended_ids"):
+        loop_de_loop.run_until_complete(
+            vtbili_db.load_seen_filter(ended_source, SEEN_FILTER_CAPACITY, SEEN_FILTER_ERROR_RATE)
+        )
+    for ignored_source in ("hololive_ignored", "nijisanji_ignored"):
+        loop_de_loop.run_until_complete(vtbili_db.load_ignored_ids(ignored_source, IGNORED_STREAMS_TTL))
     vtlog.info("Connected!")
 
     tw_helix = None
     if TWITCH_CLIENT_ID != "" and TWITCH_CLIENT_SECRET != "":
-        tw_helix = TwitchHelix(TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, loop_de_loop)
+        tw_helix = TwitchHelix(
+            TWITCH_CLIENT_ID,
+            TWITCH_CLIENT_SECRET,
+            loop_de_loop,
+            os.path.join(BASE_FOLDER_PATH, TWITCH_TOKEN_CACHE),
+            TWITCH_CONCURRENCY,
+        )
 
-    yt_api_rotate = RotatingAPIKey(YT_API_KEYS, API_KEY_ROTATION_RATE)
+    yt_api_rotate = RotatingAPIKey(YT_API_KEYS, YT_API_DAILY_QUOTA)
 
     vtlog.info("nijisanji: Compiling all dataset into one big single-file.")
     nijisanji_data = os.path.join(BASE_FOLDER_PATH, "dataset", "nijisanji.json")
@@ -129,35 +255,33 @@ if __name__ == "__main__":
     with open(nijisankr_data, "r", encoding="utf-8") as fp:
         nijisankr_dataset = ujson.load(fp)["vliver"]
 
-    nijisanall_dataset = nijisanji_dataset + nijisanen_dataset + nijisanid_dataset + nijisankr_dataset
-
     nijisanji_yt_dataset = []
     for nijidata in nijisanji_dataset:
         fd_comp = {
             "id": nijidata["youtube"],
             "name": nijidata["name"],
-            "affs": "nijisanjijp"
+            "group": "nijisanjijp",
         }
         nijisanji_yt_dataset.append(fd_comp)
     for nijidata in nijisanen_dataset:
         fd_comp = {
             "id": nijidata["youtube"],
             "name": nijidata["name"],
-            "affs": "nijisanjien"
+            "group": "nijisanjien",
         }
         nijisanji_yt_dataset.append(fd_comp)
     for nijidata in nijisanid_dataset:
         fd_comp = {
             "id": nijidata["youtube"],
             "name": nijidata["name"],
-            "affs": "nijisanjiid"
+            "group": "nijisanjiid",
         }
         nijisanji_yt_dataset.append(fd_comp)
     for nijidata in nijisankr_dataset:
         fd_comp = {
             "id": nijidata["youtube"],
             "name": nijidata["name"],
-            "affs": "nijisanjikr"
+            "group": "nijisanjikr",
         }
         nijisanji_yt_dataset.append(fd_comp)
 
@@ -168,10 +292,9 @@ if __name__ == "__main__":
     del nijisankr_dataset
     del nijisanid_dataset
 
-    nijisanji_dataset_affs = {chan["id"]: chan["affs"] for chan in nijisanji_yt_dataset}
-
     vtlog.info("Initiating scheduler...")
     scheduler = AsyncIOScheduler()
+    job_runner = JobRunner(scheduler, JOB_DEADLINE_RATIO)
 
     vtlog.info(
         "With Interval:\n"
@@ -186,100 +309,102 @@ if __name__ == "__main__":
     scheduler.add_job(
         check_error_rate, "interval", kwargs={"database_conn": vtbili_db}, minutes=1
     )
+    scheduler.add_job(job_runner.report, "interval", minutes=INTERVAL_JOB_REPORT)
     scheduler.add_job(
-        hololive_main, "interval", kwargs={"DatabaseConn": vtbili_db}, minutes=INTERVAL_BILI_UPCOMING,
+        report_api_usage, "interval", kwargs={"yt_api_key": yt_api_rotate}, minutes=INTERVAL_JOB_REPORT
     )
     scheduler.add_job(
-        nijisanji_main, "interval", kwargs={"DatabaseConn": vtbili_db}, minutes=INTERVAL_BILI_UPCOMING,
+        report_upstream_health, "interval", kwargs={"upstream_conn": upstream_co}, minutes=INTERVAL_JOB_REPORT
     )
-
     others_dataset = os.path.join(BASE_FOLDER_PATH, "dataset", "_bilidata_other.json")
 
-    scheduler.add_job(
-        others_main,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "dataset_path": others_dataset},
+    job_runner.add_job(
+        bili_calendar_main,
+        kwargs={"DatabaseConn": vtbili_db, "UpstreamConn": upstream_co, "dataset_path": others_dataset},
         minutes=INTERVAL_BILI_UPCOMING,
     )
 
     dataset_all = glob.glob(os.path.join(BASE_FOLDER_PATH, "dataset", "_bili*.json"))
 
-    scheduler.add_job(
+    job_runner.add_job(
         update_channels_stats,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "dataset_set": dataset_all},
+        kwargs={"DatabaseConn": vtbili_db, "UpstreamConn": upstream_co, "dataset_set": dataset_all},
         minutes=INTERVAL_BILI_CHANNELS,
+        first_run=not SKIP_CHANNELS_FIRST_RUN,
     )
 
     yt_dataset_path = os.path.join(BASE_FOLDER_PATH, "dataset", "_ytdata_other.json")
     with open(yt_dataset_path, "r", encoding="utf-8") as fp:
-        yt_others_dataset = ujson.load(fp)
-    yt_dataset_affs = {chan["id"]: chan["affiliates"] for chan in yt_others_dataset}
+        yt_others_dataset = [
+            {"id": chan["id"], "name": chan["name"], "group": chan["affiliates"]} for chan in ujson.load(fp)
+        ]
+
+    # Every YouTube channels are checked by the same jobs, each set is stored on its own collections.
+    yt_channel_sets = [
+        {
+            "name": "nijisanji",
+            "source": "nijitube_live",
+            "ended_source": "nijitube_ended_ids",
+            "channels_source": "nijitube_channels",
+            "channels": nijisanji_yt_dataset,
+        },
+        {
+            "name": "others",
+            "source": "yt_other_livedata",
+            "ended_source": "yt_other_ended_ids",
+            "channels_source": "yt_other_channels",
+            "channels": yt_others_dataset,
+        },
+    ]
 
-    scheduler.add_job(
+    job_runner.add_job(
         youtube_channels,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "dataset": yt_others_dataset, "yt_api_key": yt_api_rotate},
+        kwargs={
+            "DatabaseConn": vtbili_db,
+            "UpstreamConn": upstream_co,
+            "channel_sets": yt_channel_sets,
+            "yt_api_key": yt_api_rotate,
+        },
         minutes=INTERVAL_YT_CHANNELS,
+        first_run=not SKIP_CHANNELS_FIRST_RUN,
     )
 
-    scheduler.add_job(
+    job_runner.add_job(
         youtube_video_feeds,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "dataset": yt_others_dataset, "yt_api_key": yt_api_rotate},
-        minutes=INTERVAL_YT_FEED,
-    )
-
-    scheduler.add_job(
-        youtube_live_heartbeat,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "affliates_dataset": yt_dataset_affs, "yt_api_key": yt_api_rotate},
-        minutes=INTERVAL_YT_LIVE,
-    )
-
-    scheduler.add_job(
-        nijitube_video_feeds,
-        "interval",
         kwargs={
-            "DatabaseConn": vtbili_db, "channels_dataset": nijisanji_yt_dataset, "yt_api_key": yt_api_rotate
+            "DatabaseConn": vtbili_db,
+            "UpstreamConn": upstream_co,
+            "channel_sets": yt_channel_sets,
+            "yt_api_key": yt_api_rotate,
+            "feed_poller": YouTubeFeedPoller(INTERVAL_YT_FEED_MIN * 60, INTERVAL_YT_FEED_MAX * 60),
         },
         minutes=INTERVAL_YT_FEED,
     )
-    scheduler.add_job(
-        nijitube_live_heartbeat,
-        "interval",
+
+    job_runner.add_job(
+        youtube_live_heartbeat,
         kwargs={
             "DatabaseConn": vtbili_db,
-            "affliates_dataset": nijisanji_dataset_affs,
-            "yt_api_key": yt_api_rotate
+            "UpstreamConn": upstream_co,
+            "channel_sets": yt_channel_sets,
+            "yt_api_key": yt_api_rotate,
+            "hb_scheduler": HeartbeatScheduler(INTERVAL_YT_LIVE * 60, INTERVAL_YT_UPCOMING_MAX * 60),
         },
         minutes=INTERVAL_YT_LIVE,
     )
 
-    scheduler.add_job(
-        nijitube_channels_data,
-        "interval",
-        kwargs={
-            "DatabaseConn": vtbili_db, "channels_dataset": nijisanji_yt_dataset, "yt_api_key": yt_api_rotate
-        },
-        minutes=INTERVAL_YT_CHANNELS,
-    )
-
     ytbili_file = os.path.join(BASE_FOLDER_PATH, "dataset", "_ytbili_mapping.json")
     with open(ytbili_file, "r", encoding="utf-8") as fp:
         ytbili_mapping = ujson.load(fp)
 
-    scheduler.add_job(
-        holo_heartbeat,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "JetriConn": jetri_co, "room_dataset": ytbili_mapping},
-        minutes=INTERVAL_BILI_LIVE,
-    )
-
-    scheduler.add_job(
-        niji_heartbeat,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "VTNijiConn": vtbili_db, "room_dataset": ytbili_mapping},
+    job_runner.add_job(
+        bili_live_heartbeat,
+        kwargs={
+            "DatabaseConn": vtbili_db,
+            "JetriConn": jetri_co,
+            "UpstreamConn": upstream_co,
+            "room_dataset": ytbili_mapping,
+        },
         minutes=INTERVAL_BILI_LIVE,
     )
 
@@ -287,73 +412,55 @@ if __name__ == "__main__":
     with open(twcast_file, "r", encoding="utf-8") as fp:
         twcast_mapping = ujson.load(fp)
 
-    scheduler.add_job(
+    job_runner.add_job(
         twitcasting_heartbeat,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "twitcast_data": twcast_mapping},
+        kwargs={
+            "DatabaseConn": vtbili_db,
+            "UpstreamConn": upstream_co,
+            "twitcast_data": twcast_mapping,
+            "twcast_poller": TwitcastingPoller(
+                INTERVAL_TWITCASTING_LIVE * 60 * TWITCASTING_SPREAD_RATIO, TWITCASTING_CONCURRENCY
+            ),
+        },
         minutes=INTERVAL_TWITCASTING_LIVE,
     )
 
-    scheduler.add_job(
+    job_runner.add_job(
         twitcasting_channels,
-        "interval",
-        kwargs={"DatabaseConn": vtbili_db, "twitcast_data": twcast_mapping},
+        kwargs={
+            "DatabaseConn": vtbili_db,
+            "UpstreamConn": upstream_co,
+            "twitcast_data": twcast_mapping,
+            "twcast_poller": TwitcastingPoller(TWITCASTING_CHANNELS_SPREAD * 60, TWITCASTING_CONCURRENCY),
+        },
         minutes=INTERVAL_TWITCASTING_CHANNELS,
+        first_run=not SKIP_CHANNELS_FIRST_RUN,
     )
 
     if isinstance(tw_helix, TwitchHelix):
         twch_file = os.path.join(BASE_FOLDER_PATH, "dataset", "_twitchdata_other.json")
         with open(twch_file, "r", encoding="utf-8") as fp:
             twch_mapping = ujson.load(fp)
+        # Resolve live streams by user ID, from the dataset then the last fetched channels data.
+        tw_helix.remember_users({user["user_id"]: user["id"] for user in twch_mapping if user.get("user_id")})
+        twch_channels = loop_de_loop.run_until_complete(vtbili_db.fetch_channels("twitch_channels"))
+        tw_helix.remember_users({channel["user_id"]: channel["id"] for channel in twch_channels})
 
-        scheduler.add_job(
+        job_runner.add_job(
             twitch_heartbeat,
-            "interval",
             kwargs={"DatabaseConn": vtbili_db, "TwitchConn": tw_helix, "twitch_dataset": twch_mapping},
             minutes=INTERVAL_TWITCH_LIVE,
         )
 
-        scheduler.add_job(
+        job_runner.add_job(
             twitch_channels,
-            "interval",
             kwargs={"DatabaseConn": vtbili_db, "TwitchConn": tw_helix, "twitch_dataset": twch_mapping},
             minutes=INTERVAL_TWITCH_CHANNELS,
         )
 
-    jobs_data = [
-        asyncio.ensure_future(hololive_main(vtbili_db)),
-        asyncio.ensure_future(nijisanji_main(vtbili_db)),
-        asyncio.ensure_future(others_main(vtbili_db, others_dataset)),
-        asyncio.ensure_future(youtube_live_heartbeat(vtbili_db, yt_dataset_affs, yt_api_rotate)),
-        asyncio.ensure_future(youtube_video_feeds(vtbili_db, yt_others_dataset, yt_api_rotate)),
-        asyncio.ensure_future(nijitube_video_feeds(vtbili_db, nijisanji_yt_dataset, yt_api_rotate)),
-        asyncio.ensure_future(nijitube_live_heartbeat(vtbili_db, nijisanji_dataset_affs, yt_api_rotate)),
-        asyncio.ensure_future(holo_heartbeat(vtbili_db, jetri_co, ytbili_mapping)),
-        asyncio.ensure_future(niji_heartbeat(vtbili_db, vtbili_db, ytbili_mapping)),
-        asyncio.ensure_future(twitcasting_heartbeat(vtbili_db, twcast_mapping)),
-    ]
-    if not SKIP_CHANNELS_FIRST_RUN:
-        jobs_data.extend(
-            [
-                asyncio.ensure_future(update_channels_stats(vtbili_db, dataset_all)),
-                asyncio.ensure_future(youtube_channels(vtbili_db, yt_others_dataset, yt_api_rotate)),
-                asyncio.ensure_future(nijitube_channels_data(vtbili_db, nijisanji_yt_dataset, yt_api_rotate)),
-                asyncio.ensure_future(twitcasting_channels(vtbili_db, twcast_mapping)),
-            ]
-        )
-    if isinstance(tw_helix, TwitchHelix):
-        jobs_data.extend(
-            [
-                asyncio.ensure_future(twitch_heartbeat(vtbili_db, tw_helix, twch_mapping)),
-                asyncio.ensure_future(twitch_channels(vtbili_db, tw_helix, twch_mapping)),
-            ]
-        )
-        # if SKIP_CHANNELS_FIRST_RUN:
-        #     jobs_data.pop(-1)
-
     if not SKIP_EVERY_FIRST_RUN:
         vtlog.info("Doing first run!")
-        loop_de_loop.run_until_complete(asyncio.gather(*jobs_data))
+        loop_de_loop.run_until_complete(job_runner.first_run())
     vtlog.info("Starting scheduler!")
     scheduler.start()
 
@@ -361,7 +468,7 @@ if __name__ == "__main__":
         loop_de_loop.run_forever()
     except (KeyboardInterrupt, SystemExit):
         vtlog.info("CTRL+C Called, stopping everything...")
-        loop_de_loop.run_until_complete(jetri_co.close())
+        loop_de_loop.run_until_complete(upstream_co.close())
         if isinstance(tw_helix, TwitchHelix):
             loop_de_loop.run_until_complete(tw_helix.close())
         scheduler.shutdown()
@@ -0,0 +1,92 @@
+"""Lock contention benchmark: the old busy-wait DB lock against the per-source semaphores
+
+Runs N concurrent fake operations spread over a few sources and reports
+the total time and the lock wait of each implementation. No MongoDB is
+needed, the Motor client never connects.
+
+    cd server && python -m tests.bench_dblock --ops 50 200
+
+The busy-wait lock polls every second, so it takes about one second per
+operation.
+"""
+import argparse
+import asyncio
+import time
+
+from utils import VTBiliDatabase
+
+SOURCES = ["hololive_data", "nijitube_live", "yt_other_livedata", "twitch_data", "twitcasting_data"]
+
+
+class BusyWaitLock:
+    """The global lock VTBiliDatabase used before the per-source semaphores"""
+
+    def __init__(self):
+        self._locked = False
+        self._is_resetting = False
+
+    async def acquire(self, source: str):
+        while True:
+            if not self._locked and not self._is_resetting:
+                break
+            await asyncio.sleep(1)
+        self._locked = True
+
+    def release(self, source: str):
+        self._locked = False
+
+
+async def run_operations(lock, ops: int, op_time: float) -> dict:
+    waits = []
+
+    async def operation(index: int):
+        source = SOURCES[index % len(SOURCES)]
+        started = time.perf_counter()
+        await lock.acquire(source)
+        waits.append(time.perf_counter() - started)
+        try:
+            await asyncio.sleep(op_time)
+        finally:
+            lock.release(source)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[operation(index) for index in range(ops)])
+    total = time.perf_counter() - started
+    waits.sort()
+    return {
+        "total": total,
+        "wait_avg": sum(waits) / len(waits),
+        "wait_p99": waits[max(0, int(len(waits) * 0.99) - 1)],
+        "wait_max": waits[-1],
+    }
+
+
+async def main(args: argparse.Namespace):
+    def make_database() -> VTBiliDatabase:
+        return VTBiliDatabase("mongodb://127.0.0.1:1", "bench", args.pool, args.per_source)
+
+    locks = [("semaphores", make_database)]
+    if not args.skip_busy_wait:
+        locks.insert(0, ("busy-wait", BusyWaitLock))
+    print(
+        f"{args.op_time * 1000:.0f}ms operations over {len(SOURCES)} sources, "
+        f"pool {args.pool}, {args.per_source} per source"
+    )
+    for ops in args.ops:
+        for name, make_lock in locks:
+            result = await run_operations(make_lock(), ops, args.op_time)
+            print(
+                f"{name:>10} {ops:>4} ops: total {result['total']:.2f}s, "
+                f"wait avg {result['wait_avg'] * 1000:.0f}ms p99 {result['wait_p99'] * 1000:.0f}ms "
+                f"max {result['wait_max'] * 1000:.0f}ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, nargs="+", default=[50, 200], help="Concurrent operations")
+    parser.add_argument("--op-time", type=float, default=0.02, help="Duration of an operation in seconds")
+    parser.add_argument("--pool", type=int, default=100, help="Motor pool size")
+    parser.add_argument("--per-source", type=int, default=25, help="Concurrent operations per source")
+    parser.add_argument("--skip-busy-wait", action="store_true", help="Only run the semaphores")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,50 @@
+"""Memory and false positive rate of SeenIDsFilter against a plain Python set of the IDs
+
+    cd server && python -m tests.bench_seenfilter --capacity 100000 500000
+"""
+import argparse
+import random
+import sys
+import time
+
+from utils import SeenIDsFilter
+
+from .test_seenfilter import random_video_ids
+
+
+def set_memory(video_ids: set) -> int:
+    """Size of the set and of every ID string in it"""
+    return sys.getsizeof(video_ids) + sum(sys.getsizeof(video_id) for video_id in video_ids)
+
+
+def main(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    print(f"Target false positive rate {args.error_rate}, {args.probes} unseen probes")
+    for capacity in args.capacity:
+        video_ids = random_video_ids(rng, capacity + args.probes)
+        seen_ids, probes = video_ids[:capacity], video_ids[capacity:]
+
+        started = time.perf_counter()
+        seen_filter = SeenIDsFilter(capacity, args.error_rate, args.recent)
+        seen_filter.update(seen_ids)
+        build_time = time.perf_counter() - started
+        _, _, maybe_ids = seen_filter.check(probes)
+        stats = seen_filter.stats()
+
+        print(
+            f"{capacity:>8} IDs: bit array {stats['memory'] / 1024:.0f} KB "
+            f"(+ {stats['recent']} recent IDs kept exactly), built in {build_time:.1f}s, "
+            f"false positives {len(maybe_ids) / len(probes) * 100:.3f}% "
+            f"(estimated {stats['estimated_error_rate'] * 100:.3f}%); "
+            f"a set of the IDs takes {set_memory(set(seen_ids)) / 1024 / 1024:.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capacity", type=int, nargs="+", default=[100000, 500000], help="Total seen IDs")
+    parser.add_argument("--error-rate", type=float, default=0.001, help="Target false positive rate")
+    parser.add_argument("--probes", type=int, default=200000, help="Unseen IDs checked")
+    parser.add_argument("--recent", type=int, default=20000, help="Recent IDs kept exactly")
+    parser.add_argument("--seed", type=int, default=20201018)
+    main(parser.parse_args())
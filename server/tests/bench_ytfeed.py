@@ -0,0 +1,40 @@
+"""Feed parsing benchmark: the XMLPullParser feed parser against feedparser
+
+Parses the feed fixtures in full, and up to their second entry like a
+poll that finds a single new video.
+
+    cd server && python -m tests.bench_ytfeed --runs 200
+"""
+import argparse
+import time
+
+from utils.ytfeed import parse_youtube_feed, parse_youtube_feed_fallback
+
+from .test_ytfeed import FEEDS, read_fixture
+
+
+def timed(func, runs: int) -> float:
+    started = time.perf_counter()
+    for _ in range(runs):
+        func()
+    return (time.perf_counter() - started) / runs
+
+
+def main(args: argparse.Namespace):
+    for name in FEEDS:
+        body = read_fixture(name)
+        entries = parse_youtube_feed(body)
+        results = {"pull parser": timed(lambda: parse_youtube_feed(body), args.runs)}
+        if len(entries) > 1:
+            stop_at = entries[1]["id"]
+            results["pull parser, 1 new"] = timed(lambda: parse_youtube_feed(body, stop_at), args.runs)
+        results["feedparser"] = timed(lambda: parse_youtube_feed_fallback(body), args.runs)
+        print(f"{name} ({len(body) / 1024:.1f} KB, {len(entries)} entries)")
+        for parser_name, elapsed in results.items():
+            print(f"  {parser_name:>18}: {elapsed * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200, help="Parses of each feed")
+    main(parser.parse_args())
@@ -0,0 +1,206 @@
+import asyncio
+import time
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+class FlakyUpstream:
+    """A local stand-in upstream, answering with the status and delay it's set to"""
+
+    def __init__(self):
+        self.status = 200
+        self.delay = 0.0
+        self.hits = 0
+        self.app = web.Application()
+        self.app.router.add_get("/api", self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.hits += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return web.json_response({"code": self.status}, status=self.status)
+
+
+class UpstreamBreakerTest(unittest.TestCase):
+    BREAKER = {
+        "window": 60,
+        "min_requests": 4,
+        "error_rate": 0.5,
+        "slow_call": 0.3,
+        "cooldown": 0.2,
+        "max_cooldown": 0.5,
+    }
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.upstream = FlakyUpstream()
+        self.server = TestServer(self.upstream.app)
+        self.loop.run_until_complete(self.server.start_server())
+        self.url = str(self.server.make_url("/api"))
+        self.client = None
+
+    def tearDown(self):
+        if self.client is not None:
+            self.loop.run_until_complete(self.client.close())
+        self.loop.run_until_complete(self.server.close())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def make_client(self, rate_limits: dict = None) -> UpstreamClient:
+        self.client = UpstreamClient(
+            self.loop, timeout=5, breaker_options=self.BREAKER, rate_limits=rate_limits
+        )
+        return self.client
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    async def trip(self, client: UpstreamClient):
+        self.upstream.status = 500
+        for _ in range(self.BREAKER["min_requests"]):
+            res = await client.get(self.url)
+            self.assertEqual(res.status, 500)
+
+    def test_opens_after_error_rate(self):
+        client = self.make_client()
+
+        async def scenario():
+            self.upstream.status = 500
+            for _ in range(self.BREAKER["min_requests"] - 1):
+                await client.get(self.url)
+            # Not enough requests on the window yet.
+            self.assertEqual(client.breaker(self.url).state, CircuitBreaker.CLOSED)
+            await client.get(self.url)
+            self.assertEqual(client.breaker(self.url).state, CircuitBreaker.OPEN)
+            self.assertFalse(client.is_available(self.url))
+
+        self.run_async(scenario())
+        self.assertEqual(self.upstream.hits, self.BREAKER["min_requests"])
+
+    def test_stays_closed_under_error_rate(self):
+        client = self.make_client()
+
+        async def scenario():
+            for status in (500, 200, 200, 200, 500, 200):
+                self.upstream.status = status
+                await client.get(self.url)
+
+        self.run_async(scenario())
+        self.assertEqual(client.breaker(self.url).state, CircuitBreaker.CLOSED)
+
+    def test_slow_calls_count_as_failures(self):
+        client = self.make_client()
+        self.upstream.delay = self.BREAKER["slow_call"] + 0.05
+
+        async def scenario():
+            await asyncio.gather(*[client.get(self.url) for _ in range(self.BREAKER["min_requests"])])
+
+        self.run_async(scenario())
+        self.assertEqual(client.breaker(self.url).state, CircuitBreaker.OPEN)
+
+    def test_open_circuit_refuses_requests(self):
+        client = self.make_client()
+
+        async def scenario():
+            await self.trip(client)
+            hits = self.upstream.hits
+            with self.assertRaises(CircuitOpenError) as refused:
+                await client.get(self.url)
+            # Still a client error, so the jobs handling request errors handle it too.
+            self.assertIsInstance(refused.exception, aiohttp.ClientError)
+            self.assertEqual(refused.exception.host, "127.0.0.1")
+            self.assertGreater(refused.exception.retry_after, 0)
+            self.assertEqual(self.upstream.hits, hits)
+
+        self.run_async(scenario())
+        stats = client.breaker_stats()["127.0.0.1"]
+        self.assertEqual(stats["refused"], 1)
+        self.assertEqual(stats["opened"], 1)
+        self.assertEqual(stats["state"], CircuitBreaker.OPEN)
+
+    def test_half_open_lets_a_single_probe_through(self):
+        client = self.make_client()
+
+        async def scenario():
+            await self.trip(client)
+            await asyncio.sleep(self.BREAKER["cooldown"] + 0.05)
+            self.upstream.status = 200
+            self.upstream.delay = 0.1
+            hits = self.upstream.hits
+            results = await asyncio.gather(*[client.get(self.url) for _ in range(3)], return_exceptions=True)
+            self.assertEqual(self.upstream.hits, hits + 1)
+            self.assertEqual(sum(isinstance(res, CircuitOpenError) for res in results), 2)
+            # The probe succeeded, every request goes through again.
+            self.assertEqual(client.breaker(self.url).state, CircuitBreaker.CLOSED)
+            res = await client.get(self.url)
+            self.assertEqual(res.status, 200)
+
+        self.run_async(scenario())
+
+    def test_failed_probe_doubles_cooldown(self):
+        client = self.make_client()
+
+        async def scenario():
+            await self.trip(client)
+            breaker = client.breaker(self.url)
+            cooldowns = []
+            for _ in range(3):
+                await asyncio.sleep(breaker.retry_after + 0.05)
+                res = await client.get(self.url)
+                self.assertEqual(res.status, 500)
+                self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+                cooldowns.append(breaker.retry_after)
+            return cooldowns
+
+        cooldowns = self.run_async(scenario())
+        # 0.2s doubled to 0.4s, then capped to the 0.5s max cooldown.
+        self.assertAlmostEqual(cooldowns[0], 0.4, delta=0.05)
+        self.assertAlmostEqual(cooldowns[1], 0.5, delta=0.05)
+        self.assertAlmostEqual(cooldowns[2], 0.5, delta=0.05)
+
+    def test_recovered_probe_resets_cooldown(self):
+        client = self.make_client()
+
+        async def scenario():
+            await self.trip(client)
+            breaker = client.breaker(self.url)
+            await asyncio.sleep(breaker.retry_after + 0.05)
+            await client.get(self.url)
+            await asyncio.sleep(breaker.retry_after + 0.05)
+            self.upstream.status = 200
+            await client.get(self.url)
+            self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+            await self.trip(client)
+            return breaker.retry_after
+
+        self.assertAlmostEqual(self.run_async(scenario()), self.BREAKER["cooldown"], delta=0.05)
+
+    def test_rate_limit_wait_is_not_breaker_latency(self):
+        # 5 requests at 4 per second with no burst: the last one waits a second for its token,
+        # over three times the slow call threshold.
+        client = self.make_client(rate_limits={"127.0.0.1": {"rate": 4, "burst": 1}})
+
+        async def scenario():
+            started = time.monotonic()
+            responses = await asyncio.gather(*[client.get(self.url) for _ in range(5)])
+            return responses, time.monotonic() - started
+
+        responses, total = self.run_async(scenario())
+        self.assertGreaterEqual(total, 0.9)
+        for res in responses:
+            self.assertLess(res.elapsed, self.BREAKER["slow_call"])
+        stats = client.breaker_stats()["127.0.0.1"]
+        self.assertEqual(stats["failed"], 0)
+        self.assertEqual(stats["state"], CircuitBreaker.CLOSED)
+        self.assertLess(stats["latency_avg"], self.BREAKER["slow_call"])
+        self.assertEqual(client.rate_limit_stats()["127.0.0.1"]["waited"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
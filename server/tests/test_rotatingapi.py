@@ -0,0 +1,43 @@
+import unittest
+
+from utils import RotatingAPIKey
+
+
+def api_error(reason: str) -> dict:
+    return {"error": {"errors": [{"reason": reason}]}}
+
+
+class RotatingAPIKeyReportTest(unittest.TestCase):
+    def setUp(self):
+        self.keys = RotatingAPIKey(["key1aaaaaa", "key2bbbbbb"])
+
+    def test_request_errors_keep_the_key(self):
+        for status, reason in ((400, "badRequest"), (400, "invalidParameter"), (404, "videoNotFound")):
+            api_key = self.keys.get()
+            self.assertFalse(self.keys.report(api_key, status, api_error(reason)))
+        usages = self.keys.usage().values()
+        self.assertTrue(all(usage["quarantined_until"] is None for usage in usages))
+        self.assertEqual(sum(usage["errors"] for usage in usages), 3)
+
+    def test_key_and_quota_errors_quarantine_until_reset(self):
+        for status, reason in ((403, "quotaExceeded"), (400, "keyInvalid")):
+            api_key = self.keys.get()
+            self.assertTrue(self.keys.report(api_key, status, api_error(reason)))
+        self.assertFalse(self.keys.has_available_key)
+        reasons = {usage["reason"] for usage in self.keys.usage().values()}
+        self.assertEqual(reasons, {"quotaExceeded", "keyInvalid"})
+
+    def test_rate_limit_quarantines_for_a_while(self):
+        api_key = self.keys.get()
+        self.assertTrue(self.keys.report(api_key, 403, api_error("rateLimitExceeded")))
+        self.assertTrue(self.keys.has_available_key)
+        self.assertNotEqual(self.keys.get(), api_key)
+
+    def test_success_is_not_an_error(self):
+        api_key = self.keys.get()
+        self.assertFalse(self.keys.report(api_key, 200, {"items": []}))
+        self.assertEqual(self.keys.usage()[RotatingAPIKey._mask(api_key)]["errors"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import math
+import random
+import string
+import unittest
+
+from utils import SeenIDsFilter
+from utils.seenfilter import BloomFilter
+
+# Same as SEEN_FILTER_CAPACITY and SEEN_FILTER_ERROR_RATE in main.py
+CAPACITY = 500000
+ERROR_RATE = 0.001
+PROBES = 200000
+VIDEO_ID_CHARS = string.ascii_letters + string.digits + "-_"
+
+
+def random_video_ids(rng: random.Random, count: int) -> list:
+    return ["".join(rng.choices(VIDEO_ID_CHARS, k=11)) for _ in range(count)]
+
+
+class SeenIDsFilterTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = random.Random(20201018)
+        video_ids = random_video_ids(rng, CAPACITY + PROBES)
+        cls.seen_ids = video_ids[:CAPACITY]
+        cls.unseen_ids = set(video_ids[CAPACITY:]) - set(cls.seen_ids)
+        cls.seen_filter = SeenIDsFilter(CAPACITY, ERROR_RATE)
+        cls.seen_filter.update(cls.seen_ids)
+
+    def test_false_positive_rate_under_target_at_capacity(self):
+        self.assertLessEqual(BloomFilter(CAPACITY, ERROR_RATE).estimated_error_rate, ERROR_RATE)
+        stats = self.seen_filter.stats()
+        self.assertEqual(stats["count"], CAPACITY)
+        self.assertLessEqual(stats["estimated_error_rate"], ERROR_RATE * 1.01)
+
+        new_ids, seen_ids, maybe_ids = self.seen_filter.check(self.unseen_ids)
+        self.assertFalse(seen_ids)
+        measured = len(maybe_ids) / len(self.unseen_ids)
+        # Allow for the sampling error of the probes, three standard deviations.
+        margin = 3 * math.sqrt(ERROR_RATE * (1 - ERROR_RATE) / len(self.unseen_ids))
+        self.assertLessEqual(measured, ERROR_RATE + margin)
+
+    def test_no_false_negatives(self):
+        new_ids, seen_ids, maybe_ids = self.seen_filter.check(self.seen_ids[::50] + self.seen_ids[-10:])
+        self.assertFalse(new_ids)
+        # The most recent IDs are answered exactly.
+        self.assertTrue(set(self.seen_ids[-10:]) <= seen_ids)
+
+    def test_memory_stays_small(self):
+        # About 1.44 * log2(1 / error rate) bits per ID, under 1 MB here.
+        self.assertLess(self.seen_filter.stats()["memory"], 1024 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import unittest
+from xml.etree import ElementTree
+
+from utils import YouTubeFeedPoller
+from utils.ytfeed import parse_youtube_feed, parse_youtube_feed_fallback
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FEEDS = ("ytfeed_active.xml", "ytfeed_sparse.xml", "ytfeed_empty.xml")
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), "r", encoding="utf-8") as fp:
+        return fp.read()
+
+
+class ParseYouTubeFeedTest(unittest.TestCase):
+    def test_matches_feedparser(self):
+        for name in FEEDS:
+            with self.subTest(feed=name):
+                body = read_fixture(name)
+                self.assertEqual(parse_youtube_feed(body), parse_youtube_feed_fallback(body))
+
+    def test_entries_newest_first(self):
+        entries = parse_youtube_feed(read_fixture("ytfeed_active.xml"))
+        self.assertEqual(len(entries), 15)
+        published = [entry["published"] for entry in entries]
+        self.assertEqual(published, sorted(published, reverse=True))
+        self.assertTrue(all(entry["updated"] >= entry["published"] for entry in entries))
+
+    def test_stops_at_known_video(self):
+        body = read_fixture("ytfeed_active.xml")
+        entries = parse_youtube_feed_fallback(body)
+        self.assertEqual(parse_youtube_feed(body, stop_at=entries[3]["id"]), entries[:3])
+        self.assertEqual(parse_youtube_feed(body, stop_at=entries[0]["id"]), [])
+
+    def test_truncated_feed_falls_back_to_feedparser(self):
+        body = read_fixture("ytfeed_active.xml")
+        truncated = body[: len(body) // 2]
+        with self.assertRaises(ElementTree.ParseError):
+            parse_youtube_feed(truncated)
+        poller = YouTubeFeedPoller()
+        entries = poller._parse("UC1DCedRgGHBdm81E1llLhOQ", truncated, [])
+        self.assertTrue(entries)
+        self.assertEqual(entries, parse_youtube_feed(body)[: len(entries)])
+        self.assertEqual(poller.run_stats()["fallback"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
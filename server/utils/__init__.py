@@ -2,10 +2,18 @@
 
 from datetime import datetime, timezone
 
+from .breaker import CircuitBreaker, CircuitOpenError
+from .heartbeat import HeartbeatScheduler
 from .jetri import Jetri
 from .mongoconn import VTBiliDatabase
+from .ratelimit import TokenBucket
+from .retry import RetryPolicy, job_deadline
 from .rotatingapi import RotatingAPIKey
+from .seenfilter import BloomFilter, SeenIDsFilter
+from .twitcast import TwitcastingPoller
 from .twitchapi import TwitchHelix
+from .upstream import UpstreamClient, UpstreamResponse
+from .ytfeed import YouTubeFeedPoller
 
 
 def datetime_yt_parse(yt_time):
@@ -0,0 +1,191 @@
+import collections
+import logging
+import time
+from typing import Deque, Tuple
+
+import aiohttp
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """The upstream host circuit is open, the request was not sent"""
+
+    def __init__(self, host: str, retry_after: float):
+        self.host = host
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {host}, retrying in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """Track the health of an upstream host and stop calling it while it's down
+
+    Every request outcome is kept on a rolling window, a request is a
+    failure if it errored, timed out, got a 5xx/429 status or was slower
+    than the slow call threshold. Once the window has enough requests and
+    the failure rate is over the threshold the circuit opens:
+
+    - open: every request is refused until the cooldown is over;
+    - half-open: a few probe requests are let through, the circuit closes
+      once they all succeed, and opens again with a doubled cooldown if
+      one of them fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 60,
+        min_requests: int = 10,
+        error_rate: float = 0.5,
+        slow_call: float = 10.0,
+        cooldown: float = 30,
+        max_cooldown: float = 5 * 60,
+        probes: int = 1,
+    ):
+        """Initialize the breaker
+
+        :param name: The upstream host, used for logging
+        :type name: str
+        :param window: Rolling window of request outcomes in seconds, defaults to 60
+        :type window: float, optional
+        :param min_requests: Requests needed on the window before opening, defaults to 10
+        :type min_requests: int, optional
+        :param error_rate: Failure rate that opens the circuit, defaults to 0.5
+        :type error_rate: float, optional
+        :param slow_call: Requests slower than this (in seconds) count as failures, defaults to 10
+        :type slow_call: float, optional
+        :param cooldown: Time the circuit stays open in seconds, defaults to 30
+        :type cooldown: float, optional
+        :param max_cooldown: Longest cooldown after failed probes in seconds, defaults to 5 minutes
+        :type max_cooldown: float, optional
+        :param probes: Successful probes needed to close the circuit, defaults to 1
+        :type probes: int, optional
+        """
+        self.logger = logging.getLogger("utils.breaker.CircuitBreaker")
+        self.name = name
+        self._window = window
+        self._min_requests = min_requests
+        self._error_rate = error_rate
+        self._slow_call = slow_call
+        self._base_cooldown = cooldown
+        self._max_cooldown = max(cooldown, max_cooldown)
+        self._probes = max(1, probes)
+        # (finished at, failed, latency)
+        self._outcomes: Deque[Tuple[float, bool, float]] = collections.deque()
+        self._state = self.CLOSED
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._probes_in_flight = 0
+        self._probes_passed = 0
+        self._stats = collections.Counter()
+
+    @staticmethod
+    def _now() -> float:
+        return time.monotonic()
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._now() >= self._open_until:
+            self.logger.info(f"Circuit for {self.name} is half-open, probing...")
+            self._state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probes_passed = 0
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        return max(0.0, self._open_until - self._now())
+
+    def is_available(self) -> bool:
+        """Check if requests could go through, without taking a probe slot"""
+        return self.state != self.OPEN
+
+    def allow(self) -> bool:
+        """Check if a request can be sent now, taking a probe slot when half-open
+
+        Every allowed request must be followed by `record()` or `release()`.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._probes_in_flight + self._probes_passed < self._probes:
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def refuse(self) -> CircuitOpenError:
+        """Count a request refused by the circuit and return the error to raise"""
+        self._stats["refused"] += 1
+        return CircuitOpenError(self.name, self.retry_after)
+
+    def release(self):
+        """Give back an allowed request that never finished (cancelled)"""
+        if self._state == self.HALF_OPEN and self._probes_in_flight:
+            self._probes_in_flight -= 1
+
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self._window:
+            self._outcomes.popleft()
+
+    def _open(self, now: float):
+        self._state = self.OPEN
+        self._open_until = now + self._cooldown
+        self._stats["opened"] += 1
+        self.logger.warning(f"Circuit for {self.name} opened for {self._cooldown:.0f}s")
+
+    def record(self, success: bool, latency: float):
+        """Record the outcome of an allowed request
+
+        :param success: The request got a response that isn't a server error
+        :type success: bool
+        :param latency: Request duration in seconds
+        :type latency: float
+        """
+        now = self._now()
+        failed = not success or latency >= self._slow_call
+        self._stats["failed" if failed else "success"] += 1
+        if self._state == self.HALF_OPEN:
+            if self._probes_in_flight:
+                self._probes_in_flight -= 1
+            if failed:
+                self._cooldown = min(self._cooldown * 2, self._max_cooldown)
+                self._open(now)
+                return
+            self._probes_passed += 1
+            if self._probes_passed >= self._probes:
+                self.logger.info(f"Circuit for {self.name} closed.")
+                self._state = self.CLOSED
+                self._cooldown = self._base_cooldown
+                self._outcomes.clear()
+            return
+        if self._state == self.OPEN:
+            # Sent before the circuit opened.
+            return
+        self._outcomes.append((now, failed, latency))
+        self._prune(now)
+        total = len(self._outcomes)
+        if total < self._min_requests:
+            return
+        failures = sum(1 for _, outcome_failed, _ in self._outcomes if outcome_failed)
+        if failures / total >= self._error_rate:
+            self._outcomes.clear()
+            self._open(now)
+
+    def stats(self, reset: bool = True) -> dict:
+        """Return the breaker state and counts since the last reset
+
+        state: current state, success/failed: recorded outcomes, refused:
+        requests refused while open, opened: times the circuit opened,
+        error_rate/latency_avg: over the rolling window.
+        """
+        self._prune(self._now())
+        stats = {key: self._stats[key] for key in ("success", "failed", "refused", "opened")}
+        stats["state"] = self.state
+        total = len(self._outcomes)
+        stats["error_rate"] = sum(1 for _, failed, _ in self._outcomes if failed) / total if total else 0.0
+        stats["latency_avg"] = sum(latency for _, _, latency in self._outcomes) / total if total else 0.0
+        if reset:
+            self._stats.clear()
+        return stats
@@ -0,0 +1,154 @@
+import heapq
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+
+class HeartbeatScheduler:
+    """Decide which tracked streams need a heartbeat check on this run
+
+    Streams are kept on a priority queue keyed by their next check time,
+    which is derived from the stream `startTime`:
+
+    - live streams are checked at the live interval (every run);
+    - upcoming streams scheduled far ahead are checked rarely, and more
+      often as their start approaches, down to the live interval once
+      inside the ramp window or overdue;
+    - ended streams get a single final check once they are past the
+      retention time, which is when the heartbeat removes them.
+
+    Heap entries are never removed, a rescheduled stream simply pushes a
+    new entry and the old one get ignored when popped.
+    """
+
+    # Streams are checked once per job run, don't skip a run because of a few seconds drift.
+    CHECK_TOLERANCE = 15
+
+    def __init__(
+        self,
+        live_interval: int = 60,
+        max_interval: int = 60 * 60,
+        ramp_window: int = 15 * 60,
+        start_ratio: int = 6,
+        past_retention: int = 6 * 60 * 60,
+    ):
+        """Initialize the scheduler
+
+        :param live_interval: Check interval of live and starting streams in seconds, defaults to 60
+        :type live_interval: int, optional
+        :param max_interval: Longest interval between checks of upcoming streams in seconds,
+                             defaults to 1 hour
+        :type max_interval: int, optional
+        :param ramp_window: Upcoming streams starting in this window (in seconds) are checked at
+                            the live interval, defaults to 15 minutes
+        :type ramp_window: int, optional
+        :param start_ratio: Time left before start is divided by this to get the interval, defaults to 6
+        :type start_ratio: int, optional
+        :param past_retention: How long (in seconds) ended streams are kept, defaults to 6 hours
+        :type past_retention: int, optional
+        """
+        self._live_interval = live_interval
+        self._max_interval = max(live_interval, max_interval)
+        self._ramp_window = ramp_window
+        self._start_ratio = start_ratio
+        self._past_retention = past_retention
+        self._heap: List[tuple] = []
+        self._next_check: Dict[str, float] = {}
+        self._synced = False
+
+    @staticmethod
+    def _now() -> float:
+        return datetime.now(tz=timezone.utc).timestamp()
+
+    def next_interval(self, stream: dict, now: float) -> int:
+        """Compute the time until the next check of a stream
+
+        :param stream: The stream data, with status, startTime and endTime
+        :type stream: dict
+        :param now: Current UTC timestamp
+        :type now: float
+        :return: Interval in seconds
+        :rtype: int
+        """
+        status = stream.get("status")
+        if status == "live":
+            return self._live_interval
+        if status == "past":
+            end_time = stream.get("endTime") or now
+            return int(max(self._live_interval, end_time + self._past_retention - now))
+        start_time = stream.get("startTime")
+        if not start_time:
+            return self._live_interval
+        time_left = start_time - now
+        if time_left <= self._ramp_window:
+            return self._live_interval
+        # Never sleep past the start of the ramp window.
+        interval = min(time_left / self._start_ratio, time_left - self._ramp_window, self._max_interval)
+        return int(max(self._live_interval, interval))
+
+    def schedule(self, video_id: str, stream: dict, now: Optional[float] = None):
+        """Schedule the next check of a stream from its latest data"""
+        if now is None:
+            now = self._now()
+        check_at = now + self.next_interval(stream, now)
+        self._next_check[video_id] = check_at
+        heapq.heappush(self._heap, (check_at, video_id))
+
+    def discard(self, video_id: str):
+        """Stop tracking a stream, its heap entry get ignored"""
+        self._next_check.pop(video_id, None)
+
+    def sync(self, streams: Dict[str, dict], now: Optional[float] = None):
+        """Track the streams from the database and forget the removed ones
+
+        On the first sync every streams are due immediately since they
+        might have changed while we were not running, afterward new
+        streams (added by the feeds job) are scheduled from their data.
+
+        :param streams: A dict of video ID to stream data
+        :type streams: Dict[str, dict]
+        """
+        if now is None:
+            now = self._now()
+        for video_id in list(self._next_check):
+            if video_id not in streams:
+                self.discard(video_id)
+        for video_id, stream in streams.items():
+            if video_id in self._next_check:
+                continue
+            if self._synced:
+                self.schedule(video_id, stream, now)
+            else:
+                self._next_check[video_id] = now
+                heapq.heappush(self._heap, (now, video_id))
+        self._synced = True
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Pop every streams that need to be checked now
+
+        Each returned stream is tentatively rescheduled at the live
+        interval, so a failed check is retried on the next run. Call
+        `schedule()` with the fresh data to replace it.
+
+        :return: The video IDs to check, most overdue first
+        :rtype: List[str]
+        """
+        if now is None:
+            now = self._now()
+        limit = now + self.CHECK_TOLERANCE
+        video_ids = []
+        while self._heap and self._heap[0][0] <= limit:
+            check_at, video_id = heapq.heappop(self._heap)
+            if self._next_check.get(video_id) != check_at:
+                # Stale entry, the stream got rescheduled or discarded.
+                continue
+            # Invalidate any duplicate entry with the same check time.
+            self._next_check[video_id] = None
+            video_ids.append(video_id)
+        retry_at = now + self._live_interval
+        for video_id in video_ids:
+            self._next_check[video_id] = retry_at
+            heapq.heappush(self._heap, (retry_at, video_id))
+        return video_ids
+
+    def __len__(self) -> int:
+        return len(self._next_check)
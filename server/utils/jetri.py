@@ -1,23 +1,21 @@
-import asyncio
 from datetime import datetime, timezone
 
 import aiohttp
 
+from .upstream import UpstreamClient
+
 
 class Jetri:
-    """Jetri Connection Helper"""
+    """Jetri Connection Helper
 
-    BASE_API = "https://api.holotools.app/"
+    Requests go through the shared upstream client, so holotools get the
+    same connection pool and circuit breaker as every other hosts.
+    """
 
-    def __init__(self, loop=None):
-        if not loop:
-            loop = asyncio.get_event_loop()
-        self._sess = aiohttp.ClientSession(headers={"User-Agent": "VTBSchedule/0.9.0"}, loop=loop)
+    BASE_API = "https://api.holotools.app/"
 
-    async def close(self):
-        """Close sessions"""
-        if not self._sess.closed:
-            await self._sess.close()
+    def __init__(self, upstream: UpstreamClient):
+        self._upstream = upstream
 
     def __filter_upcoming(self, upcoming_data):
         """Filter upcoming data from Jetri"""
@@ -73,9 +71,10 @@ class Jetri:
 
     async def _request_jet(self, endpoint):
         url = self.BASE_API + endpoint
-        async with self._sess.get(url) as resp:
-            results = await resp.json()
-        return results
+        res = await self._upstream.get(url)
+        if not res.ok or res.data is None:
+            raise aiohttp.ClientError(f"Failed to fetch {url}, got status {res.status}")
+        return res.data
 
     async def fetch_lives(self):
         live_data = await self._request_jet("v1/live")
@@ -1,5 +1,8 @@
 import asyncio
 import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
 
 from motor.motor_asyncio import (
     AsyncIOMotorClient,
@@ -7,81 +10,476 @@ from motor.motor_asyncio import (
     AsyncIOMotorCursor,
     AsyncIOMotorDatabase,
 )
+from pymongo import ASCENDING, ReplaceOne, UpdateOne
+from pymongo.errors import OperationFailure
+
+from .seenfilter import SeenIDsFilter
 
 
 class VTBiliDatabase:
-    def __init__(self, mongodb_url: str, mongodb_dbname: str = "vtbili"):
+    # Per-document storage, every stream and channel is its own document
+    # keyed by "<source>:<id>", where source is the old single-document
+    # collection name (hololive_data, nijitube_live, ...).
+    STREAMS_COLL = "streams_data"
+    CHANNELS_COLL = "channels_data"
+    # Video IDs that should never be fetched again, expired with a TTL index.
+    ENDED_IDS_COLL = "ended_ids"
+    ENDED_IDS_TTL_INDEX = "endedAt_ttl"
+    # Restreams that should not be listed, expired a while after they were last seen live.
+    IGNORED_COLL = "ignored_streams"
+    IGNORED_TTL_INDEX = "lastSeen_ttl"
+
+    def __init__(
+        self,
+        mongodb_url: str,
+        mongodb_dbname: str = "vtbili",
+        max_pool_size: int = 100,
+        source_concurrency: Optional[int] = None,
+    ):
+        """Initialize the database helper
+
+        Every operation is bounded twice: once by a per-source semaphore
+        so a single busy source can't hog the pool, and once by a global
+        semaphore sized to the Motor connection pool so we never queue more
+        operations than there are sockets to run them. Sources share the
+        same few collections, so the limit is per source (hololive_data,
+        nijitube_live, ...) and not per MongoDB collection.
+
+        :param mongodb_url: MongoDB connection URL
+        :type mongodb_url: str
+        :param mongodb_dbname: Database name, defaults to "vtbili"
+        :type mongodb_dbname: str, optional
+        :param max_pool_size: Motor connection pool size, defaults to 100
+        :type max_pool_size: int, optional
+        :param source_concurrency: Maximum concurrent operations per source,
+                                   defaults to a quarter of the pool size
+        :type source_concurrency: int, optional
+        """
         self.logger = logging.getLogger("utils.mongoconn.VTBiliDatabase")
         self._mongo_url = mongodb_url
         self._mongo_db_name = mongodb_dbname
+        self._max_pool_size = max(1, max_pool_size)
+        if source_concurrency is None:
+            source_concurrency = self._max_pool_size // 4
+        self._source_concurrency = min(max(1, source_concurrency), self._max_pool_size)
         self.logger.info("Connecting to database...")
-        self._dbclient: AsyncIOMotorClient = AsyncIOMotorClient(self._mongo_url)
+        self._dbclient: AsyncIOMotorClient = AsyncIOMotorClient(
+            self._mongo_url, maxPoolSize=self._max_pool_size
+        )
         self._vtdb: AsyncIOMotorDatabase = self._dbclient[self._mongo_db_name]
-        self._locked = False
+        # Created lazily so they're bound to the running loop.
+        self._pool_sema: Optional[asyncio.Semaphore] = None
+        self._source_sema: Dict[str, asyncio.Semaphore] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._wait_stats: Dict[str, dict] = {}
+        self._seen_filters: Dict[str, SeenIDsFilter] = {}
+        # Source -> ignored ID -> last time it was written, in UTC timestamp.
+        self._ignored_ids: Dict[str, Dict[str, float]] = {}
+        self._ignored_ttl = 6 * 60 * 60
         self._is_resetting = False
         self._error_rate = 0
         self.logger.info("Connected!")
 
+    def _get_ready_event(self) -> asyncio.Event:
+        if self._ready is None:
+            self._ready = asyncio.Event()
+            self._ready.set()
+        return self._ready
+
+    def _get_semaphore(self, source: str) -> asyncio.Semaphore:
+        if self._pool_sema is None:
+            self._pool_sema = asyncio.Semaphore(self._max_pool_size)
+        if source not in self._source_sema:
+            self._source_sema[source] = asyncio.Semaphore(self._source_concurrency)
+        return self._source_sema[source]
+
     async def reset_connection(self):
         self._is_resetting = True
+        ready = self._get_ready_event()
+        ready.clear()
         self.logger.warning("Resetting client connection...")
         self._dbclient.close()
         self.logger.info("Reconnecting to database...")
-        self._dbclient: AsyncIOMotorClient = AsyncIOMotorClient(self._mongo_url)
+        self._dbclient: AsyncIOMotorClient = AsyncIOMotorClient(
+            self._mongo_url, maxPoolSize=self._max_pool_size
+        )
         self._vtdb: AsyncIOMotorDatabase = self._dbclient[self._mongo_db_name]
         self.logger.info("Reconnected!")
         self._error_rate = 0
         self._is_resetting = False
+        ready.set()
 
     def raise_error(self):
         self._error_rate += 1
 
     @property
-    def is_locked(self) -> bool:
-        return self._locked
-
-    async def acquire(self):
-        while True:
-            if not self._locked and not self._is_resetting:
-                break
-            await asyncio.sleep(1)
-        self._locked = True
-        self.logger.debug("\tLock acquired.")
-
-    async def release(self):
-        self._locked = False
-        self.logger.debug("\tLock released.")
-
-    async def insert_new(self, coll_key: str, data: dict) -> bool:
+    def is_resetting(self) -> bool:
+        return self._is_resetting
+
+    def _record_wait(self, source: str, waited: float):
+        stats = self._wait_stats.setdefault(source, {"count": 0, "total": 0.0, "max": 0.0})
+        stats["count"] += 1
+        stats["total"] += waited
+        if waited > stats["max"]:
+            stats["max"] = waited
+
+    def lock_wait_stats(self, reset: bool = False) -> Dict[str, dict]:
+        """Return the lock wait time collected per source
+
+        :param reset: Clear the collected stats after returning them, defaults to False
+        :type reset: bool, optional
+        :return: A dict of source to count, total, average and max wait in seconds
+        :rtype: Dict[str, dict]
+        """
+        results = {}
+        for source, stats in self._wait_stats.items():
+            results[source] = {
+                "count": stats["count"],
+                "total": stats["total"],
+                "average": stats["total"] / stats["count"] if stats["count"] else 0.0,
+                "max": stats["max"],
+            }
+        if reset:
+            self._wait_stats = {}
+        return results
+
+    async def acquire(self, source: str):
+        """Acquire a slot for the source, waiters are woken up
+        as soon as a slot is released instead of polling for it."""
+        started = time.perf_counter()
+        await self._get_ready_event().wait()
+        source_sema = self._get_semaphore(source)
+        await source_sema.acquire()
+        try:
+            await self._pool_sema.acquire()
+        except BaseException:
+            source_sema.release()
+            raise
+        self._record_wait(source, time.perf_counter() - started)
+        self.logger.debug(f"\tLock acquired ({source}).")
+
+    def release(self, source: str):
+        self._pool_sema.release()
+        self._source_sema[source].release()
+        self.logger.debug(f"\tLock released ({source}).")
+
+    @staticmethod
+    def _as_document(source: str, data: dict, extras: Optional[dict] = None) -> dict:
+        document = dict(data)
+        if extras:
+            document.update(extras)
+        document["source"] = source
+        document["_id"] = f"{source}:{data['id']}"
+        return document
+
+    async def _find_documents(
+        self, coll_key: str, source: str, match: Optional[dict] = None, sort: Optional[str] = None
+    ) -> List[dict]:
         coll: AsyncIOMotorCollection = self._vtdb[coll_key]
-        self.logger.info(f"\tCreating new data for: {coll_key}")
-        await self.acquire()
-        result = await coll.insert_one(data)
-        await self.release()
-        if result.acknowledged:
-            self.logger.info(f"\tInserted with IDs: {result.inserted_id}")
-            return True
-        self.logger.error("\tFailed to insert new data.")
-        return False
+        query = {"source": source}
+        if match:
+            query.update(match)
+        sort_by = [(sort, ASCENDING)] if sort else None
+        cur: AsyncIOMotorCursor = coll.find(query, {"_id": 0, "source": 0}, sort=sort_by)
+        await self.acquire(source)
+        try:
+            data = await cur.to_list(length=None)
+        finally:
+            self.release(source)
+        return data
 
-    async def update_data(self, coll_key: str, data: dict) -> bool:
-        upd = {"$set": data}
+    async def _write_documents(
+        self,
+        coll_key: str,
+        source: str,
+        data: List[dict],
+        match: Optional[dict] = None,
+        replace_all: bool = False,
+    ) -> bool:
         coll: AsyncIOMotorCollection = self._vtdb[coll_key]
-        self.logger.info(f"\tSending data to: {coll_key}")
-        await self.acquire()
-        res = await coll.update_one({}, upd)
-        await self.release()
+        documents = [self._as_document(source, item, match) for item in data]
+        requests = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents]
+        self.logger.info(f"\tSending {len(requests)} documents to: {source}")
+        await self.acquire(source)
+        try:
+            if requests:
+                res = await coll.bulk_write(requests, ordered=False)
+                if not res.acknowledged:
+                    self.logger.error("\tFailed to update database...")
+                    return False
+            if replace_all:
+                query = {"source": source, "_id": {"$nin": [doc["_id"] for doc in documents]}}
+                if match:
+                    query.update(match)
+                res = await coll.delete_many(query)
+                if res.deleted_count:
+                    self.logger.info(f"\tRemoved {res.deleted_count} stale documents.")
+        finally:
+            self.release(source)
+        self.logger.info("\tUpdated!")
+        return True
+
+    async def fetch_streams(self, source: str, match: Optional[dict] = None) -> List[dict]:
+        """Fetch streams of a source, sorted by their start time
+
+        :param source: The stream source (hololive_data, nijitube_live, ...)
+        :type source: str
+        :param match: Extra filter (status, channel, ...), defaults to None
+        :type match: Optional[dict], optional
+        :return: List of streams
+        :rtype: List[dict]
+        """
+        return await self._find_documents(self.STREAMS_COLL, source, match, "startTime")
+
+    async def fetch_streams_by_channel(self, source: str) -> Dict[str, List[dict]]:
+        """Fetch streams of a source grouped by the channel ID"""
+        grouped_streams: Dict[str, List[dict]] = {}
+        for stream in await self.fetch_streams(source):
+            grouped_streams.setdefault(stream["channel"], []).append(stream)
+        return grouped_streams
+
+    async def upsert_streams(self, source: str, streams: List[dict], match: Optional[dict] = None) -> bool:
+        """Insert or replace the provided streams, leaving the rest untouched."""
+        return await self._write_documents(self.STREAMS_COLL, source, streams, match)
+
+    async def replace_streams(self, source: str, streams: List[dict], match: Optional[dict] = None) -> bool:
+        """Make the provided streams the only streams of a source
+
+        Every stream on the source (narrowed with `match`) that are not on
+        the list will be removed, the `match` fields are also set to every
+        provided streams.
+
+        :param source: The stream source (hololive_data, nijitube_live, ...)
+        :type source: str
+        :param streams: List of streams
+        :type streams: List[dict]
+        :param match: Narrow down the replaced streams, ex: {"status": "live"}
+        :type match: Optional[dict], optional
+        :return: Is the operation acknowledged or not
+        :rtype: bool
+        """
+        return await self._write_documents(self.STREAMS_COLL, source, streams, match, True)
+
+    async def fetch_channels(self, source: str) -> List[dict]:
+        return await self._find_documents(self.CHANNELS_COLL, source)
+
+    async def upsert_channels(self, source: str, channels: List[dict]) -> bool:
+        """Insert or replace the provided channels, leaving the rest untouched."""
+        return await self._write_documents(self.CHANNELS_COLL, source, channels)
+
+    async def replace_channels(self, source: str, channels: List[dict]) -> bool:
+        """Make the provided channels the only channels of a source."""
+        return await self._write_documents(self.CHANNELS_COLL, source, channels, replace_all=True)
+
+    async def ensure_ended_ids_index(self, ttl: int):
+        """Create (or update) the TTL index of the ended IDs collection
+
+        An expired ID that is still on the channel RSS feed will simply be
+        checked once more to the API and marked as ended again.
+
+        :param ttl: How long an ended ID is kept, in seconds
+        :type ttl: int
+        """
+        coll: AsyncIOMotorCollection = self._vtdb[self.ENDED_IDS_COLL]
+        self.logger.info(f"\tEnsuring ended IDs TTL index ({ttl}s)...")
+        await self._ensure_ttl_index(self.ENDED_IDS_COLL, "endedAt", self.ENDED_IDS_TTL_INDEX, ttl)
+        await coll.create_index([("source", ASCENDING), ("channel", ASCENDING)])
+
+    async def _ensure_ttl_index(self, coll_name: str, field: str, index_name: str, ttl: int):
+        coll: AsyncIOMotorCollection = self._vtdb[coll_name]
+        try:
+            await coll.create_index([(field, ASCENDING)], name=index_name, expireAfterSeconds=ttl)
+        except OperationFailure:
+            # The index exist with another TTL, modify it in place.
+            await self._vtdb.command(
+                "collMod", coll_name, index={"name": index_name, "expireAfterSeconds": ttl}
+            )
+
+    async def load_seen_filter(
+        self, source: str, capacity: int = 500000, error_rate: float = 0.001, recent_size: int = 20000
+    ) -> SeenIDsFilter:
+        """Build the seen IDs filter of a source from the stored ended IDs
+
+        The capacity is raised to twice the stored IDs if needed, so the
+        filter never start above its wanted false positive rate.
+
+        :param source: The ended IDs source (nijitube_ended_ids, yt_other_ended_ids)
+        :type source: str
+        :param capacity: Expected total IDs, defaults to 500000
+        :type capacity: int, optional
+        :param error_rate: Wanted false positive rate, defaults to 0.001
+        :type error_rate: float, optional
+        :param recent_size: How many recent IDs are kept exactly, defaults to 20000
+        :type recent_size: int, optional
+        :return: The built filter
+        :rtype: SeenIDsFilter
+        """
+        coll: AsyncIOMotorCollection = self._vtdb[self.ENDED_IDS_COLL]
+        self.logger.info(f"\tBuilding seen IDs filter for: {source}")
+        await self.acquire(source)
+        try:
+            total_ids = await coll.count_documents({"source": source})
+            seen_filter = SeenIDsFilter(max(capacity, total_ids * 2), error_rate, recent_size)
+            # Oldest first, so the newest IDs end up on the exact recent set.
+            cur: AsyncIOMotorCursor = coll.find({"source": source}, {"_id": 0, "id": 1}).sort(
+                "endedAt", ASCENDING
+            )
+            async for item in cur:
+                seen_filter.add(item["id"])
+        finally:
+            self.release(source)
+        self._seen_filters[source] = seen_filter
+        self.logger.info(f"\tBuilt with {total_ids} IDs ({seen_filter.stats()['memory']} bytes).")
+        return seen_filter
+
+    def seen_filter_stats(self) -> Dict[str, dict]:
+        return {source: seen_filter.stats() for source, seen_filter in self._seen_filters.items()}
+
+    async def filter_unseen_ids(self, source: str, video_ids: Iterable[str]) -> Set[str]:
+        """Return the video IDs that are not on the ended IDs of a source
+
+        Only the IDs the seen filter can't rule out are checked to the
+        database, without a filter every IDs are checked.
+
+        :param source: The ended IDs source (nijitube_ended_ids, yt_other_ended_ids)
+        :type source: str
+        :param video_ids: The video IDs to check
+        :type video_ids: Iterable[str]
+        :return: The unseen video IDs
+        :rtype: Set[str]
+        """
+        seen_filter = self._seen_filters.get(source)
+        if seen_filter is None:
+            new_ids, maybe_ids = set(), set(video_ids)
+        else:
+            new_ids, _, maybe_ids = seen_filter.check(video_ids)
+        if not maybe_ids:
+            return new_ids
+        coll: AsyncIOMotorCollection = self._vtdb[self.ENDED_IDS_COLL]
+        cur: AsyncIOMotorCursor = coll.find(
+            {"_id": {"$in": [f"{source}:{video_id}" for video_id in maybe_ids]}}, {"_id": 0, "id": 1}
+        )
+        await self.acquire(source)
+        try:
+            confirmed_ids = {item["id"] async for item in cur}
+        finally:
+            self.release(source)
+        unseen_ids = maybe_ids - confirmed_ids
+        if seen_filter is not None:
+            seen_filter.confirm(confirmed_ids, unseen_ids)
+        return new_ids | unseen_ids
+
+    async def insert_ended_ids(self, source: str, ended_ids: Dict[str, Iterable[str]]) -> bool:
+        """Store newly ended video IDs, already stored IDs keep their original expiry
+
+        :param source: The ended IDs source (nijitube_ended_ids, yt_other_ended_ids)
+        :type source: str
+        :param ended_ids: A dict of channel ID to the new ended video IDs
+        :type ended_ids: Dict[str, Iterable[str]]
+        :return: Is the operation acknowledged or not
+        :rtype: bool
+        """
+        coll: AsyncIOMotorCollection = self._vtdb[self.ENDED_IDS_COLL]
+        ended_at = datetime.now(tz=timezone.utc)
+        requests = []
+        for channel, video_ids in ended_ids.items():
+            for video_id in video_ids:
+                document = {"id": video_id, "channel": channel, "source": source, "endedAt": ended_at}
+                requests.append(
+                    UpdateOne({"_id": f"{source}:{video_id}"}, {"$setOnInsert": document}, upsert=True)
+                )
+        if not requests:
+            return True
+        self.logger.info(f"\tSending {len(requests)} ended IDs to: {source}")
+        await self.acquire(source)
+        try:
+            res = await coll.bulk_write(requests, ordered=False)
+        finally:
+            self.release(source)
         if res.acknowledged:
+            seen_filter = self._seen_filters.get(source)
+            if seen_filter is not None:
+                for video_ids in ended_ids.values():
+                    seen_filter.update(video_ids)
             self.logger.info("\tUpdated!")
             return True
         self.logger.error("\tFailed to update database...")
         return False
 
-    async def fetch_data(self, key: str) -> dict:
-        coll: AsyncIOMotorCollection = self._vtdb[key]
-        self.logger.info("\tFetching data...")
-        cur: AsyncIOMotorCursor = coll.find({})
-        await self.acquire()
-        data = list(await cur.to_list(length=100))
-        await self.release()
-        return data[0]
+    async def load_ignored_ids(self, source: str, ttl: int):
+        """Ensure the TTL index of the ignored streams and load a source into memory
+
+        :param source: The ignored streams source (hololive_ignored, nijisanji_ignored)
+        :type source: str
+        :param ttl: How long an ignored stream is kept after it was last seen, in seconds
+        :type ttl: int
+        """
+        coll: AsyncIOMotorCollection = self._vtdb[self.IGNORED_COLL]
+        self._ignored_ttl = ttl
+        self.logger.info(f"\tLoading ignored streams for: {source}")
+        await self._ensure_ttl_index(self.IGNORED_COLL, "lastSeen", self.IGNORED_TTL_INDEX, ttl)
+        await coll.create_index([("source", ASCENDING)])
+        await self.acquire(source)
+        try:
+            cur: AsyncIOMotorCursor = coll.find({"source": source}, {"_id": 0, "id": 1, "lastSeen": 1})
+            self._ignored_ids[source] = {
+                item["id"]: item["lastSeen"].replace(tzinfo=timezone.utc).timestamp() async for item in cur
+            }
+        finally:
+            self.release(source)
+        self.logger.info(f"\tLoaded {len(self._ignored_ids[source])} ignored streams.")
+
+    def is_ignored(self, source: str, stream_id: str) -> bool:
+        return stream_id in self._ignored_ids.get(source, {})
+
+    async def mark_ignored_ids(self, source: str, stream_ids: Iterable[str]) -> bool:
+        """Mark streams as ignored, or still ignored, only writing what changed
+
+        The streams that are still live should be marked on every run. New
+        streams are written right away, already known ones only once a
+        quarter of the TTL went by, to push their expiry back. Streams that
+        stopped being marked expire from memory and from the database.
+
+        :param source: The ignored streams source (hololive_ignored, nijisanji_ignored)
+        :type source: str
+        :param stream_ids: The ignored streams IDs seen on this run
+        :type stream_ids: Iterable[str]
+        :return: Is the operation acknowledged or not
+        :rtype: bool
+        """
+        ignored_ids = self._ignored_ids.setdefault(source, {})
+        now = datetime.now(tz=timezone.utc)
+        now_ts = now.timestamp()
+        for stream_id, written_at in list(ignored_ids.items()):
+            if now_ts - written_at >= self._ignored_ttl:
+                del ignored_ids[stream_id]
+        refresh_after = self._ignored_ttl / 4
+        to_write = [
+            stream_id
+            for stream_id in set(stream_ids)
+            if stream_id not in ignored_ids or now_ts - ignored_ids[stream_id] >= refresh_after
+        ]
+        if not to_write:
+            return True
+        requests = [
+            UpdateOne(
+                {"_id": f"{source}:{stream_id}"},
+                {"$set": {"lastSeen": now}, "$setOnInsert": {"id": stream_id, "source": source}},
+                upsert=True,
+            )
+            for stream_id in to_write
+        ]
+        self.logger.info(f"\tSending {len(requests)} ignored streams to: {source}")
+        coll: AsyncIOMotorCollection = self._vtdb[self.IGNORED_COLL]
+        await self.acquire(source)
+        try:
+            res = await coll.bulk_write(requests, ordered=False)
+        finally:
+            self.release(source)
+        if res.acknowledged:
+            for stream_id in to_write:
+                ignored_ids[stream_id] = now_ts
+            self.logger.info("\tUpdated!")
+            return True
+        self.logger.error("\tFailed to update database...")
+        return False
@@ -0,0 +1,87 @@
+import asyncio
+import collections
+
+
+class TokenBucket:
+    """A token-bucket rate limiter shared by every requests to an upstream API
+
+    The bucket holds up to `burst` tokens and is refilled at `rate` tokens
+    per second, every request takes a token. When the bucket is empty the
+    request reserves the next token and waits for it, so waiting requests
+    are served in order and the sustained rate is never exceeded.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1):
+        """Initialize the bucket, full
+
+        :param name: The host or endpoint limited, used for the metrics
+        :type name: str
+        :param rate: Sustained rate in requests per second
+        :type rate: float
+        :param burst: Requests that can be sent at once, defaults to 1
+        :type burst: int, optional
+        """
+        self.name = name
+        self._rate = rate
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._updated = None
+        self._waiting = 0
+        self._stats = collections.Counter()
+        self._max_wait = 0.0
+        self._max_queue = 0
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests currently waiting for a token"""
+        return self._waiting
+
+    async def acquire(self):
+        """Take a token, waiting for it if the bucket is empty"""
+        loop = asyncio.get_event_loop()
+        self._refill(loop.time())
+        self._tokens -= 1
+        self._stats["acquired"] += 1
+        if self._tokens >= 0:
+            return
+        wait = -self._tokens / self._rate
+        self._waiting += 1
+        self._max_queue = max(self._max_queue, self._waiting)
+        self._stats["waited"] += 1
+        self._stats["wait_time"] += wait
+        self._max_wait = max(self._max_wait, wait)
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            # Give back the reserved token.
+            self._tokens += 1
+            raise
+        finally:
+            self._waiting -= 1
+
+    def stats(self, reset: bool = True) -> dict:
+        """Return the bucket counts since the last reset
+
+        acquired: tokens taken, waited: requests that had to wait,
+        wait_avg/wait_max: wait of those requests in seconds, queue_depth:
+        requests waiting right now, queue_max: most requests waiting at once.
+        """
+        waited = self._stats["waited"]
+        stats = {
+            "acquired": self._stats["acquired"],
+            "waited": waited,
+            "wait_avg": self._stats["wait_time"] / waited if waited else 0.0,
+            "wait_max": self._max_wait,
+            "queue_depth": self._waiting,
+            "queue_max": self._max_queue,
+        }
+        if reset:
+            self._stats.clear()
+            self._max_wait = 0.0
+            self._max_queue = self._waiting
+        return stats
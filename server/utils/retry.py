@@ -0,0 +1,130 @@
+import collections
+import contextvars
+import random
+from typing import Deque, Optional
+
+# Loop time at which the running job get cancelled, set by the job runner.
+job_deadline: contextvars.ContextVar = contextvars.ContextVar("job_deadline", default=None)
+
+
+class RetryPolicy:
+    """How a class of upstream calls is retried
+
+    A failed call (request error, timeout, 5xx or 429) is retried with a
+    full-jitter exponential backoff, as long as the retry still fits in
+    the running job deadline. Only use it for idempotent calls.
+
+    Latency-critical calls can also be hedged: once a request is slower
+    than the latency percentile of the previous calls, a second identical
+    request is sent and the first good response wins. Hedged requests are
+    capped to a ratio of the calls.
+
+    The policy keeps its own latency samples and counters, so every call
+    of the same class should share one policy.
+    """
+
+    COUNTERS = ("calls", "retries", "recovered", "gave_up", "deadline", "hedged", "hedge_won")
+
+    def __init__(
+        self,
+        name: str,
+        attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge: bool = False,
+        hedge_percentile: float = 0.95,
+        hedge_min_samples: int = 20,
+        hedge_budget: float = 0.1,
+        deadline_margin: float = 5.0,
+    ):
+        """Initialize the policy
+
+        :param name: The call class name, used for the metrics
+        :type name: str
+        :param attempts: Total attempts, including the first one, defaults to 3
+        :type attempts: int, optional
+        :param base_delay: Backoff base in seconds, doubled on each attempt, defaults to 0.5
+        :type base_delay: float, optional
+        :param max_delay: Longest backoff in seconds, defaults to 8
+        :type max_delay: float, optional
+        :param hedge: Send a hedged request when the first one is slow, defaults to False
+        :type hedge: bool, optional
+        :param hedge_percentile: Latency percentile after which the request is hedged, defaults to 0.95
+        :type hedge_percentile: float, optional
+        :param hedge_min_samples: Latency samples needed before hedging, defaults to 20
+        :type hedge_min_samples: int, optional
+        :param hedge_budget: At most this ratio of the calls get hedged, so a slow host
+                             doesn't get twice the load, defaults to 0.1
+        :type hedge_budget: float, optional
+        :param deadline_margin: Don't retry if the job deadline is closer than this (in seconds),
+                                defaults to 5
+        :type deadline_margin: float, optional
+        """
+        self.name = name
+        self.attempts = max(1, attempts)
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self.hedge = hedge
+        self._hedge_percentile = hedge_percentile
+        self._hedge_min_samples = hedge_min_samples
+        self._hedge_budget = hedge_budget
+        self._hedge_tokens = 0.0
+        self._deadline_margin = deadline_margin
+        self._latencies: Deque[float] = collections.deque(maxlen=200)
+        self._stats = collections.Counter()
+
+    @staticmethod
+    def retryable(status: int) -> bool:
+        return status >= 500 or status == 429
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter backoff before the next attempt, `attempt` starts at 0"""
+        return random.uniform(0, min(self._max_delay, self._base_delay * (2 ** attempt)))
+
+    def fits_deadline(self, now: float, delay: float) -> bool:
+        """Check if a retry after `delay` still fits in the running job deadline
+
+        :param now: Current loop time
+        :type now: float
+        :param delay: Backoff before the retry
+        :type delay: float
+        """
+        deadline = job_deadline.get()
+        return deadline is None or now + delay + self._deadline_margin < deadline
+
+    def record_latency(self, latency: float):
+        self._latencies.append(latency)
+
+    def hedge_delay(self) -> Optional[float]:
+        """The latency after which a request get hedged, None if not hedged yet"""
+        if not self.hedge or len(self._latencies) < self._hedge_min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self._hedge_percentile))]
+
+    def take_hedge(self) -> bool:
+        """Take a hedged request from the budget, refilled by every calls"""
+        if self._hedge_tokens < 1:
+            return False
+        self._hedge_tokens -= 1
+        return True
+
+    def count(self, key: str):
+        if key == "calls":
+            self._hedge_tokens = min(self._hedge_tokens + self._hedge_budget, 10.0)
+        self._stats[key] += 1
+
+    def stats(self, reset: bool = True) -> dict:
+        """Return the counts since the last reset
+
+        calls: calls made, retries: retried attempts, recovered: calls that
+        succeeded after a retry, gave_up: calls that failed every attempts,
+        deadline: retries dropped because of the job deadline, hedged: hedged
+        requests sent, hedge_won: hedged requests that answered first,
+        hedge_delay: current hedging latency threshold in seconds.
+        """
+        stats = {key: self._stats[key] for key in self.COUNTERS}
+        stats["hedge_delay"] = self.hedge_delay()
+        if reset:
+            self._stats.clear()
+        return stats
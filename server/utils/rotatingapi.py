@@ -1,70 +1,182 @@
 import collections
 import logging
-from datetime import datetime, timezone
-from typing import Union
+from datetime import datetime, time, timedelta
+from typing import Optional, Union
+
+import pytz
 
 
 class RotatingAPIKey:
-    """A class to rotate API key based on rotation rate"""
+    """A quota-aware YouTube Data API key pool
+
+    Every `get()` hands out the healthy key with the least estimated quota
+    used today, and charges it with the cost of the call type. A key that
+    got a quota or key error is quarantined until the next quota reset
+    (midnight Pacific Time), a rate-limited key only for a short while.
+    Any other error is caused by the request itself and is left to the caller.
+    """
 
-    def __init__(self, api_keys: Union[str, list], minute_rate: int = 60):
-        """Initialize Rotating API
+    # Estimated quota units per call, see YouTube Data API quota calculator.
+    CALL_COSTS = {
+        "videos.list": 1,
+        "channels.list": 1,
+        "playlistItems.list": 1,
+        "search.list": 100,
+    }
+    QUOTA_REASONS = ("quotaExceeded", "dailyLimitExceeded")
+    KEY_REASONS = ("keyInvalid", "keyExpired", "accessNotConfigured")
+    RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+    RATE_LIMIT_COOLDOWN = 60  # In seconds
 
-        self._kcount: API key total for easier access.
-        self._rate: the minute_rate * 60 (in seconds)
-        self._next_rotate: current time + _rate
+    def __init__(self, api_keys: Union[str, list], daily_quota: int = 10000):
+        """Initialize the API key pool
 
         **NOTE**:
         All of the variable used in this are not mean to be changed by user.
 
         :param api_keys: A set of API keys on list
         :type api_keys: list
-        :param minute_rate: A rotation rate in minutes, defaults to 60 minutes
-        :type minute_rate: int, optional
+        :param daily_quota: Daily quota units of each key, defaults to 10000
+        :type daily_quota: int, optional
         """
         self.logger = logging.getLogger("utils.rotatingapi.RotatingAPIKey")
         if isinstance(api_keys, str):
             api_keys = [api_keys]
-        self._api_keys = collections.deque(api_keys)
-        self._kcount = len(api_keys)
-        self._rate = minute_rate * 60
-        self._next_rotate = (
-            datetime.now(tz=timezone.utc).timestamp() + self._rate
-        )
+        self._daily_quota = daily_quota
+        self._tz = pytz.timezone("America/Los_Angeles")
+        self._keys = {api_key: self._new_usage() for api_key in dict.fromkeys(api_keys)}
+        self._next_reset = self._next_reset_time()
 
-    def __check_time(self):
-        """Internal time checking, it will be run automatically if you have more
-        than one API keys when you initialized the class.
+    @staticmethod
+    def _new_usage() -> dict:
+        return {
+            "units": 0,
+            "calls": collections.Counter(),
+            "errors": 0,
+            "quarantined_until": None,
+            "reason": None,
+        }
 
-        This is internal function and can't be called outside from the class.
+    @staticmethod
+    def _mask(api_key: str) -> str:
+        if len(api_key) <= 8:
+            return "*" * len(api_key)
+        return f"{api_key[:4]}...{api_key[-4:]}"
 
-        Rotation method:
-        If the time already passed the next_rotate time it will rotate the key
-        forward and set the next_rotate time with the applied rate
+    def _next_reset_time(self) -> float:
+        now = datetime.now(tz=self._tz)
+        midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+        return self._tz.localize(midnight).timestamp()
 
-        Ex:
-        Provided: ["api_a", "api_b", "api_c"]
-        Next rotation (1): ["api_b", "api_c", "api_a"]
-        Next rotation (2): ["api_c", "api_a", "api_b"]
-        Next rotation (3/Full rotate): ["api_a", "api_b", "api_c"]
-        """
-        current_time = datetime.now(tz=timezone.utc)
-        if current_time.timestamp() >= self._next_rotate:
-            ctext = current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
-            self.logger.info("Rotating API key...")
-            self._next_rotate = current_time.timestamp() + self._rate
-            self.logger.info(f"Next API rotate: {ctext}")
-            self._api_keys.rotate(-1)
-
-    def get(self) -> str:
-        """Fetch the first API keys
-        the first api keys will always be different since
-        the rotation check are always called everytime this functioon
-        are called.
+    def __check_reset(self):
+        """Reset every usage and quarantine once the Pacific Time day is over."""
+        if datetime.now(tz=pytz.utc).timestamp() < self._next_reset:
+            return
+        self.logger.info("Quota reset time passed, resetting every API keys usage...")
+        for api_key in self._keys:
+            self._keys[api_key] = self._new_usage()
+        self._next_reset = self._next_reset_time()
 
+    def _is_available(self, usage: dict, now: float) -> bool:
+        quarantined_until = usage["quarantined_until"]
+        return quarantined_until is None or now >= quarantined_until
+
+    def get(self, call_type: str = "videos.list") -> str:
+        """Fetch the least used healthy API key, and charge it for the call
+
+        If every keys are quarantined or exhausted, the one that will be
+        available the soonest is returned anyway.
+
+        :param call_type: The API call the key will be used for, defaults to "videos.list"
+        :type call_type: str, optional
         :return: API Keys
         :rtype: str
         """
-        if self._kcount > 1:
-            self.__check_time()
-        return self._api_keys[0]
+        self.__check_reset()
+        now = datetime.now(tz=pytz.utc).timestamp()
+        cost = self.CALL_COSTS.get(call_type, 1)
+        available = [
+            (usage["units"], api_key)
+            for api_key, usage in self._keys.items()
+            if self._is_available(usage, now)
+        ]
+        healthy = [(units, api_key) for units, api_key in available if units + cost <= self._daily_quota]
+        if healthy:
+            _, api_key = min(healthy)
+        elif available:
+            _, api_key = min(available)
+            self.logger.warning(f"Every API keys are over the estimated quota, using {self._mask(api_key)}")
+        else:
+            api_key = min(self._keys, key=lambda key: self._keys[key]["quarantined_until"])
+            self.logger.warning(f"Every API keys are quarantined, using {self._mask(api_key)}")
+        usage = self._keys[api_key]
+        usage["units"] += cost
+        usage["calls"][call_type] += 1
+        return api_key
+
+    def report(self, api_key: str, status: int, data: Optional[dict] = None) -> bool:
+        """Report an API response made with the key, quarantining it if needed
+
+        :param api_key: The API key used
+        :type api_key: str
+        :param status: The response status code
+        :type status: int
+        :param data: The response body, defaults to None
+        :type data: Optional[dict], optional
+        :return: True if the key got quarantined and the call can be retried with another key,
+                 False on success or on a request error (badRequest, invalidParameter, ...)
+        :rtype: bool
+        """
+        if api_key not in self._keys or status < 400:
+            return False
+        usage = self._keys[api_key]
+        usage["errors"] += 1
+        reasons = []
+        if isinstance(data, dict) and isinstance(data.get("error"), dict):
+            reasons = [error.get("reason") for error in data["error"].get("errors", [])]
+        now = datetime.now(tz=pytz.utc).timestamp()
+        rate_limited = [reason for reason in reasons if reason in self.RATE_LIMIT_REASONS]
+        exhausted = [reason for reason in reasons if reason in self.QUOTA_REASONS + self.KEY_REASONS]
+        if rate_limited:
+            usage["quarantined_until"] = now + self.RATE_LIMIT_COOLDOWN
+            usage["reason"] = rate_limited[0]
+        elif exhausted:
+            # Quota exceeded, invalid or disabled key, none of them will fix itself before the reset.
+            usage["quarantined_until"] = self._next_reset
+            usage["reason"] = exhausted[0]
+        else:
+            # The request is wrong, another key would get the same error.
+            return False
+        until = datetime.fromtimestamp(usage["quarantined_until"], tz=self._tz)
+        self.logger.warning(
+            f"Quarantining API key {self._mask(api_key)} ({usage['reason']}) "
+            f"until {until.strftime('%Y-%m-%d %H:%M:%S %Z')}"
+        )
+        return True
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def has_available_key(self) -> bool:
+        now = datetime.now(tz=pytz.utc).timestamp()
+        return any(self._is_available(usage, now) for usage in self._keys.values())
+
+    def usage(self) -> dict:
+        """Return the estimated usage of every keys, with the keys masked
+
+        :return: A dict of masked API key to units, calls per type, errors and quarantine info
+        :rtype: dict
+        """
+        self.__check_reset()
+        results = {}
+        for api_key, usage in self._keys.items():
+            results[self._mask(api_key)] = {
+                "units": usage["units"],
+                "quota": self._daily_quota,
+                "calls": dict(usage["calls"]),
+                "errors": usage["errors"],
+                "quarantined_until": usage["quarantined_until"],
+                "reason": usage["reason"],
+            }
+        return results
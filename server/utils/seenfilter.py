@@ -0,0 +1,137 @@
+import math
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Iterable
+
+
+class BloomFilter:
+    """A plain bit-array Bloom filter, sized from the expected capacity and error rate
+
+    It never returns a false negative, so anything it doesn't contain is
+    definitely new. A positive answer must be confirmed somewhere else.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """Initialize the filter
+
+        :param capacity: Expected total items
+        :type capacity: int
+        :param error_rate: Wanted false positive rate at full capacity, defaults to 0.001
+        :type error_rate: float, optional
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing, two 64 bits halves of a single digest.
+        digest = blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for n in range(self.num_hashes):
+            yield (h1 + n * h2) % self.num_bits
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def memory_usage(self) -> int:
+        """Size of the bit array in bytes"""
+        return len(self._bits)
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """Expected false positive rate for the current item count"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+
+class SeenIDsFilter:
+    """Answer "have we seen this ID?" without keeping every ID in memory
+
+    A Bloom filter holds everything that has ever been added, and a small
+    bounded exact set holds the most recent IDs, which are the ones the
+    RSS feeds keep on returning. `check()` splits IDs into definitely-new,
+    definitely-seen and maybe-seen, the latter needs to be confirmed by the
+    caller.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, recent_size: int = 20000):
+        """Initialize the filter
+
+        :param capacity: Expected total IDs, going past it raises the false positive rate
+        :type capacity: int
+        :param error_rate: Wanted false positive rate at full capacity, defaults to 0.001
+        :type error_rate: float, optional
+        :param recent_size: How many recent IDs are kept exactly, defaults to 20000
+        :type recent_size: int, optional
+        """
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._recent: OrderedDict = OrderedDict()
+        self._recent_size = recent_size
+        self._checked = 0
+        self._maybe = 0
+        self._false_positives = 0
+
+    def _remember(self, item: str):
+        self._recent[item] = None
+        self._recent.move_to_end(item)
+        if len(self._recent) > self._recent_size:
+            self._recent.popitem(last=False)
+
+    def add(self, item: str):
+        if item not in self._recent:
+            self._bloom.add(item)
+        self._remember(item)
+
+    def update(self, items: Iterable[str]):
+        for item in items:
+            self.add(item)
+
+    def check(self, items: Iterable[str]):
+        """Split the IDs by what the filter knows about them
+
+        :param items: The IDs to check
+        :type items: Iterable[str]
+        :return: A tuple of new IDs, seen IDs and IDs that need to be confirmed
+        :rtype: Tuple[Set[str], Set[str], Set[str]]
+        """
+        new_items, seen_items, maybe_items = set(), set(), set()
+        for item in items:
+            self._checked += 1
+            if item in self._recent:
+                seen_items.add(item)
+            elif item in self._bloom:
+                maybe_items.add(item)
+            else:
+                new_items.add(item)
+        self._maybe += len(maybe_items)
+        return new_items, seen_items, maybe_items
+
+    def confirm(self, seen_items: Iterable[str], false_positives: Iterable[str]):
+        """Feed back the result of the confirmation of the maybe-seen IDs"""
+        for item in seen_items:
+            self._remember(item)
+        self._false_positives += len(set(false_positives))
+
+    def stats(self) -> dict:
+        return {
+            "count": self._bloom.count,
+            "capacity": self._bloom.capacity,
+            "recent": len(self._recent),
+            "memory": self._bloom.memory_usage,
+            "estimated_error_rate": self._bloom.estimated_error_rate,
+            "checked": self._checked,
+            "maybe": self._maybe,
+            "false_positives": self._false_positives,
+        }
@@ -0,0 +1,142 @@
+import asyncio
+import collections
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+
+class TwitcastingPoller:
+    """Poll Twitcasting channels one at a time, spread over a time window
+
+    Instead of firing every request at once, the request of each channel
+    starts at its own offset on the spread window, with a bounded number
+    of requests in flight. The latency of every request is recorded.
+
+    The last live stream of every channel is also kept, so the heartbeat
+    only write what changed since the previous run: a new or ended stream,
+    or a different viewer count.
+    """
+
+    def __init__(self, spread_window: float = 30, concurrency: int = 4):
+        """Initialize the poller
+
+        :param spread_window: Requests are spread over this many seconds, defaults to 30
+        :type spread_window: float, optional
+        :param concurrency: Maximum requests in flight, defaults to 4
+        :type concurrency: int, optional
+        """
+        self.logger = logging.getLogger("utils.twitcast.TwitcastingPoller")
+        self._spread_window = spread_window
+        self._concurrency = max(1, concurrency)
+        self._streams: Dict[str, dict] = {}
+        self._synced = False
+        self._stats = collections.Counter()
+        self._latencies: List[float] = []
+
+    async def _timed_fetch(
+        self,
+        fetcher: Callable[[str], Awaitable],
+        channel: str,
+        offset: float,
+        semaphore: asyncio.Semaphore,
+    ):
+        await asyncio.sleep(offset)
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await fetcher(channel)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.logger.warning(f"Failed to fetch {channel}: {e!r}")
+                result = None
+            self._latencies.append(time.monotonic() - started)
+        self._stats["requests"] += 1
+        if result is None:
+            self._stats["failed"] += 1
+        return result, channel
+
+    async def poll(self, fetcher: Callable[[str], Awaitable], channels: List[str]) -> Dict[str, Any]:
+        """Run the fetcher on every channels, spread evenly over the window
+
+        :param fetcher: Coroutine function called with the channel, returning None if it failed
+        :type fetcher: Callable[[str], Awaitable]
+        :param channels: Twitcasting channel IDs
+        :type channels: List[str]
+        :return: A dict of channel to the fetcher result, None if it failed
+        :rtype: Dict[str, Any]
+        """
+        if not channels:
+            return {}
+        semaphore = asyncio.Semaphore(self._concurrency)
+        spacing = self._spread_window / len(channels)
+        tasks = [
+            self._timed_fetch(fetcher, channel, index * spacing, semaphore)
+            for index, channel in enumerate(channels)
+        ]
+        results = {}
+        for task in asyncio.as_completed(tasks):
+            result, channel = await task
+            results[channel] = result
+        return results
+
+    def update_stream(self, channel: str, stream: Optional[dict]) -> Optional[str]:
+        """Compare a channel fresh stream to the last one and remember it
+
+        The start time of a stream is derived from the time passed, so it
+        is kept from the first time the stream was seen to not drift.
+
+        :param channel: Twitcasting channel ID
+        :type channel: str
+        :param stream: The live stream, None if the channel is not live
+        :type stream: Optional[dict]
+        :return: "new", "changed", "ended" or "replaced" (ended and new), None if nothing changed
+        :rtype: Optional[str]
+        """
+        last_stream = self._streams.get(channel)
+        if stream is None:
+            if last_stream is None:
+                return None
+            del self._streams[channel]
+            self._stats["ended"] += 1
+            return "ended"
+        if last_stream is None or last_stream["id"] != stream["id"]:
+            self._streams[channel] = stream
+            self._stats["new"] += 1
+            if last_stream is None:
+                return "new"
+            # Went live again since the last check, the old stream is gone.
+            self._stats["ended"] += 1
+            return "replaced"
+        stream["startTime"] = last_stream["startTime"]
+        self._streams[channel] = stream
+        if last_stream["viewers"] == stream["viewers"]:
+            return None
+        self._stats["changed"] += 1
+        return "changed"
+
+    def live_streams(self) -> List[dict]:
+        return sorted(self._streams.values(), key=lambda x: x["startTime"])
+
+    @property
+    def synced(self) -> bool:
+        """Is the database known to have the same streams as the poller"""
+        return self._synced
+
+    def mark_synced(self, synced: bool = True):
+        self._synced = synced
+
+    def run_stats(self, reset: bool = True) -> dict:
+        """Return the polling counts since the last reset
+
+        requests: requests made, failed: requests that failed, new/changed/
+        ended: streams updates found, latency_avg/latency_max: request
+        latency in seconds.
+        """
+        stats = {key: self._stats[key] for key in ("requests", "failed", "new", "changed", "ended")}
+        stats["latency_avg"] = sum(self._latencies) / len(self._latencies) if self._latencies else 0.0
+        stats["latency_max"] = max(self._latencies, default=0.0)
+        if reset:
+            self._stats.clear()
+            self._latencies = []
+        return stats
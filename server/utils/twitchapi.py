@@ -1,17 +1,50 @@
 import asyncio
 import logging
+import os
 from datetime import datetime, timezone
+from typing import Dict, List, Optional
 
+import aiofiles
 import aiohttp
+import ujson
 
 
 class TwitchHelix:
-    """A self-made API communicator for Twitch Helix"""
+    """A self-made API communicator for Twitch Helix
+
+    Logins and IDs are split into pages of 100 (the Helix limit per
+    request) that are fetched concurrently, with cursors followed until
+    the last page. The bearer token is refreshed a bit before it expires
+    and can be cached to a file so a restart doesn't request a new one.
+
+    Every user fetched is remembered on a user ID <-> login index, so live
+    streams can be queried and resolved by user ID. Logins that can't be
+    resolved are remembered too, until they are fetched again.
+    """
 
     BASE_URL = "https://api.twitch.tv/helix/"
     OAUTH_URL = "https://id.twitch.tv/oauth2/"
+    MAX_IDS_PER_PAGE = 100
+    TOKEN_REFRESH_MARGIN = 5 * 60  # In seconds
 
-    def __init__(self, client_id, client_secret, loop=None):
+    def __init__(
+        self,
+        client_id,
+        client_secret,
+        loop=None,
+        token_cache: Optional[str] = None,
+        concurrency: int = 5,
+    ):
+        """Initialize the Helix client
+
+        :param client_id: Twitch application client ID
+        :param client_secret: Twitch application client secret
+        :param loop: Event loop to use, defaults to the current event loop
+        :param token_cache: File where the bearer token is kept between restarts, defaults to None
+        :type token_cache: Optional[str], optional
+        :param concurrency: Maximum concurrent Helix requests, defaults to 5
+        :type concurrency: int, optional
+        """
         if not loop:
             loop = asyncio.get_event_loop()
         self.logger = logging.getLogger("utils.twitchapi.TwitchHelix")
@@ -23,6 +56,15 @@ class TwitchHelix:
             headers={"User-Agent": "VTBSchedule/0.9.0"}, loop=loop
         )
         self._authorized = False
+        self._token_cache = token_cache
+        self._cache_loaded = False
+        self._concurrency = max(1, concurrency)
+        # Created lazily so they're bound to the running loop.
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._user_logins: Dict[str, str] = {}
+        self._login_users: Dict[str, str] = {}
+        self._unresolved_logins: set = set()
 
     async def close(self):
         if not self._sess.closed:
@@ -100,66 +142,171 @@ class TwitchHelix:
         self._bearer_token = res["access_token"]
         self.logger.info("Authorized!")
         self._authorized = True
+        await self._save_token()
 
-    async def fetch_live_data(self, usernames: list):
-        if not self._authorized:
-            self.logger.warn(
-                "You're not authorized yet, requesting new bearer token..."
-            )
-            await self.authorize()
-        if self.__current() >= self._expires:
-            self.logger.warn("Token expired, rerequesting...")
-            await self.authorize()
-
-        headers = {
-            "Authorization": "Bearer {}".format(self._bearer_token),
-            "Client-ID": self._cid,
-        }
-        url_params = []
-        url_params.append("first=100")
-        for username in usernames:
-            url_params.append(f"user_login={username}")
-        results = await self._get(
-            self.BASE_URL + "streams", url_params, headers
+    async def _load_token(self):
+        self._cache_loaded = True
+        if not self._token_cache or not os.path.isfile(self._token_cache):
+            return
+        try:
+            async with aiofiles.open(self._token_cache, "r", encoding="utf-8") as fp:
+                cached = ujson.loads(await fp.read())
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Failed to read the cached token: {e!r}")
+            return
+        if cached.get("client_id") != self._cid:
+            return
+        if self.__current() >= cached.get("expires", 0) - self.TOKEN_REFRESH_MARGIN:
+            return
+        self.logger.info("Using the cached bearer token.")
+        self._bearer_token = cached["access_token"]
+        self._expires = cached["expires"]
+        self._authorized = True
+
+    async def _save_token(self):
+        if not self._token_cache:
+            return
+        cached = {"client_id": self._cid, "access_token": self._bearer_token, "expires": self._expires}
+        try:
+            async with aiofiles.open(self._token_cache, "w", encoding="utf-8") as fp:
+                await fp.write(ujson.dumps(cached))
+        except OSError as e:
+            self.logger.warning(f"Failed to cache the bearer token: {e!r}")
+
+    async def _ensure_token(self, refused_token: Optional[str] = None):
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        # Only one request re-authorize, the others wait for the new token.
+        async with self._token_lock:
+            if not self._cache_loaded:
+                await self._load_token()
+            if refused_token is not None and refused_token == self._bearer_token:
+                self.logger.warn("Token got refused, rerequesting...")
+                await self.authorize()
+            elif not self._authorized:
+                self.logger.warn(
+                    "You're not authorized yet, requesting new bearer token..."
+                )
+                await self.authorize()
+            elif self.__current() >= self._expires - self.TOKEN_REFRESH_MARGIN:
+                self.logger.warn("Token expiring, rerequesting...")
+                await self.authorize()
+
+    async def _helix_get(self, endpoint: str, url_params: list) -> dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        await self._ensure_token()
+        async with self._semaphore:
+            for attempt in range(2):
+                bearer_token = self._bearer_token
+                headers = {
+                    "Authorization": "Bearer {}".format(bearer_token),
+                    "Client-ID": self._cid,
+                }
+                results = await self._get(self.BASE_URL + endpoint, url_params, headers)
+                if attempt == 0 and isinstance(results, dict) and results.get("status") == 401:
+                    # Revoked or expired early, concurrent requests only re-authorize once.
+                    await self._ensure_token(refused_token=bearer_token)
+                    continue
+                return results
+
+    async def _paginate(self, endpoint: str, url_params: list) -> List[dict]:
+        """Fetch every pages of a Helix endpoint, following the cursor"""
+        results = []
+        cursor = None
+        while True:
+            page_params = url_params + [f"after={cursor}"] if cursor else url_params
+            page = await self._helix_get(endpoint, page_params)
+            if "data" not in page:
+                self.logger.error(f"Failed to fetch {endpoint}: {page}")
+                break
+            results.extend(page["data"])
+            cursor = page.get("pagination", {}).get("cursor")
+            if not cursor or not page["data"]:
+                break
+        return results
+
+    async def _fetch_paged(
+        self, endpoint: str, key: str, values: list, extra_params: Optional[list] = None
+    ) -> List[dict]:
+        """Split the values into pages of 100 and fetch them concurrently"""
+        values = list(dict.fromkeys(values))
+        pages = [
+            [f"{key}={value}" for value in values[i:i + self.MAX_IDS_PER_PAGE]]
+            for i in range(0, len(values), self.MAX_IDS_PER_PAGE)
+        ]
+        pages_results = await asyncio.gather(
+            *[self._paginate(endpoint, (extra_params or []) + page) for page in pages]
         )
-        return results["data"]
+        return [item for page_results in pages_results for item in page_results]
+
+    def remember_users(self, user_logins: Dict[str, str]):
+        """Add users to the user ID <-> login index
+
+        :param user_logins: A dict of user ID to login name
+        :type user_logins: Dict[str, str]
+        """
+        for user_id, login in user_logins.items():
+            self._user_logins[str(user_id)] = login
+            self._login_users[login.lower()] = str(user_id)
+
+    def login_of(self, user_id: str) -> Optional[str]:
+        return self._user_logins.get(str(user_id))
+
+    def user_id_of(self, login: str) -> Optional[str]:
+        return self._login_users.get(login.lower())
+
+    def is_unresolved(self, login: str) -> bool:
+        """Check if the login was not found on the last `fetch_channels()` of it"""
+        return login.lower() in self._unresolved_logins
+
+    async def fetch_live_data(self, usernames: Optional[list] = None, user_ids: Optional[list] = None):
+        """Fetch the live streams of the users, by login name and/or user ID"""
+        tasks = []
+        if user_ids:
+            tasks.append(self._fetch_paged("streams", "user_id", user_ids, ["first=100"]))
+        if usernames:
+            tasks.append(self._fetch_paged("streams", "user_login", usernames, ["first=100"]))
+        results = await asyncio.gather(*tasks)
+        return [stream for streams in results for stream in streams]
 
     async def fetch_channels(self, usernames: list):
-        if not self._authorized:
-            self.logger.warn(
-                "You're not authorized yet, requesting new bearer token..."
-            )
-            await self.authorize()
-        if self.__current() >= self._expires:
-            self.logger.warn("Token expired, rerequesting...")
-            await self.authorize()
-
-        headers = {
-            "Authorization": "Bearer {}".format(self._bearer_token),
-            "Client-ID": self._cid,
-        }
-        url_params = []
+        results = await self._fetch_paged("users", "login", usernames)
+        self.remember_users({user["id"]: user["login"] for user in results})
         for username in usernames:
-            url_params.append(f"login={username}")
-        results = await self._get(self.BASE_URL + "users", url_params, headers)
-        return results["data"]
+            if self.user_id_of(username) is None:
+                self._unresolved_logins.add(username.lower())
+            else:
+                self._unresolved_logins.discard(username.lower())
+        return results
 
     async def fetch_followers(self, user_id: str):
-        if not self._authorized:
-            self.logger.warn(
-                "You're not authorized yet, requesting new bearer token..."
-            )
-            await self.authorize()
-        if self.__current() >= self._expires:
-            self.logger.warn("Token expired, rerequesting...")
-            await self.authorize()
-
-        headers = {
-            "Authorization": "Bearer {}".format(self._bearer_token),
-            "Client-ID": self._cid,
-        }
-        url_params = [f"to_id={user_id}"]
-        results = await self._get(
-            self.BASE_URL + "users/follows", url_params, headers
-        )
+        url_params = [f"to_id={user_id}", "first=1"]
+        results = await self._helix_get("users/follows", url_params)
         return results
+
+    async def fetch_followers_total(self, user_ids: list) -> Dict[str, Optional[int]]:
+        """Fetch the follower count of every users, with a bounded concurrency
+
+        :param user_ids: Twitch user IDs
+        :type user_ids: list
+        :return: A dict of user ID to follower count, None if it failed
+        :rtype: Dict[str, Optional[int]]
+        """
+        followers_results = await asyncio.gather(
+            *[self.fetch_followers(user_id) for user_id in user_ids], return_exceptions=True
+        )
+        followers_total = {}
+        for user_id, followers_data in zip(user_ids, followers_results):
+            if isinstance(followers_data, BaseException):
+                if not isinstance(followers_data, Exception):
+                    raise followers_data
+                self.logger.error(f"Failed to fetch followers of {user_id}: {followers_data!r}")
+                followers_total[user_id] = None
+                continue
+            if not isinstance(followers_data, dict) or "total" not in followers_data:
+                self.logger.error(f"Failed to fetch followers of {user_id}: {followers_data}")
+                followers_total[user_id] = None
+                continue
+            followers_total[user_id] = followers_data["total"]
+        return followers_total
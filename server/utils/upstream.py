@@ -0,0 +1,330 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .breaker import CircuitBreaker, CircuitOpenError
+from .ratelimit import TokenBucket
+from .retry import RetryPolicy
+
+CHROME_UA = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"  # noqa: E501
+VTBSCHEDULE_UA = "VTBSchedule/0.9.0"
+
+
+class UpstreamResponse:
+    """A finished upstream response, the body is already read and parsed.
+
+    `elapsed` is the request duration in seconds, without the rate limit wait.
+    """
+
+    def __init__(self, url: str, status: int, headers: Mapping, data: Any, elapsed: float = 0.0):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.data = data
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def __repr__(self):
+        return f"<UpstreamResponse url={self.url} status={self.status}>"
+
+
+class UpstreamClient:
+    """A long-lived, pooled HTTP client shared by every scheduler jobs
+
+    Connections are kept alive and reused between job runs, DNS results are
+    cached, and every request get the same User-Agent policy.
+
+    Each host also get its own circuit breaker, once a host fails too much
+    its requests raise `CircuitOpenError` right away instead of waiting for
+    the timeout. Jobs can check `is_available()` to skip their run and keep
+    the last data.
+
+    Idempotent calls can be given a `RetryPolicy`, to be retried with a
+    jittered backoff and hedged when they're slow.
+
+    Requests can also be rate limited with token buckets, keyed by host or
+    by host and path prefix (ex: "twitcasting.tv/streamchecker.php"). A
+    request takes a token from every bucket it matches, so an endpoint
+    limit comes on top of its host limit.
+    """
+
+    # Hosts that refuse (or throttle) anything that doesn't look like a browser.
+    BROWSER_UA_HOSTS = (
+        "bilibili.com",
+        "vtbs.moe",
+        "twitcasting.tv",
+    )
+
+    def __init__(
+        self,
+        loop=None,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        dns_ttl: int = 300,
+        keepalive_timeout: float = 60.0,
+        timeout: float = 30.0,
+        breaker_options: Optional[dict] = None,
+        rate_limits: Optional[Dict[str, dict]] = None,
+    ):
+        """Initialize the shared client
+
+        :param loop: Event loop to use, defaults to the current event loop
+        :param limit: Total open connections, defaults to 100
+        :type limit: int, optional
+        :param limit_per_host: Open connections per host, defaults to 10
+        :type limit_per_host: int, optional
+        :param dns_ttl: DNS cache TTL in seconds, defaults to 300
+        :type dns_ttl: int, optional
+        :param keepalive_timeout: Idle keep-alive time in seconds, defaults to 60
+        :type keepalive_timeout: float, optional
+        :param timeout: Total request timeout in seconds, defaults to 30
+        :type timeout: float, optional
+        :param breaker_options: Keyword arguments for every host `CircuitBreaker`, defaults to None
+        :type breaker_options: Optional[dict], optional
+        :param rate_limits: Host or endpoint to its token bucket `rate` (per second) and `burst`,
+                            defaults to None
+        :type rate_limits: Optional[Dict[str, dict]], optional
+        """
+        if not loop:
+            loop = asyncio.get_event_loop()
+        self.logger = logging.getLogger("utils.upstream.UpstreamClient")
+        self._connector = aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            use_dns_cache=True,
+            ttl_dns_cache=dns_ttl,
+            keepalive_timeout=keepalive_timeout,
+            loop=loop,
+        )
+        self._sess = aiohttp.ClientSession(
+            connector=self._connector,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            loop=loop,
+        )
+        self._breaker_options = breaker_options or {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._retry_policies: Dict[str, RetryPolicy] = {}
+        self._buckets: Dict[str, TokenBucket] = {
+            key: TokenBucket(key, limit["rate"], limit.get("burst", 1))
+            for key, limit in (rate_limits or {}).items()
+        }
+
+    async def close(self):
+        """Close sessions"""
+        if not self._sess.closed:
+            await self._sess.close()
+
+    def user_agent(self, url: str) -> str:
+        host = urlparse(url).hostname or ""
+        for browser_host in self.BROWSER_UA_HOSTS:
+            if host == browser_host or host.endswith("." + browser_host):
+                return CHROME_UA
+        return VTBSCHEDULE_UA
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        """Get the circuit breaker of the URL host"""
+        host = urlparse(url).hostname or ""
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(host, **self._breaker_options)
+        return self._breakers[host]
+
+    def is_available(self, url: str) -> bool:
+        """Check if the URL host circuit is not open
+
+        :param url: Any URL on the host
+        :type url: str
+        :return: False if the requests to the host would be refused
+        :rtype: bool
+        """
+        return self.breaker(url).is_available()
+
+    def breaker_stats(self, reset: bool = True) -> Dict[str, dict]:
+        return {host: breaker.stats(reset) for host, breaker in self._breakers.items()}
+
+    def rate_limits(self, url: str) -> List[TokenBucket]:
+        """Get the token buckets the URL is limited by, the host bucket last
+
+        The host bucket is the last one taken, so the endpoint wait doesn't
+        push requests past the host limit.
+        """
+        parsed = urlparse(url)
+        host = parsed.hostname or ""
+        endpoint = host + parsed.path
+        buckets = [
+            (key, bucket)
+            for key, bucket in self._buckets.items()
+            if key == host or ("/" in key and endpoint.startswith(key))
+        ]
+        return [bucket for _, bucket in sorted(buckets, key=lambda item: len(item[0]), reverse=True)]
+
+    def rate_limit_stats(self, reset: bool = True) -> Dict[str, dict]:
+        return {key: bucket.stats(reset) for key, bucket in self._buckets.items()}
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        params: Optional[dict] = None,
+        data: Any = None,
+        json: Any = None,
+        headers: Optional[dict] = None,
+        as_json: bool = True,
+    ) -> UpstreamResponse:
+        req_headers = {"User-Agent": self.user_agent(url)}
+        if headers:
+            req_headers.update(headers)
+        breaker = self.breaker(url)
+        if not breaker.is_available():
+            raise breaker.refuse()
+        for bucket in self.rate_limits(url):
+            await bucket.acquire()
+        if not breaker.allow():
+            raise breaker.refuse()
+        self.logger.debug(f"\t{method} {url}")
+        started = time.monotonic()
+        success = None
+        try:
+            async with self._sess.request(
+                method, url, params=params, data=data, json=json, headers=req_headers
+            ) as resp:
+                if as_json:
+                    try:
+                        body = await resp.json(content_type=None)
+                    except ValueError:
+                        body = None
+                else:
+                    body = await resp.text()
+                success = resp.status < 500 and resp.status != 429
+                elapsed = time.monotonic() - started
+                return UpstreamResponse(str(resp.url), resp.status, resp.headers.copy(), body, elapsed)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            success = False
+            raise
+        finally:
+            if success is None:
+                breaker.release()
+            else:
+                breaker.record(success, time.monotonic() - started)
+
+    async def _timed_send(self, policy: RetryPolicy, send: Callable[[], Awaitable]) -> UpstreamResponse:
+        res = await send()
+        # Queuing for the rate limit is not the host being slow.
+        policy.record_latency(res.elapsed)
+        return res
+
+    async def _send_hedged(
+        self, policy: RetryPolicy, url: str, send: Callable[[], Awaitable]
+    ) -> UpstreamResponse:
+        """Send the request, and a second one if the first is slower than the hedge delay"""
+        first = asyncio.ensure_future(self._timed_send(policy, send))
+        hedge_delay = policy.hedge_delay()
+        if hedge_delay is None:
+            return await first
+        tasks = [first]
+        fallback = None
+        error = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            # A rate limited request might still be queued, a hedge would only queue behind it.
+            queued = any(bucket.queue_depth for bucket in self.rate_limits(url))
+            if done or queued or not policy.take_hedge():
+                return await first
+            policy.count("hedged")
+            tasks.append(asyncio.ensure_future(self._timed_send(policy, send)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    res = task.result()
+                    if policy.retryable(res.status):
+                        fallback = res
+                        continue
+                    if task is not first:
+                        policy.count("hedge_won")
+                    return res
+        finally:
+            # The slower request is not needed anymore.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        if fallback is not None:
+            return fallback
+        raise error
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[dict] = None,
+        data: Any = None,
+        json: Any = None,
+        headers: Optional[dict] = None,
+        as_json: bool = True,
+        retry: Optional[RetryPolicy] = None,
+    ) -> UpstreamResponse:
+        """Send a request to an upstream host
+
+        :param retry: Retry (and hedging) policy of the call class, only for idempotent calls,
+                      defaults to no retry
+        :type retry: Optional[RetryPolicy], optional
+        :raises CircuitOpenError: If the host circuit is open
+        :return: The finished response
+        :rtype: UpstreamResponse
+        """
+
+        def send():
+            return self._send(method, url, params, data, json, headers, as_json)
+
+        if retry is None:
+            return await send()
+        self._retry_policies.setdefault(retry.name, retry)
+        retry.count("calls")
+        loop = asyncio.get_event_loop()
+        res = None
+        error = None
+        for attempt in range(retry.attempts):
+            try:
+                res = await self._send_hedged(retry, url, send)
+            except CircuitOpenError:
+                # Retrying would only get refused again.
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                res, error = None, e
+            else:
+                if not retry.retryable(res.status):
+                    if attempt:
+                        retry.count("recovered")
+                    return res
+            if attempt + 1 >= retry.attempts:
+                break
+            delay = retry.backoff(attempt)
+            if not retry.fits_deadline(loop.time(), delay):
+                retry.count("deadline")
+                break
+            retry.count("retries")
+            self.logger.debug(f"\tRetrying {method} {url} in {delay:.2f}s (attempt {attempt + 2})")
+            await asyncio.sleep(delay)
+        retry.count("gave_up")
+        if res is not None:
+            return res
+        raise error
+
+    def retry_stats(self, reset: bool = True) -> Dict[str, dict]:
+        return {name: policy.stats(reset) for name, policy in self._retry_policies.items()}
+
+    async def get(self, url: str, params: Optional[dict] = None, **kwargs) -> UpstreamResponse:
+        return await self.request("GET", url, params=params, **kwargs)
+
+    async def post(self, url: str, params: Optional[dict] = None, **kwargs) -> UpstreamResponse:
+        return await self.request("POST", url, params=params, **kwargs)
+
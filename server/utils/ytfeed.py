@@ -0,0 +1,288 @@
+import asyncio
+import calendar
+import collections
+import hashlib
+import logging
+import statistics
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from xml.etree import ElementTree
+
+import aiohttp
+import feedparser
+
+from .upstream import UpstreamClient
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+YT_NS = "{http://www.youtube.com/xml/schemas/2015}"
+FEED_SIZE = 15
+PARSE_CHUNK_SIZE = 4096
+
+
+def _timestamp(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return None
+
+
+def parse_youtube_feed(body: str, stop_at: Optional[str] = None) -> List[dict]:
+    """Parse a YouTube channel Atom feed into entries, newest first
+
+    Only the video ID, published and updated time of each entry are kept,
+    everything else is skipped without building a tree of the document.
+    Entries are published newest first, so parsing stops once `stop_at`
+    (the newest known video) is reached.
+
+    :param body: The feed body
+    :type body: str
+    :param stop_at: Stop before this video ID, defaults to None
+    :type stop_at: Optional[str], optional
+    :raises ElementTree.ParseError: If the feed is malformed
+    :return: A list of entry with id, published and updated
+    :rtype: List[dict]
+    """
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    entries = []
+    entry = None
+    # Fed in chunks so nothing past the stop point get parsed.
+    for offset in range(0, len(body), PARSE_CHUNK_SIZE):
+        parser.feed(body[offset:offset + PARSE_CHUNK_SIZE])
+        for event, elem in parser.read_events():
+            tag = elem.tag
+            if event == "start":
+                if tag == ATOM_NS + "entry":
+                    entry = {"id": None, "published": None, "updated": None}
+                continue
+            if entry is None:
+                continue
+            if tag == YT_NS + "videoId":
+                if elem.text == stop_at:
+                    return entries
+                entry["id"] = elem.text
+            elif tag == ATOM_NS + "published":
+                entry["published"] = _timestamp(elem.text)
+            elif tag == ATOM_NS + "updated":
+                entry["updated"] = _timestamp(elem.text)
+            elif tag == ATOM_NS + "entry":
+                if entry["id"]:
+                    entries.append(entry)
+                entry = None
+                elem.clear()
+    # Raise on truncated document.
+    parser.close()
+    return entries
+
+
+def parse_youtube_feed_fallback(body: str) -> List[dict]:
+    """Parse a feed with feedparser, for anything the fast parser refuse"""
+    entries = []
+    for entry in feedparser.parse(body).entries:
+        if "yt_videoid" not in entry:
+            continue
+        published = entry.get("published_parsed")
+        updated = entry.get("updated_parsed")
+        entries.append(
+            {
+                "id": entry["yt_videoid"],
+                "published": calendar.timegm(published) if published else None,
+                "updated": calendar.timegm(updated) if updated else None,
+            }
+        )
+    return entries
+
+
+class YouTubeFeedPoller:
+    """Poll YouTube channels RSS feeds with conditional requests
+
+    The ETag/Last-Modified validators and a hash of the last body are kept
+    per channel, a 304 or an identical body reuse the video IDs parsed on
+    the previous run instead of parsing the feed again. A changed feed is
+    only parsed up to the newest entry we already know.
+
+    Each channel also get its own poll interval learned from the published
+    time of its feed entries: channels that just published something (or
+    have live/upcoming streams) are polled at the minimum interval, the
+    others are backed off according to their upload cadence.
+    """
+
+    FEED_URL = "https://www.youtube.com/feeds/videos.xml"
+    # Channels are checked once per job run, don't skip a run because of a few seconds drift.
+    POLL_TOLERANCE = 15
+
+    def __init__(
+        self,
+        min_interval: int = 120,
+        max_interval: int = 1800,
+        active_window: int = 6 * 60 * 60,
+        cadence_ratio: int = 48,
+    ):
+        """Initialize the poller
+
+        :param min_interval: Poll interval for active channels in seconds, defaults to 120
+        :type min_interval: int, optional
+        :param max_interval: Poll interval for dormant channels in seconds, defaults to 1800
+        :type max_interval: int, optional
+        :param active_window: A channel that published in this window (in seconds) is active,
+                              defaults to 6 hours
+        :type active_window: int, optional
+        :param cadence_ratio: The upload cadence is divided by this to get the interval,
+                              defaults to 48 (a daily uploader is polled every 30 minutes)
+        :type cadence_ratio: int, optional
+        """
+        self.logger = logging.getLogger("utils.ytfeed.YouTubeFeedPoller")
+        self._min_interval = min_interval
+        self._max_interval = max(min_interval, max_interval)
+        self._active_window = active_window
+        self._cadence_ratio = cadence_ratio
+        self._feeds: Dict[str, dict] = {}
+        self._stats = collections.Counter()
+        self._latencies: List[int] = []
+
+    @staticmethod
+    def _now() -> float:
+        return datetime.now(tz=timezone.utc).timestamp()
+
+    def poll_interval(self, entries: List[dict], now: float) -> int:
+        """Compute the poll interval of a channel from its feed entries
+
+        :param entries: The channel feed entries
+        :type entries: List[dict]
+        :param now: Current UTC timestamp
+        :type now: float
+        :return: Poll interval in seconds
+        :rtype: int
+        """
+        published = sorted((entry["published"] for entry in entries if entry["published"]), reverse=True)
+        if not published:
+            return self._max_interval
+        idle_time = now - published[0]
+        if idle_time <= self._active_window:
+            return self._min_interval
+        gaps = [newer - older for newer, older in zip(published, published[1:]) if newer > older]
+        cadence = statistics.median(gaps) if gaps else idle_time
+        # A channel that went quiet for longer than its usual cadence is backed off further.
+        interval = max(cadence, idle_time) / self._cadence_ratio
+        return int(min(max(interval, self._min_interval), self._max_interval))
+
+    def is_due(self, channel: str, has_streams: bool = False) -> bool:
+        """Check if a channel feed should be polled on this run
+
+        :param channel: YouTube channel ID
+        :type channel: str
+        :param has_streams: The channel has live or upcoming streams, defaults to False
+        :type has_streams: bool, optional
+        :return: Should the feed be polled or not
+        :rtype: bool
+        """
+        feed = self._feeds.get(channel)
+        if feed is None or has_streams:
+            return True
+        if self._now() + self.POLL_TOLERANCE >= feed["next_poll"]:
+            return True
+        self._stats["skipped"] += 1
+        return False
+
+    def _schedule(self, channel: str, now: float, interval: Optional[int] = None):
+        feed = self._feeds.setdefault(channel, {})
+        if interval is None:
+            interval = self.poll_interval(feed.get("entries", []), now)
+        feed["next_poll"] = now + interval
+
+    def _parse(self, channel: str, body: str, known_entries: List[dict]) -> List[dict]:
+        stop_at = known_entries[0]["id"] if known_entries else None
+        try:
+            new_entries = parse_youtube_feed(body, stop_at)
+        except ElementTree.ParseError as e:
+            self.logger.warning(f"Malformed feed for {channel} ({e}), falling back to feedparser.")
+            self._stats["fallback"] += 1
+            return parse_youtube_feed_fallback(body)
+        if not new_entries and stop_at is None and "<entry" in body:
+            # Parsed fine but found nothing, something is off with the schema.
+            self._stats["fallback"] += 1
+            return parse_youtube_feed_fallback(body)
+        new_ids = {entry["id"] for entry in new_entries}
+        known_ids = {entry["id"] for entry in known_entries}
+        if known_entries:
+            # Time between the publication and the discovery of new entries.
+            now = self._now()
+            for entry in new_entries:
+                if entry["id"] not in known_ids and entry["published"]:
+                    self._latencies.append(max(0, int(now - entry["published"])))
+        entries = new_entries + [entry for entry in known_entries if entry["id"] not in new_ids]
+        return entries[:FEED_SIZE]
+
+    async def fetch(self, UpstreamConn: UpstreamClient, channel: str) -> List[str]:
+        """Fetch the video IDs on a channel feed, newest first
+
+        :param UpstreamConn: The shared upstream client
+        :type UpstreamConn: UpstreamClient
+        :param channel: YouTube channel ID
+        :type channel: str
+        :return: The video IDs, an empty list if the feed can't be fetched
+        :rtype: List[str]
+        """
+        feed = self._feeds.get(channel, {})
+        headers = {}
+        if "etag" in feed:
+            headers["If-None-Match"] = feed["etag"]
+        if "last_modified" in feed:
+            headers["If-Modified-Since"] = feed["last_modified"]
+        try:
+            res = await UpstreamConn.get(
+                self.FEED_URL, params={"channel_id": channel}, headers=headers, as_json=False
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"Failed to fetch feed for {channel}: {e!r}")
+            self._stats["failed"] += 1
+            self._schedule(channel, self._now(), self._min_interval)
+            return [entry["id"] for entry in feed.get("entries", [])]
+        if res.status == 304 and "entries" in feed:
+            self._stats["not_modified"] += 1
+            self._schedule(channel, self._now())
+            return [entry["id"] for entry in feed["entries"]]
+        if not res.ok:
+            self.logger.warning(f"Failed to fetch feed for {channel}, got status {res.status}")
+            self._stats["failed"] += 1
+            self._schedule(channel, self._now(), self._min_interval)
+            return [entry["id"] for entry in feed.get("entries", [])]
+
+        self._stats["fetched"] += 1
+        self._stats["bytes"] += len(res.data)
+        body_hash = hashlib.sha1(res.data.encode("utf-8")).hexdigest()
+        if body_hash == feed.get("hash"):
+            self._stats["identical"] += 1
+            entries = feed["entries"]
+        else:
+            self._stats["parsed"] += 1
+            entries = self._parse(channel, res.data, feed.get("entries", []))
+        new_feed = {"hash": body_hash, "entries": entries}
+        if res.headers.get("ETag"):
+            new_feed["etag"] = res.headers["ETag"]
+        if res.headers.get("Last-Modified"):
+            new_feed["last_modified"] = res.headers["Last-Modified"]
+        self._feeds[channel] = new_feed
+        self._schedule(channel, self._now())
+        return [entry["id"] for entry in entries]
+
+    def run_stats(self, reset: bool = True) -> dict:
+        """Return the feeds counts since the last reset
+
+        fetched: full responses received, not_modified: 304 responses,
+        identical: fetched but same body as last time, parsed: feeds that
+        got parsed, fallback: feeds parsed with feedparser, failed: request
+        errors, bytes: total body size, skipped: feeds not due yet,
+        discovered: new entries found, latency_avg/latency_max: seconds
+        between their publication and discovery.
+        """
+        keys = ("fetched", "not_modified", "identical", "parsed", "fallback", "failed", "bytes", "skipped")
+        stats = {key: self._stats[key] for key in keys}
+        stats["discovered"] = len(self._latencies)
+        stats["latency_avg"] = sum(self._latencies) / len(self._latencies) if self._latencies else 0.0
+        stats["latency_max"] = max(self._latencies, default=0)
+        if reset:
+            self._stats.clear()
+            self._latencies = []
+        return stats
@@ -10,19 +10,7 @@ udumps = partial(ujson.dumps, ensure_ascii=False, escape_forward_slashes=False)
 from .memcache import MemcachedBridge
 
 # Import sanic_motor models
-from .models import (
-    OtherYTChannelsDB,
-    HoloBiliDB,
-    NijiBiliDB,
-    OtherBiliDB,
-    OtherYTDB,
-    TwitcastingDB,
-    TwitcastingChannelsDB,
-    TwitchDB,
-    TwitchChannelsDB,
-    NijiTubeChannels,
-    NijiTubeLive,
-)
+from .models import StreamsDB, ChannelsDB
 
 # Import sanic_openapi models
 from .models import (
@@ -4,10 +4,40 @@ from aiocache import Cache, cached
 from aiocache.serializers import JsonSerializer
 from sanic.log import logger
 
-from .models import (HoloBiliDB, NijiBiliDB, NijiTubeChannels,
-                     NijiTubeLive, OtherBiliDB, OtherYTChannelsDB, OtherYTDB,
-                     TwitcastingChannelsDB, TwitcastingDB, TwitchChannelsDB,
-                     TwitchDB)
+from .models import ChannelsDB, StreamsDB
+
+# Internal fields that never leave the API
+HIDDEN_FIELDS = {"_id": 0, "source": 0}
+
+
+async def find_streams(source: str, status: str = None) -> list:
+    query = {"source": source}
+    projection = dict(HIDDEN_FIELDS)
+    if status is not None:
+        query["status"] = status
+        projection["status"] = 0
+    data = await StreamsDB.find(
+        filter=query, projection=projection, sort="startTime", as_raw=True
+    )
+    return data.objects
+
+
+async def find_streams_by_channel(source: str) -> dict:
+    data = await find_streams(source)
+    grouped_streams = {}
+    for stream in data:
+        grouped_streams.setdefault(stream.pop("channel"), []).append(stream)
+    return grouped_streams
+
+
+async def find_channels(source: str, sort: str = None) -> list:
+    projection = dict(HIDDEN_FIELDS)
+    if sort is not None:
+        projection[sort] = 0
+    data = await ChannelsDB.find(
+        filter={"source": source}, projection=projection, sort=sort, as_raw=True
+    )
+    return data.objects
 
 
 @cached(
@@ -16,13 +46,14 @@ from .models import (HoloBiliDB, NijiBiliDB, NijiTubeChannels,
 async def fetch_holobili() -> dict:
     try:
         logger.debug("Fetching (HoloLive) database...")
-        data = await HoloBiliDB.find_one()
+        lives = await find_streams("hololive_data", "live")
+        upcoming = await find_streams("hololive_data", "upcoming")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"upcoming": [], "live": []}
     logger.info("Returning...")
-    return {"live": data["live"], "upcoming": data["upcoming"]}
+    return {"live": lives, "upcoming": upcoming}
 
 
 @cached(
@@ -31,13 +62,14 @@ async def fetch_holobili() -> dict:
 async def fetch_nijibili() -> dict:
     try:
         logger.debug("Fetching (Nijisanji) database...")
-        data = await NijiBiliDB.find_one()
+        lives = await find_streams("nijisanji_data", "live")
+        upcoming = await find_streams("nijisanji_data", "upcoming")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"upcoming": [], "live": []}
     logger.info("Returning...")
-    return {"live": data["live"], "upcoming": data["upcoming"]}
+    return {"live": lives, "upcoming": upcoming}
 
 
 @cached(
@@ -46,13 +78,13 @@ async def fetch_nijibili() -> dict:
 async def fetch_otherbili() -> dict:
     try:
         logger.debug("Fetching (Other) database...")
-        data = await OtherBiliDB.find_one()
+        upcoming = await find_streams("otherbili_data", "upcoming")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"upcoming": []}
     logger.info("Returning...")
-    return {"upcoming": data["upcoming"]}
+    return {"upcoming": upcoming}
 
 
 @cached(
@@ -61,18 +93,13 @@ async def fetch_otherbili() -> dict:
 async def fetch_otheryt() -> dict:
     try:
         logger.debug("Fetching (Other) YT database...")
-        data = await OtherYTDB.find_one({}, as_raw=True)
+        data = await find_streams_by_channel("yt_other_livedata")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {}
     logger.info("Returning...")
-    final_proper = {}
-    for kk, vv in data.items():
-        if kk == "_id":
-            continue
-        final_proper[kk] = vv
-    return final_proper
+    return data
 
 
 @cached(
@@ -81,13 +108,13 @@ async def fetch_otheryt() -> dict:
 async def fetch_twitch() -> dict:
     try:
         logger.debug("Fetching Twitch database...")
-        data = await TwitchDB.find_one()
+        lives = await find_streams("twitch_data", "live")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"live": []}
     logger.info("Returning...")
-    return {"live": data["live"]}
+    return {"live": lives}
 
 
 @cached(
@@ -96,52 +123,52 @@ async def fetch_twitch() -> dict:
 async def fetch_twitcasting() -> dict:
     try:
         logger.debug("Fetching Twitcasting database...")
-        data = await TwitcastingDB.find_one()
+        lives = await find_streams("twitcasting_data", "live")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"live": []}
     logger.info("Returning...")
-    return {"live": data["live"]}
+    return {"live": lives}
 
 
 @cached(key="ch_holo", ttl=7200, serializer=JsonSerializer())
 async def hololive_channels_data() -> dict:
     try:
         logger.debug("Fetching (HoloLive) database...")
-        data = await HoloBiliDB.find_one()
+        channels = await find_channels("hololive_data", "nsort")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"channels": []}
     logger.info("Returning...")
-    return {"channels": data["channels"]}
+    return {"channels": channels}
 
 
 @cached(key="ch_niji", ttl=7200, serializer=JsonSerializer())
 async def nijisanji_channels_data() -> dict:
     try:
         logger.debug("Fetching (Nijisanji) database...")
-        data = await NijiBiliDB.find_one()
+        channels = await find_channels("nijisanji_data", "nsort")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"channels": []}
     logger.info("Returning...")
-    return {"channels": data["channels"]}
+    return {"channels": channels}
 
 
 @cached(key="ch_otherbili", ttl=7200, serializer=JsonSerializer())
 async def otherbili_channels_data() -> dict:
     try:
         logger.debug("Fetching (OtherBili) database...")
-        data = await OtherBiliDB.find_one()
+        channels = await find_channels("otherbili_data", "nsort")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"channels": []}
     logger.info("Returning...")
-    return {"channels": data["channels"]}
+    return {"channels": channels}
 
 
 @cached(
@@ -150,18 +177,13 @@ async def otherbili_channels_data() -> dict:
 async def otheryt_channels_data() -> dict:
     try:
         logger.debug("Fetching (YT Channels) database...")
-        data = await OtherYTChannelsDB.find_one({}, as_raw=True)
+        channels = await find_channels("yt_other_channels")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"channels": []}
-    channels_res = []
-    for channel, channel_data in data.items():
-        if channel == "_id":
-            continue
-        channels_res.append(channel_data)
     logger.info("Returning...")
-    return {"channels": channels_res}
+    return {"channels": channels}
 
 
 @cached(
@@ -170,18 +192,13 @@ async def otheryt_channels_data() -> dict:
 async def twitcast_channels_data() -> dict:
     try:
         logger.debug("Fetching (Twitcasting) database...")
-        data = await TwitcastingChannelsDB.find_one({}, as_raw=True)
+        channels = await find_channels("twitcasting_channels")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"channels": []}
-    channels_res = []
-    for channel, channel_data in data.items():
-        if channel == "_id":
-            continue
-        channels_res.append(channel_data)
     logger.info("Returning...")
-    return {"channels": channels_res}
+    return {"channels": channels}
 
 
 @cached(
@@ -190,18 +207,13 @@ async def twitcast_channels_data() -> dict:
 async def twitch_channels_data() -> dict:
     try:
         logger.debug("Fetching (Twitch) database...")
-        data = await TwitchChannelsDB.find_one({}, as_raw=True)
+        channels = await find_channels("twitch_channels")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"channels": []}
-    channels_res = []
-    for channel, channel_data in data.items():
-        if channel == "_id":
-            continue
-        channels_res.append(channel_data)
     logger.info("Returning...")
-    return {"channels": channels_res}
+    return {"channels": channels}
 
 
 @cached(
@@ -210,18 +222,13 @@ async def twitch_channels_data() -> dict:
 async def fetch_nijitube_live() -> dict:
     try:
         logger.debug("Fetching (NijiTube) YT database...")
-        data = await NijiTubeLive.find_one({}, as_raw=True)
+        data = await find_streams_by_channel("nijitube_live")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {}
     logger.info("Returning...")
-    final_proper = {}
-    for kk, vv in data.items():
-        if kk == "_id":
-            continue
-        final_proper[kk] = vv
-    return final_proper
+    return data
 
 
 @cached(
@@ -230,18 +237,13 @@ async def fetch_nijitube_live() -> dict:
 async def fetch_nijitube_channels() -> dict:
     try:
         logger.debug("Fetching (NijiTube Channels) database...")
-        data = await NijiTubeChannels.find_one({}, as_raw=True)
+        channels = await find_channels("nijitube_channels")
     except Exception as e:
         logger.debug(e)
         logger.debug("Failed to fetch database, returning...")
         return {"channels": []}
-    channels_res = []
-    for channel, channel_data in data.items():
-        if channel == "_id":
-            continue
-        channels_res.append(channel_data)
     logger.info("Returning...")
-    return {"channels": channels_res}
+    return {"channels": channels}
 
 
 cache = Cache(serializer=JsonSerializer())
@@ -7,58 +7,13 @@ from sanic_openapi import doc
 MOTOR_DB = "vtbili"
 
 
-class HoloBiliDB(BaseModel):
-    __coll__ = "hololive_data"
+class StreamsDB(BaseModel):
+    __coll__ = "streams_data"
     __dbkey__ = MOTOR_DB
 
 
-class NijiBiliDB(BaseModel):
-    __coll__ = "nijisanji_data"
-    __dbkey__ = MOTOR_DB
-
-
-class OtherBiliDB(BaseModel):
-    __coll__ = "otherbili_data"
-    __dbkey__ = MOTOR_DB
-
-
-class OtherYTDB(BaseModel):
-    __coll__ = "yt_other_livedata"
-    __dbkey__ = MOTOR_DB
-
-
-class OtherYTChannelsDB(BaseModel):
-    __coll__ = "yt_other_channels"
-    __dbkey__ = MOTOR_DB
-
-
-class TwitchDB(BaseModel):
-    __coll__ = "twitch_data"
-    __dbkey__ = MOTOR_DB
-
-
-class TwitchChannelsDB(BaseModel):
-    __coll__ = "twitch_channels"
-    __dbkey__ = MOTOR_DB
-
-
-class TwitcastingDB(BaseModel):
-    __coll__ = "twitcasting_data"
-    __dbkey__ = MOTOR_DB
-
-
-class TwitcastingChannelsDB(BaseModel):
-    __coll__ = "twitcasting_channels"
-    __dbkey__ = MOTOR_DB
-
-
-class NijiTubeLive(BaseModel):
-    __coll__ = "nijitube_live"
-    __dbkey__ = MOTOR_DB
-
-
-class NijiTubeChannels(BaseModel):
-    __coll__ = "nijitube_channels"
+class ChannelsDB(BaseModel):
+    __coll__ = "channels_data"
     __dbkey__ = MOTOR_DB
 
 